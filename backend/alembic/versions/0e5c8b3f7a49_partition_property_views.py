@@ -0,0 +1,105 @@
+"""partition property views
+
+Revision ID: 0e5c8b3f7a49
+Revises: d4f7b2a9c611
+Create Date: 2025-06-20 09:14:06.385927
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0e5c8b3f7a49'
+down_revision: Union[str, None] = 'd4f7b2a9c611'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Помесячные партиции с месяца самого старого просмотра до текущего + 3 месяца
+# (дальше их создает фоновая задача, см. app.core.partitions)
+CREATE_PARTITIONS_SQL = """
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', coalesce((SELECT min(viewed_at) FROM property_views_legacy), now())),
+            date_trunc('month', now()) + interval '3 months',
+            interval '1 month'
+        )::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF property_views FOR VALUES FROM (%L) TO (%L)',
+            'property_views_y' || to_char(month, 'YYYY') || 'm' || to_char(month, 'MM'),
+            month,
+            (month + interval '1 month')::date
+        );
+    END LOOP;
+END $$;
+"""
+
+
+def upgrade() -> None:
+    # Старая таблица переименовывается, id продолжают ту же последовательность
+    op.execute("ALTER TABLE property_views RENAME TO property_views_legacy")
+    op.execute("ALTER SEQUENCE property_views_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE property_views (
+            id INTEGER NOT NULL DEFAULT nextval('property_views_id_seq'),
+            viewed_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+            user_id INTEGER NOT NULL,
+            property_id INTEGER NOT NULL
+        ) PARTITION BY RANGE (viewed_at)
+    """)
+    op.execute(CREATE_PARTITIONS_SQL)
+    # Строки без времени просмотра попадают в текущий месяц
+    op.execute("""
+        INSERT INTO property_views (id, viewed_at, user_id, property_id)
+        SELECT id, coalesce(viewed_at, now()), user_id, property_id
+        FROM property_views_legacy
+    """)
+    op.drop_table('property_views_legacy')
+
+    op.execute("ALTER SEQUENCE property_views_id_seq OWNED BY property_views.id")
+    op.create_primary_key('property_views_pkey', 'property_views', ['id', 'viewed_at'])
+    op.create_foreign_key('property_views_user_id_fkey', 'property_views', 'users',
+                          ['user_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('property_views_property_id_fkey', 'property_views', 'properties',
+                          ['property_id'], ['id'], ondelete='CASCADE')
+    op.create_index(op.f('ix_property_views_id'), 'property_views', ['id'], unique=False)
+    op.create_index('ix_property_views_user_id_property_id', 'property_views', ['user_id', 'property_id'], unique=False)
+    op.create_index('ix_property_views_viewed_at', 'property_views', ['viewed_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE property_views RENAME TO property_views_partitioned")
+    op.execute("ALTER SEQUENCE property_views_id_seq OWNED BY NONE")
+    # Имена ограничений и индексов освобождаются для обычной таблицы
+    op.execute("ALTER TABLE property_views_partitioned DROP CONSTRAINT property_views_pkey")
+    op.drop_index('ix_property_views_viewed_at', table_name='property_views_partitioned')
+    op.drop_index('ix_property_views_user_id_property_id', table_name='property_views_partitioned')
+    op.drop_index(op.f('ix_property_views_id'), table_name='property_views_partitioned')
+
+    op.create_table('property_views',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('property_views_id_seq')"), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('property_id', sa.Integer(), nullable=False),
+    sa.Column('viewed_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("""
+        INSERT INTO property_views (id, user_id, property_id, viewed_at)
+        SELECT id, user_id, property_id, viewed_at FROM property_views_partitioned
+    """)
+    op.execute("DROP TABLE property_views_partitioned")
+    op.execute("ALTER SEQUENCE property_views_id_seq OWNED BY property_views.id")
+    op.create_index(op.f('ix_property_views_id'), 'property_views', ['id'], unique=False)
+    op.create_index('ix_property_views_user_id_property_id', 'property_views', ['user_id', 'property_id'], unique=False)
+    op.create_index('ix_property_views_viewed_at', 'property_views', ['viewed_at'], unique=False)
@@ -0,0 +1,47 @@
+"""add property full text search
+
+Revision ID: 1d6b8f0a2e94
+Revises: c5a9e7d3f802
+Create Date: 2025-05-26 11:37:09.662851
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d6b8f0a2e94'
+down_revision: Union[str, None] = 'c5a9e7d3f802'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A')"
+    " || setweight(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(address, '')), 'A')"
+    " || setweight(to_tsvector('russian', coalesce(address, '')), 'B')"
+    " || setweight(to_tsvector('russian', coalesce(description, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column('properties', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR_SQL, persisted=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_properties_search_vector', 'properties', ['search_vector'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_properties_address_trgm', 'properties', ['address'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'address': 'gin_trgm_ops'},
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_properties_address_trgm', table_name='properties',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_properties_search_vector', table_name='properties',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('properties', 'search_vector')
@@ -0,0 +1,42 @@
+"""add feed offers
+
+Revision ID: 2f8c6a1d9b35
+Revises: 9d2a6f0c4e18
+Create Date: 2025-06-30 11:08:44.216390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f8c6a1d9b35'
+down_revision: Union[str, None] = '9d2a6f0c4e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Константное значение по умолчанию: Postgres не переписывает таблицу
+    op.add_column('properties', sa.Column('is_active', sa.Boolean(), server_default='true', nullable=False))
+    op.create_table(
+        'feed_offers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('feed', sa.String(), nullable=False),
+        sa.Column('external_id', sa.String(), nullable=False),
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(length=40), nullable=False),
+        sa.Column('is_active', sa.Boolean(), server_default='true', nullable=False),
+        sa.Column('synced_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('feed', 'external_id', name='uq_feed_offers_feed_external_id'),
+        sa.UniqueConstraint('property_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('feed_offers')
+    op.drop_column('properties', 'is_active')
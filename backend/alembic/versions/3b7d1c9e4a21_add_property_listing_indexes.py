@@ -0,0 +1,43 @@
+"""add property listing indexes
+
+Revision ID: 3b7d1c9e4a21
+Revises: f588df6f0d36
+Create Date: 2025-05-20 12:10:41.207114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7d1c9e4a21'
+down_revision: Union[str, None] = 'f588df6f0d36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_properties_created_at_id', ['created_at', 'id']),
+    ('ix_properties_price_id', ['price', 'id']),
+    ('ix_properties_deal_type_created_at_id', ['deal_type', 'created_at', 'id']),
+    ('ix_properties_deal_type_price_id', ['deal_type', 'price', 'id']),
+    ('ix_properties_property_type_deal_type', ['property_type', 'deal_type']),
+    ('ix_properties_price_per_m2_id', [sa.text('(price / NULLIF(area, 0))'), 'id']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в properties, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.create_index(name, 'properties', columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='properties',
+                          postgresql_concurrently=True, if_exists=True)
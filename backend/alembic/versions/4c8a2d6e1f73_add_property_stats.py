@@ -0,0 +1,41 @@
+"""add property stats
+
+Revision ID: 4c8a2d6e1f73
+Revises: b9d3f1a6e258
+Create Date: 2025-06-09 11:22:37.604518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8a2d6e1f73'
+down_revision: Union[str, None] = 'b9d3f1a6e258'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'property_stats',
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('views', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('unique_viewers', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('property_id')
+    )
+    # Начальные значения — один раз из уже накопленных просмотров
+    op.execute("""
+        INSERT INTO property_stats (property_id, views, unique_viewers)
+        SELECT property_id, count(*), count(DISTINCT user_id)
+        FROM property_views
+        GROUP BY property_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('property_stats')
@@ -0,0 +1,28 @@
+"""add property version
+
+Revision ID: 5f0c3e8a7b16
+Revises: 1d6b8f0a2e94
+Create Date: 2025-05-28 09:14:33.820417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f0c3e8a7b16'
+down_revision: Union[str, None] = '1d6b8f0a2e94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE SEQUENCE IF NOT EXISTS property_version_seq")
+    op.add_column('properties', sa.Column('version', sa.BigInteger(), server_default=sa.text("nextval('property_version_seq')"), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('properties', 'version')
+    op.execute("DROP SEQUENCE IF EXISTS property_version_seq")
@@ -0,0 +1,26 @@
+"""add users token version
+
+Revision ID: 6b1e4d7a2c90
+Revises: 2f8c6a1d9b35
+Create Date: 2025-07-02 09:41:17.583204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b1e4d7a2c90'
+down_revision: Union[str, None] = '2f8c6a1d9b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
@@ -0,0 +1,38 @@
+"""add property price change
+
+Revision ID: 6b1f4e8d2c57
+Revises: 0e5c8b3f7a49
+Create Date: 2025-06-24 13:52:40.719385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b1f4e8d2c57'
+down_revision: Union[str, None] = '0e5c8b3f7a49'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Значения для существующих объявлений: scripts/backfill_price_changes.py
+    op.add_column('properties', sa.Column('previous_price', sa.Float(), nullable=True))
+    op.add_column('properties', sa.Column('price_changed_at', sa.DateTime(), nullable=True))
+    op.add_column('properties', sa.Column('price_change_pct', sa.Float(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_properties_price_drop_changed_at_id', 'properties', ['price_changed_at', 'id'],
+                        unique=False, postgresql_where=sa.text('price_change_pct < 0'),
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_properties_price_drop_changed_at_id', table_name='properties',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('properties', 'price_change_pct')
+    op.drop_column('properties', 'price_changed_at')
+    op.drop_column('properties', 'previous_price')
@@ -0,0 +1,54 @@
+"""add property views daily
+
+Revision ID: 7a3e9c1b5d28
+Revises: 4c8a2d6e1f73
+Create Date: 2025-06-12 16:05:19.448301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3e9c1b5d28'
+down_revision: Union[str, None] = '4c8a2d6e1f73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'property_views_daily',
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('views', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('unique_users', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('property_id', 'day')
+    )
+    # Граница агрегации начинается с 0: существующие просмотры агрегирует фоновая задача
+    op.create_table(
+        'rollup_checkpoints',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('last_id', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+    # Индексы по времени для очистки сырых событий пачками
+    with op.get_context().autocommit_block():
+        op.create_index('ix_property_views_viewed_at', 'property_views', ['viewed_at'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_history_viewed_at', 'history', ['viewed_at'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_history_viewed_at', table_name='history',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_property_views_viewed_at', table_name='property_views',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_table('rollup_checkpoints')
+    op.drop_table('property_views_daily')
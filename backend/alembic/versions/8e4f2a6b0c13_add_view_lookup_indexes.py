@@ -0,0 +1,34 @@
+"""add view lookup indexes
+
+Revision ID: 8e4f2a6b0c13
+Revises: 3b7d1c9e4a21
+Create Date: 2025-05-21 10:42:17.530962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4f2a6b0c13'
+down_revision: Union[str, None] = '3b7d1c9e4a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_property_views_user_id_property_id', 'property_views', ['user_id', 'property_id'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_history_user_id_property_id', 'history', ['user_id', 'property_id'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_history_user_id_property_id', table_name='history',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_property_views_user_id_property_id', table_name='property_views',
+                      postgresql_concurrently=True, if_exists=True)
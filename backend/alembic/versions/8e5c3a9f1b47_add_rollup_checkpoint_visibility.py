@@ -0,0 +1,32 @@
+"""add rollup checkpoint visibility
+
+Revision ID: 8e5c3a9f1b47
+Revises: 6b1e4d7a2c90
+Create Date: 2025-07-03 15:12:06.448127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e5c3a9f1b47'
+down_revision: Union[str, None] = '6b1e4d7a2c90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('rollup_checkpoints', sa.Column('visible_id', sa.BigInteger(), server_default='0', nullable=False))
+    op.add_column('rollup_checkpoints', sa.Column('pending_id', sa.BigInteger(), nullable=True))
+    op.add_column('rollup_checkpoints', sa.Column('pending_xmax', sa.BigInteger(), nullable=True))
+    # Уже агрегированное видимо по определению
+    op.execute("UPDATE rollup_checkpoints SET visible_id = last_id")
+
+
+def downgrade() -> None:
+    op.drop_column('rollup_checkpoints', 'pending_xmax')
+    op.drop_column('rollup_checkpoints', 'pending_id')
+    op.drop_column('rollup_checkpoints', 'visible_id')
@@ -0,0 +1,33 @@
+"""add market stats snapshots
+
+Revision ID: 9d2a6f0c4e18
+Revises: 6b1f4e8d2c57
+Create Date: 2025-06-27 17:31:12.508146
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2a6f0c4e18'
+down_revision: Union[str, None] = '6b1f4e8d2c57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'market_stats_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('generated_at', sa.DateTime(), nullable=False),
+        sa.Column('listings', sa.Integer(), nullable=False),
+        sa.Column('segments', sa.JSON(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('market_stats_snapshots')
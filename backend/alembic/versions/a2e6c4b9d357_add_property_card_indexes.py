@@ -0,0 +1,34 @@
+"""add property card indexes
+
+Revision ID: a2e6c4b9d357
+Revises: 5f0c3e8a7b16
+Create Date: 2025-05-30 14:21:48.071935
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2e6c4b9d357'
+down_revision: Union[str, None] = '5f0c3e8a7b16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_property_images_property_id'), 'property_images', ['property_id'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_price_history_property_id_change_date', 'price_history', ['property_id', 'change_date'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_price_history_property_id_change_date', table_name='price_history',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index(op.f('ix_property_images_property_id'), table_name='property_images',
+                      postgresql_concurrently=True, if_exists=True)
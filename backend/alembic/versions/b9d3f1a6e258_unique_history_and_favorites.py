@@ -0,0 +1,79 @@
+"""unique history and favorites
+
+Revision ID: b9d3f1a6e258
+Revises: e7b1d5f39c40
+Create Date: 2025-06-04 18:47:02.915733
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9d3f1a6e258'
+down_revision: Union[str, None] = 'e7b1d5f39c40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Дубликаты удаляются диапазонами user_id, каждый диапазон — отдельная
+# короткая транзакция, поэтому таблицы не блокируются надолго
+USER_BATCH = 1000
+
+# В истории оставляем самый поздний просмотр, в избранном — самую раннюю запись
+DEDUPE_SQL = {
+    'history': """
+        DELETE FROM history h
+        USING history d
+        WHERE h.user_id BETWEEN :lo AND :hi
+          AND d.user_id = h.user_id
+          AND d.property_id = h.property_id
+          AND (coalesce(h.viewed_at, '-infinity'), h.id) < (coalesce(d.viewed_at, '-infinity'), d.id)
+    """,
+    'favorites': """
+        DELETE FROM favorites f
+        USING favorites d
+        WHERE f.user_id BETWEEN :lo AND :hi
+          AND d.user_id = f.user_id
+          AND d.property_id = f.property_id
+          AND f.id > d.id
+    """,
+}
+
+CONSTRAINTS = {
+    'history': 'uq_history_user_property',
+    'favorites': 'uq_favorites_user_property',
+}
+
+
+def _dedupe(connection, table: str) -> None:
+    bounds = connection.execute(sa.text(f"SELECT min(user_id), max(user_id) FROM {table}")).first()
+    if bounds[0] is None:
+        return
+    for lo in range(bounds[0], bounds[1] + 1, USER_BATCH):
+        connection.execute(sa.text(DEDUPE_SQL[table]), {'lo': lo, 'hi': lo + USER_BATCH - 1})
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    with op.get_context().autocommit_block():
+        for table, constraint in CONSTRAINTS.items():
+            _dedupe(connection, table)
+            # Уникальный индекс строится без блокировки записи, затем
+            # превращается в ограничение (короткая блокировка без пересканирования)
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {constraint}")
+            op.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {constraint} ON {table} (user_id, property_id)")
+            op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {constraint} UNIQUE USING INDEX {constraint}")
+        # Уникальный индекс заменяет обычный индекс для поиска просмотров
+        op.drop_index('ix_history_user_id_property_id', table_name='history',
+                      postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_history_user_id_property_id', 'history', ['user_id', 'property_id'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+    for table, constraint in CONSTRAINTS.items():
+        op.drop_constraint(constraint, table, type_='unique')
@@ -0,0 +1,28 @@
+"""add property views default partition
+
+Revision ID: c3f9e2b7d514
+Revises: 8e5c3a9f1b47
+Create Date: 2025-07-03 17:26:52.071934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f9e2b7d514'
+down_revision: Union[str, None] = '8e5c3a9f1b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Вставка за пределами созданных месяцев попадает сюда, а не падает
+    # (строки переносит app.core.partitions.ensure_partitions)
+    op.execute("CREATE TABLE IF NOT EXISTS property_views_default PARTITION OF property_views DEFAULT")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS property_views_default")
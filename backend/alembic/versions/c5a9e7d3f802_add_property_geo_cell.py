@@ -0,0 +1,37 @@
+"""add property geo cell
+
+Revision ID: c5a9e7d3f802
+Revises: 8e4f2a6b0c13
+Create Date: 2025-05-23 16:05:52.114380
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a9e7d3f802'
+down_revision: Union[str, None] = '8e4f2a6b0c13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Сетка 0.01°: ячейка = строка * 36000 + столбец (см. app.core.geo)
+GEO_CELL_SQL = "(floor((latitude + 90) / 0.01) * 36000 + floor((longitude + 180) / 0.01))::bigint"
+
+
+def upgrade() -> None:
+    # Хранимая генерируемая колонка заполняется для существующих строк при добавлении
+    op.add_column('properties', sa.Column('geo_cell', sa.BigInteger(), sa.Computed(GEO_CELL_SQL, persisted=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_properties_geo_cell'), 'properties', ['geo_cell'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_properties_geo_cell'), table_name='properties',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('properties', 'geo_cell')
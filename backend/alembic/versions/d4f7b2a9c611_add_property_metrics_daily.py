@@ -0,0 +1,42 @@
+"""add property metrics daily
+
+Revision ID: d4f7b2a9c611
+Revises: 7a3e9c1b5d28
+Create Date: 2025-06-16 10:38:54.172260
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f7b2a9c611'
+down_revision: Union[str, None] = '7a3e9c1b5d28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'property_metrics_daily',
+        sa.Column('property_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('favorites_added', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('chats_started', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['property_id'], ['properties.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('property_id', 'day')
+    )
+    # Добавления в избранное за прошлые дни восстанавливаются из favorites
+    op.execute("""
+        INSERT INTO property_metrics_daily (property_id, day, favorites_added)
+        SELECT property_id, created_at::date, count(*)
+        FROM favorites
+        WHERE created_at IS NOT NULL
+        GROUP BY property_id, created_at::date
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('property_metrics_daily')
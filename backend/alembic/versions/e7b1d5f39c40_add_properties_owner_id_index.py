@@ -0,0 +1,30 @@
+"""add properties owner_id index
+
+Revision ID: e7b1d5f39c40
+Revises: a2e6c4b9d357
+Create Date: 2025-06-02 10:03:26.448190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b1d5f39c40'
+down_revision: Union[str, None] = 'a2e6c4b9d357'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_properties_owner_id'), 'properties', ['owner_id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_properties_owner_id'), table_name='properties',
+                      postgresql_concurrently=True, if_exists=True)
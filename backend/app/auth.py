@@ -5,11 +5,17 @@ from fastapi.security import OAuth2PasswordBearer
 import os
 from dotenv import load_dotenv
 from passlib.context import CryptContext
-from typing import Optional
+from typing import List, NamedTuple, Optional
+import logging
+from redis import RedisError
 from . import crud
-from .database import get_db
+from .database import SessionLocal, get_db, get_read_db
 from sqlalchemy.orm import Session
-from . import models
+from . import models, schemas
+from .core import cache
+from .core.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
 
 # Загружаем переменные окружения из файла .env
 load_dotenv()
@@ -21,6 +27,10 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login", auto_error=False)
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 120
+# Текущая версия токенов пользователя. После отзыва живет не дольше самого
+# токена, прочитанная из БД — TOKEN_VERSION_TTL секунд
+TOKEN_VERSION_KEY = "auth:token_version:{user_id}"
+TOKEN_VERSION_TTL = 300
 
 # Контекст для хеширования паролей
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -50,59 +60,184 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+def create_user_access_token(user: models.User, expires_delta: timedelta = None) -> str:
     """
-    Получает текущего пользователя по токену (обязательная аутентификация).
+    Токен пользователя: email (sub), id (uid) и версия токенов (ver).
+    По uid обработчики узнают пользователя без запроса к БД.
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+    return create_access_token(
+        data={"sub": user.email, "uid": user.id, "ver": user.token_version or 0},
+        expires_delta=expires_delta
     )
-    if not token:
-        raise credentials_exception
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        return email
-    except JWTError:
-        raise credentials_exception
 
-def get_optional_current_user(token: str = Depends(oauth2_scheme)) -> Optional[str]:
+class Principal(NamedTuple):
+    """Текущий пользователь по данным токена, без обращения к БД"""
+    id: int
+    email: str
+    token_version: int
+
+def _token_revoked(user_id: int, token_version: int) -> bool:
     """
-    Получает текущего пользователя по токену (опциональная аутентификация).
-    Возвращает None, если токен отсутствует или недействителен.
+    Отозван ли токен: версия в нем меньше текущей версии пользователя.
+    Текущая версия берется из Redis, а если ее там нет или Redis недоступен —
+    из БД (primary), чтобы сбой Redis не возвращал силу отозванным токенам.
+    Токен удаленного пользователя считается отозванным.
     """
+    key = TOKEN_VERSION_KEY.format(user_id=user_id)
+    redis_available = True
+    try:
+        current = redis_client.get(key)
+    except RedisError as e:
+        logger.warning(f"Не удалось проверить версию токена пользователя {user_id} в Redis, проверяем по БД: {e}")
+        current = None
+        redis_available = False
+    if current is None:
+        with SessionLocal() as db:
+            row = db.query(models.User.token_version).filter(models.User.id == user_id).first()
+        if row is None:
+            return True
+        current = row.token_version or 0
+        if redis_available:
+            try:
+                # nx: не затираем версию, которую revoke_tokens записал после нашего чтения из БД
+                redis_client.set(key, current, ex=TOKEN_VERSION_TTL, nx=True)
+            except RedisError as e:
+                logger.warning(f"Не удалось сохранить версию токена пользователя {user_id}: {e}")
+    return int(current) > token_version
+
+def _decode_token(token: Optional[str]) -> Optional[dict]:
+    """Полезная нагрузка действительного и не отозванного токена или None"""
     if not token:
         return None
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        return email if email else None
     except JWTError:
         return None
+    if not payload.get("sub"):
+        return None
+    if payload.get("uid") is not None and _token_revoked(payload["uid"], payload.get("ver", 0)):
+        return None
+    return payload
 
-def get_current_user_model(token: str = Depends(oauth2_scheme)):
+def _principal(payload: Optional[dict]) -> Optional[Principal]:
+    # Токены, выданные до появления uid, принципала не дают — нужен повторный вход
+    if payload is None or payload.get("uid") is None:
+        return None
+    return Principal(id=payload["uid"], email=payload["sub"], token_version=payload.get("ver", 0))
+
+def get_current_user(token: str = Depends(oauth2_scheme)):
     """
     Получает текущего пользователя по токену (обязательная аутентификация).
+    Возвращает email; обработчикам, которым нужен только id, удобнее get_current_principal.
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Пользователь не найден",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    if not token:
-        raise credentials_exception
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        user = crud.get_user_by_email(get_db(), email)
+    payload = _decode_token(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return payload["sub"]
+
+def get_optional_current_user(token: str = Depends(oauth2_scheme)) -> Optional[str]:
+    """
+    Получает текущего пользователя по токену (опциональная аутентификация).
+    Возвращает None, если токен отсутствует или недействителен.
+    """
+    payload = _decode_token(token)
+    return payload["sub"] if payload else None
+
+def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Текущий пользователь (id и email) из токена, без запроса к БД"""
+    principal = _principal(_decode_token(token))
+    if principal is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return principal
+
+def get_optional_principal(token: str = Depends(oauth2_scheme)) -> Optional[Principal]:
+    """Как get_current_principal, но None для анонимного запроса или недействительного токена"""
+    return _principal(_decode_token(token))
+
+def get_current_user_profile(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_read_db)
+) -> schemas.UserOut:
+    """
+    Профиль текущего пользователя через кэш с коротким TTL (cache.USER_TTL).
+    Кэш сбрасывается при изменении профиля; заодно сверяется версия токенов.
+    """
+    entry = cache.get_user(principal.id)
+    if entry is None:
+        user = crud.get_user(db, user_id=principal.id)
         if user is None:
-            raise credentials_exception
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
+        entry = {
+            "token_version": user.token_version or 0,
+            "user": schemas.UserOut.model_validate(user).model_dump(mode="json"),
+        }
+        cache.set_user(principal.id, entry)
+    # Только "больше": реплика может отставать и еще не видеть новую версию после входа
+    if entry["token_version"] > principal.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return schemas.UserOut.model_validate(entry["user"])
+
+def require_roles(roles: List[str]):
+    """Зависимость: профиль текущего пользователя, если его роль входит в roles, иначе 403"""
+    def dependency(user: schemas.UserOut = Depends(get_current_user_profile)) -> schemas.UserOut:
+        if user.role not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав")
         return user
-    except JWTError:
-        raise credentials_exception
\ No newline at end of file
+    return dependency
+
+def revoke_tokens(db: Session, user: models.User) -> None:
+    """
+    Увеличивает версию токенов пользователя: выданные раньше токены перестают
+    приниматься. Вызывается после смены email или пароля, commit внутри.
+    """
+    user.token_version = (user.token_version or 0) + 1
+    db.commit()
+    db.refresh(user)
+    try:
+        redis_client.set(
+            TOKEN_VERSION_KEY.format(user_id=user.id), user.token_version,
+            ex=ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        )
+    except RedisError as e:
+        logger.warning(f"Не удалось отозвать токены пользователя {user.id}: {e}")
+    cache.invalidate_user(user.id)
+
+def ensure_user_exists(db: Session, user_id: int) -> None:
+    """
+    401, если пользователя из токена уже нет в БД (удален после выдачи токена).
+    Для обработки IntegrityError по внешнему ключу users: вызывать после rollback.
+    """
+    if db.get(models.User, user_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Пользователь не найден",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def get_current_user_model(
+    principal: Principal = Depends(get_current_principal),
+    db: Session = Depends(get_db)
+) -> models.User:
+    """
+    Получает текущего пользователя (ORM-модель) по id из токена.
+    """
+    user = crud.get_user(db, user_id=principal.id)
+    if user is None or (user.token_version or 0) > principal.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Пользователь не найден",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
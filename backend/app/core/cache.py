@@ -0,0 +1,226 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional, Tuple
+
+from pydantic import BaseModel
+from redis import RedisError
+from redis.exceptions import LockError
+
+from app.core.redis_client import async_redis_client, redis_client
+
+logger = logging.getLogger(__name__)
+
+# Кэш счетчиков фасетов живет до изменения каталога, но не дольше TTL
+FACETS_TTL = 300
+# Поколение каталога: входит в ключи кэша, инкремент делает старые ключи недостижимыми
+CATALOG_GENERATION_KEY = "catalog:generation"
+
+# Карточка объявления свежая PROPERTY_FRESH_TTL секунд, затем еще
+# PROPERTY_STALE_TTL секунд отдается устаревшая копия, пока один запрос обновляет
+PROPERTY_FRESH_TTL = 60
+PROPERTY_STALE_TTL = 600
+# Сколько кэшируется отсутствие объекта (None от loader)
+NEGATIVE_TTL = 5
+# Профиль текущего пользователя (auth.get_current_user_profile)
+USER_TTL = 30
+# Single-flight: сколько держится блокировка загрузки и сколько ждут остальные
+LOAD_LOCK_TIMEOUT = 10
+LOAD_WAIT_TIMEOUT = 2.0
+LOAD_WAIT_INTERVAL = 0.05
+# Поколение ключа переживает любую запись под ним
+GENERATION_TTL = PROPERTY_FRESH_TTL + PROPERTY_STALE_TTL + LOAD_LOCK_TIMEOUT
+
+
+def filter_fingerprint(filters: BaseModel) -> str:
+    """Стабильный хэш набора фильтров: порядок и пустые значения не влияют"""
+    payload = filters.model_dump(mode="json", exclude_none=True)
+    for key, value in payload.items():
+        if isinstance(value, list):
+            payload[key] = sorted(value)
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _catalog_generation() -> str:
+    return redis_client.get(CATALOG_GENERATION_KEY) or "0"
+
+
+def get_facets(filters: BaseModel) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    Возвращает (фасеты или None, поколение каталога). Поколение читается до
+    подсчета и передается в set_facets: если каталог изменится, пока фасеты
+    считаются, результат ляжет под старое поколение и не будет прочитан.
+    """
+    try:
+        generation = _catalog_generation()
+        cached = redis_client.get(f"facets:{generation}:{filter_fingerprint(filters)}")
+    except RedisError as e:
+        logger.warning(f"Кэш фасетов недоступен: {e}")
+        return None, None
+    return (json.loads(cached) if cached else None), generation
+
+
+def set_facets(filters: BaseModel, data: Any, generation: Optional[str]) -> None:
+    if generation is None:
+        return
+    try:
+        key = f"facets:{generation}:{filter_fingerprint(filters)}"
+        redis_client.set(key, json.dumps(data, ensure_ascii=False), ex=FACETS_TTL)
+    except RedisError as e:
+        logger.warning(f"Не удалось сохранить фасеты в кэш: {e}")
+
+
+def invalidate_catalog() -> None:
+    """Сбрасывает кэши, зависящие от состава каталога (фасеты)"""
+    try:
+        redis_client.incr(CATALOG_GENERATION_KEY)
+    except RedisError as e:
+        logger.warning(f"Не удалось сбросить кэш каталога: {e}")
+
+
+class CacheLoadTimeout(Exception):
+    """Значение грузит другой запрос, и оно не появилось за LOAD_WAIT_TIMEOUT"""
+
+
+def _generation_key(key: str) -> str:
+    return f"{key}:gen"
+
+
+async def _read(key: str) -> tuple:
+    """
+    (запись или None, текущее поколение ключа). Запись, сохраненная под
+    другим поколением (загрузка началась до invalidate), считается отсутствующей.
+    """
+    raw, generation = await async_redis_client.mget(key, _generation_key(key))
+    generation = int(generation or 0)
+    if raw:
+        entry = json.loads(raw)
+        if entry.get("gen", 0) == generation:
+            return entry, generation
+    return None, generation
+
+
+async def _store(key: str, data: Any, generation: int, fresh_ttl: int, stale_ttl: int) -> None:
+    if data is None:
+        # Отрицательный результат (объект не найден) живет недолго и без stale-окна
+        fresh_ttl, stale_ttl = NEGATIVE_TTL, 0
+    entry = {"fresh_until": time.time() + fresh_ttl, "gen": generation, "data": data}
+    await async_redis_client.set(key, json.dumps(entry, ensure_ascii=False), ex=fresh_ttl + stale_ttl)
+
+
+async def _load_with_lock(key: str, loader: Callable[[], Awaitable[Any]], generation: int,
+                          fresh_ttl: int, stale_ttl: int) -> tuple:
+    """
+    Загружает значение, если удалось взять блокировку ключа.
+    Возвращает (True, данные) или (False, None), если грузит кто-то другой.
+    Результат сохраняется с поколением, прочитанным до загрузки.
+    """
+    lock = async_redis_client.lock(f"{key}:lock", timeout=LOAD_LOCK_TIMEOUT)
+    if not await lock.acquire(blocking=False):
+        return False, None
+    try:
+        data = await loader()
+        await _store(key, data, generation, fresh_ttl, stale_ttl)
+        return True, data
+    finally:
+        try:
+            await lock.release()
+        except LockError:
+            # Блокировка истекла раньше загрузки — ее уже мог взять другой запрос
+            pass
+
+
+async def read_through(key: str, loader: Callable[[], Awaitable[Any]], fresh_ttl: int, stale_ttl: int) -> Any:
+    """
+    Read-through кэш со stale-while-revalidate и single-flight загрузкой.
+    loader — асинхронная функция; вызывается не более чем одним запросом на ключ одновременно;
+    остальные получают устаревшую копию или ждут, пока она появится. Если за
+    LOAD_WAIT_TIMEOUT значение не появилось, ожидающий один раз пробует загрузить
+    его сам, а если ключ все еще занят — получает CacheLoadTimeout.
+    None от loader (например, объект не найден) кэшируется на NEGATIVE_TTL.
+    Без Redis loader вызывается напрямую. Запросы к Redis асинхронные и не
+    блокируют event loop.
+    """
+    try:
+        entry, generation = await _read(key)
+        if entry is not None:
+            if entry["fresh_until"] > time.time():
+                return entry["data"]
+            loaded, data = await _load_with_lock(key, loader, generation, fresh_ttl, stale_ttl)
+            return data if loaded else entry["data"]
+
+        loaded, data = await _load_with_lock(key, loader, generation, fresh_ttl, stale_ttl)
+        if loaded:
+            return data
+        deadline = time.time() + LOAD_WAIT_TIMEOUT
+        while time.time() < deadline:
+            await asyncio.sleep(LOAD_WAIT_INTERVAL)
+            entry, generation = await _read(key)
+            if entry is not None:
+                return entry["data"]
+        # Загружавший запрос мог упасть, не сохранив результат, — один повтор
+        loaded, data = await _load_with_lock(key, loader, generation, fresh_ttl, stale_ttl)
+        if loaded:
+            return data
+    except RedisError as e:
+        logger.warning(f"Кэш {key} недоступен: {e}")
+        return await loader()
+    raise CacheLoadTimeout(key)
+
+
+def invalidate(key: str) -> None:
+    """
+    Сбрасывает запись read_through. Поколение ключа увеличивается, поэтому
+    загрузка, начатая до сброса, не сможет сохранить устаревшие данные.
+    """
+    pipe = redis_client.pipeline()
+    pipe.incr(_generation_key(key))
+    pipe.expire(_generation_key(key), GENERATION_TTL)
+    pipe.delete(key)
+    pipe.execute()
+
+
+async def get_property_detail(property_id: int, loader: Callable[[], Awaitable[Any]]) -> Any:
+    """Публичное представление объявления (без полей конкретного пользователя)"""
+    return await read_through(f"property:{property_id}", loader, PROPERTY_FRESH_TTL, PROPERTY_STALE_TTL)
+
+
+def invalidate_property(property_id: int) -> None:
+    """Сбрасывает кэш карточки объявления после его изменения"""
+    try:
+        invalidate(f"property:{property_id}")
+    except RedisError as e:
+        logger.warning(f"Не удалось сбросить кэш объявления {property_id}: {e}")
+
+
+def invalidate_properties(property_ids: Iterable[int]) -> None:
+    """Сбрасывает кэш карточек нескольких объявлений (например, при смене профиля владельца)"""
+    for property_id in property_ids:
+        invalidate_property(property_id)
+
+
+def get_user(user_id: int) -> Optional[Any]:
+    try:
+        raw = redis_client.get(f"user:{user_id}")
+    except RedisError as e:
+        logger.warning(f"Кэш пользователя {user_id} недоступен: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+def set_user(user_id: int, data: Any) -> None:
+    try:
+        redis_client.set(f"user:{user_id}", json.dumps(data, ensure_ascii=False), ex=USER_TTL)
+    except RedisError as e:
+        logger.warning(f"Не удалось закэшировать пользователя {user_id}: {e}")
+
+
+def invalidate_user(user_id: int) -> None:
+    """Сбрасывает кэш профиля после его изменения"""
+    try:
+        redis_client.delete(f"user:{user_id}")
+    except RedisError as e:
+        logger.warning(f"Не удалось сбросить кэш пользователя {user_id}: {e}")
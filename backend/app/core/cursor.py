@@ -0,0 +1,38 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Tuple
+
+
+def encode_cursor(sort: str, key: Any, last_id: int) -> str:
+    """
+    Упаковывает позицию keyset-пагинации (значение ключа сортировки + id)
+    в непрозрачную строку для клиента.
+    """
+    payload = {"s": sort, "i": last_id}
+    if isinstance(key, datetime):
+        payload["d"] = key.isoformat()
+    else:
+        payload["k"] = key
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """
+    Распаковывает курсор. Бросает ValueError, если курсор поврежден
+    или был выдан для другого порядка сортировки.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["s"] != sort:
+            raise ValueError("Курсор выдан для другой сортировки")
+        key = datetime.fromisoformat(payload["d"]) if "d" in payload else payload["k"]
+        # Ключ сортировки — дата или число; иное значение сломало бы запрос, а не курсор
+        if not isinstance(key, (datetime, int, float)) or isinstance(key, bool):
+            raise ValueError("Некорректный курсор")
+        return key, int(payload["i"])
+    except (KeyError, TypeError, json.JSONDecodeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError("Некорректный курсор") from e
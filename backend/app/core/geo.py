@@ -0,0 +1,59 @@
+import math
+from typing import List, Optional, Tuple
+
+# Сетка геоячеек: шаг 0.01° (~1.1 км по широте), ячейка = строка * ширина + столбец
+GEO_CELL_DEG = 0.01
+GEO_CELL_COLUMNS = 36000  # 360 / GEO_CELL_DEG
+# При более высокой рамке выгоднее фильтровать по широте/долготе напрямую
+MAX_GEO_CELL_ROWS = 256
+
+EARTH_RADIUS_M = 6371000.0
+
+# То же вычисление на стороне Postgres (генерируемая колонка properties.geo_cell)
+GEO_CELL_SQL = (
+    f"(floor((latitude + 90) / {GEO_CELL_DEG}) * {GEO_CELL_COLUMNS}"
+    f" + floor((longitude + 180) / {GEO_CELL_DEG}))::bigint"
+)
+
+
+def _cell_row(lat: float) -> int:
+    return math.floor((lat + 90) / GEO_CELL_DEG)
+
+
+def _cell_col(lng: float) -> int:
+    return math.floor((lng + 180) / GEO_CELL_DEG)
+
+
+def geo_cell(lat: float, lng: float) -> int:
+    """Номер геоячейки для точки"""
+    return _cell_row(lat) * GEO_CELL_COLUMNS + _cell_col(lng)
+
+
+def cell_ranges(min_lat: float, min_lng: float, max_lat: float, max_lng: float) -> Optional[List[Tuple[int, int]]]:
+    """
+    Диапазоны номеров ячеек, покрывающие рамку: по одному непрерывному
+    диапазону на строку сетки. Рамка расширяется на одну ячейку с каждой
+    стороны, чтобы погрешность округления на границе не теряла точки.
+    Возвращает None, если строк слишком много и фильтр по ячейкам бесполезен.
+    """
+    row_min, row_max = _cell_row(min_lat) - 1, _cell_row(max_lat) + 1
+    if row_max - row_min + 1 > MAX_GEO_CELL_ROWS:
+        return None
+    col_min = max(_cell_col(min_lng) - 1, 0)
+    col_max = min(_cell_col(max_lng) + 1, GEO_CELL_COLUMNS - 1)
+    return [
+        (row * GEO_CELL_COLUMNS + col_min, row * GEO_CELL_COLUMNS + col_max)
+        for row in range(row_min, row_max + 1)
+    ]
+
+
+def bbox_around(lat: float, lng: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """Рамка (min_lat, min_lng, max_lat, max_lng), описанная вокруг круга"""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlng = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+    return (
+        max(lat - dlat, -90.0),
+        max(lng - dlng, -180.0),
+        min(lat + dlat, 90.0),
+        min(lng + dlng, 180.0),
+    )
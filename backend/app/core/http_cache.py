@@ -0,0 +1,19 @@
+import hashlib
+from typing import Iterable, Optional
+
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из частей версии представления"""
+    raw = ":".join(str(part) for part in parts)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверяет заголовок If-None-Match (список тегов, W/-префиксы, *)"""
+    if not if_none_match:
+        return False
+    candidates: Iterable[str] = (tag.strip() for tag in if_none_match.split(","))
+    for tag in candidates:
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
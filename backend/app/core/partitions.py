@@ -0,0 +1,142 @@
+"""
+Помесячные партиции таблиц событий (RANGE по времени).
+
+Партиция месяца называется <table>_yYYYYmMM и покрывает [1 число, 1 число
+следующего месяца). Имена строятся только из дат, поэтому DDL собирается
+форматированием строки.
+
+У таблицы есть DEFAULT-партиция <table>_default: если фоновая задача
+отстала и партиции нужного месяца нет, вставка не падает, а строка ложится
+туда. ensure_partitions потом создает недостающие месяцы (начиная с самого
+раннего месяца в DEFAULT) и переносит в них такие строки.
+"""
+import re
+from datetime import date
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+# Сколько будущих месяцев держать созданными заранее
+MONTHS_AHEAD = 3
+# Сколько DETACH ждет блокировку таблицы, прежде чем отступить до следующего прохода
+DETACH_LOCK_TIMEOUT = "2s"
+
+_PARTITION_SUFFIX = re.compile(r"_y(\d{4})m(\d{2})$")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year:04d}m{month.month:02d}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def ensure_default_partition(connection: Connection, table: str) -> None:
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {default_partition_name(table)} PARTITION OF {table} DEFAULT"
+    ))
+
+
+def default_partition_rows(connection: Connection, table: str) -> int:
+    """Сколько строк лежит в DEFAULT-партиции (больше нуля — обслуживание партиций отстает)"""
+    return connection.execute(text(f"SELECT count(*) FROM {default_partition_name(table)}")).scalar()
+
+
+def _create_partition(connection: Connection, table: str, key: str, lower: date, upper: date) -> None:
+    name = partition_name(table, lower)
+    default = default_partition_name(table)
+    bounds = f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+    in_range = f"{key} >= '{lower.isoformat()}' AND {key} < '{upper.isoformat()}'"
+    has_rows = connection.execute(text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_range})")).scalar()
+    if not has_rows:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}"))
+        return
+    # CREATE ... PARTITION OF не пройдет, пока такие строки лежат в DEFAULT:
+    # переносим их в отдельную таблицу и присоединяем ее как партицию
+    connection.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM {default} WHERE {in_range} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ))
+    connection.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} {bounds}"))
+
+
+def ensure_partitions(connection: Connection, table: str, key: str = "viewed_at",
+                      months_ahead: int = MONTHS_AHEAD, start: Optional[date] = None) -> List[str]:
+    """
+    Создает недостающие партиции с месяца start (по умолчанию текущего) на
+    months_ahead вперед, а также для всех месяцев между самой ранней и самой
+    поздней строкой в DEFAULT, чтобы в ней ничего не оставалось.
+    key — колонка партиционирования. Выполняется в одной транзакции, чтобы
+    перенос строк из DEFAULT и присоединение партиции прошли вместе.
+    Возвращает имена созданных партиций.
+    """
+    ensure_default_partition(connection, table)
+    first = month_start(start or date.today())
+    last = add_months(first, months_ahead)
+    earliest_default, latest_default = connection.execute(
+        text(f"SELECT min({key}), max({key}) FROM {default_partition_name(table)}")
+    ).one()
+    if earliest_default is not None:
+        first = min(first, month_start(earliest_default.date()))
+        last = max(last, month_start(latest_default.date()))
+
+    existing = {name for name, _ in list_partitions(connection, table)}
+    created = []
+    lower = first
+    while lower <= last:
+        upper = add_months(lower, 1)
+        if partition_name(table, lower) not in existing:
+            _create_partition(connection, table, key, lower, upper)
+            created.append(partition_name(table, lower))
+        lower = upper
+    return created
+
+
+def list_partitions(connection: Connection, table: str) -> List[Tuple[str, date]]:
+    """Партиции таблицы и месяц каждой, по возрастанию"""
+    rows = connection.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {"table": table}).scalars()
+    partitions = []
+    for name in rows:
+        match = _PARTITION_SUFFIX.search(name)
+        if match:
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda item: item[1])
+
+
+def expired_partitions(connection: Connection, table: str, cutoff: date) -> List[str]:
+    """Партиции, целиком лежащие раньше cutoff"""
+    return [
+        name for name, month in list_partitions(connection, table)
+        if add_months(month, 1) <= cutoff
+    ]
+
+
+def drop_partition(connection: Connection, table: str, name: str) -> None:
+    """
+    Отсоединяет и удаляет партицию в транзакции вызывающего кода.
+    DETACH ... CONCURRENTLY недоступен, пока у таблицы есть DEFAULT-партиция,
+    поэтому обычный DETACH берет ACCESS EXCLUSIVE на родительскую таблицу.
+    lock_timeout не дает ему встать в очередь за долгим запросом и
+    остановить запись в таблицу: при таймауте поднимается OperationalError
+    (LOCK_NOT_AVAILABLE), и транзакцию нужно откатить.
+    """
+    connection.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+    connection.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    connection.execute(text(f"DROP TABLE {name}"))
@@ -0,0 +1,92 @@
+"""
+Метрики пулов соединений с БД.
+
+Пулы движков заменены подклассами QueuePool, которые замеряют время
+получения соединения (ожидание свободного соединения или открытие нового)
+и копят гистограмму в памяти процесса. Значения у каждого воркера свои.
+"""
+import bisect
+import threading
+import time
+from typing import Dict, List
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+# Границы корзин гистограммы ожидания, мс
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class WaitHistogram:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.timeouts = 0
+
+    def observe(self, wait_ms: float, timed_out: bool = False) -> None:
+        index = bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.sum_ms += wait_ms
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        """Накопительные счетчики по корзинам (le — верхняя граница в мс), как в Prometheus"""
+        with self._lock:
+            counts = list(self._counts)
+            result = {"count": self.count, "sum_ms": round(self.sum_ms, 3), "timeouts": self.timeouts}
+        buckets = {}
+        cumulative = 0
+        for bound, count in zip([str(bound) for bound in WAIT_BUCKETS_MS] + ["+Inf"], counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        result["buckets"] = buckets
+        return result
+
+
+class _TimedCheckout:
+    """Замер времени _do_get — получения соединения из пула для checkout"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_histogram = WaitHistogram()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.wait_histogram.observe((time.perf_counter() - started) * 1000, timed_out)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_stats(name: str, pool: Pool) -> dict:
+    stats = {
+        "name": name,
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+    histogram = getattr(pool, "wait_histogram", None)
+    stats["wait"] = histogram.snapshot() if histogram is not None else WaitHistogram().snapshot()
+    return stats
+
+
+def collect(pools: Dict[str, Pool]) -> List[dict]:
+    return [pool_stats(name, pool) for name, pool in pools.items()]
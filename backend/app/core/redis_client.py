@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio
 from app.core.config import settings
 
 redis_client = redis.Redis(
@@ -6,4 +7,13 @@ redis_client = redis.Redis(
     port=settings.REDIS_PORT,
     db=settings.REDIS_DB,
     decode_responses=True
-) 
\ No newline at end of file
+)
+
+# Для кода, выполняемого в event loop (async def обработчики, middleware):
+# синхронный клиент блокировал бы весь воркер на время запроса к Redis
+async_redis_client = redis.asyncio.Redis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    decode_responses=True
+)
@@ -1,22 +1,27 @@
-from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm import Session, joinedload, selectinload, undefer
+from sqlalchemy.orm.attributes import set_committed_value
 from app import models, schemas
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple, Set, Iterable
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi import HTTPException, status
-from sqlalchemy import func, desc, distinct, or_, text
+from sqlalchemy import func, desc, distinct, or_, text, tuple_, true, Float, select, literal, union_all
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array, insert as pg_insert
 from . import auth
+from app.core.cursor import encode_cursor, decode_cursor
+from app.enums import PropertySortEnum
+from app.core.geo import EARTH_RADIUS_M, cell_ranges
 import logging
 from passlib.context import CryptContext
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from collections import defaultdict
+import math
 
 logger = logging.getLogger(__name__)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Получение пользователя по email
 def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
-    user = db.query(models.User).filter(models.User.email == email).first()
-    print(f"🔍 Ищем пользователя по email: {email} -> Найден: {user}")  # 🛠 DEBUG
-    return user
+    return db.query(models.User).filter(models.User.email == email).first()
 
 
 # Создание нового пользователя
@@ -74,6 +79,301 @@ def get_properties(db: Session, skip: int = 0, limit: int = 10):
     
     return properties
 
+# Ключ сортировки списка и направление (True — по убыванию)
+PROPERTY_SORTS = {
+    PropertySortEnum.newest: (models.Property.created_at, True),
+    PropertySortEnum.price_asc: (models.Property.price, False),
+    PropertySortEnum.price_desc: (models.Property.price, True),
+    PropertySortEnum.price_per_m2_asc: (models.PROPERTY_PRICE_PER_M2, False),
+    PropertySortEnum.price_per_m2_desc: (models.PROPERTY_PRICE_PER_M2, True),
+    PropertySortEnum.price_drop_recent: (models.Property.price_changed_at, True),
+}
+# Сортировки, которые показывают только часть объявлений
+PROPERTY_SORT_FILTERS = {
+    PropertySortEnum.price_drop_recent: models.Property.price_change_pct < 0,
+}
+
+# Карточка объявления: только нужные списку колонки, главное фото
+# вычисляется коррелированным подзапросом (им же пользуется выгрузка)
+main_image_url = (
+    select(models.PropertyImage.image_url)
+    .where(models.PropertyImage.property_id == models.Property.id)
+    .order_by(models.PropertyImage.is_main.desc().nulls_last(), models.PropertyImage.id)
+    .limit(1)
+    .scalar_subquery()
+)
+# Счетчик просмотров — чтение property_stats по первичному ключу
+_views = (
+    select(models.PropertyStats.views)
+    .where(models.PropertyStats.property_id == models.Property.id)
+    .scalar_subquery()
+)
+PROPERTY_CARD_COLUMNS = [
+    models.Property.id,
+    models.Property.title,
+    models.Property.price,
+    models.Property.area,
+    models.Property.rooms,
+    models.Property.address,
+    models.Property.property_type,
+    models.Property.deal_type,
+    models.Property.created_at,
+    models.Property.version,
+    main_image_url.label("main_image_url"),
+    models.Property.previous_price,
+    models.Property.price_change_pct,
+    func.coalesce(_views, 0).label("views"),
+]
+
+def property_card(row, is_viewed: bool = False) -> schemas.PropertyCardOut:
+    """Строка с PROPERTY_CARD_COLUMNS -> карточка объявления"""
+    return schemas.PropertyCardOut.model_validate({**row._mapping, "is_viewed": is_viewed})
+
+def get_user_property_cards(db: Session, owner_id: int) -> List:
+    """Карточки объявлений пользователя, новые сверху"""
+    return db.query(*PROPERTY_CARD_COLUMNS)\
+        .filter(models.Property.owner_id == owner_id)\
+        .order_by(models.Property.created_at.desc(), models.Property.id.desc())\
+        .all()
+
+def apply_property_filters(query, filters: schemas.PropertyFilter):
+    """Накладывает структурные фильтры списка на запрос по Property"""
+    Property = models.Property
+    # Снятые с публикации объявления в каталог не попадают
+    query = query.filter(Property.is_active.is_(True))
+    if filters.deal_type is not None:
+        query = query.filter(Property.deal_type == models.DealTypeEnum(filters.deal_type.value))
+    if filters.property_type:
+        query = query.filter(Property.property_type == filters.property_type)
+    if filters.price_min is not None:
+        query = query.filter(Property.price >= filters.price_min)
+    if filters.price_max is not None:
+        query = query.filter(Property.price <= filters.price_max)
+    if filters.area_min is not None:
+        query = query.filter(Property.area >= filters.area_min)
+    if filters.area_max is not None:
+        query = query.filter(Property.area <= filters.area_max)
+    if filters.rooms:
+        query = query.filter(Property.rooms.in_(filters.rooms))
+    if filters.floor_min is not None:
+        query = query.filter(Property.floor >= filters.floor_min)
+    if filters.floor_max is not None:
+        query = query.filter(Property.floor <= filters.floor_max)
+    if filters.build_year_min is not None:
+        query = query.filter(Property.build_year >= filters.build_year_min)
+    if filters.build_year_max is not None:
+        query = query.filter(Property.build_year <= filters.build_year_max)
+    if filters.price_dropped_days is not None:
+        query = query.filter(
+            Property.price_change_pct < 0,
+            Property.price_changed_at >= datetime.now() - timedelta(days=filters.price_dropped_days)
+        )
+    return query
+
+def search_properties(
+    db: Session,
+    filters: schemas.PropertyFilter,
+    sort: PropertySortEnum = PropertySortEnum.newest,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    card: bool = False
+) -> Tuple[List, Optional[str]]:
+    """
+    Страница списка объявлений с keyset-пагинацией по (ключ сортировки, id).
+    Возвращает объявления и курсор следующей страницы (None на последней).
+    Фото и история цен не загружаются — см. load_property_collections.
+    С card=True вместо объектов Property возвращаются строки PROPERTY_CARD_COLUMNS.
+    Бросает ValueError при некорректном курсоре.
+    """
+    sort_key, descending = PROPERTY_SORTS[sort]
+    if card:
+        query = db.query(*PROPERTY_CARD_COLUMNS, sort_key.label("sort_key"))
+    else:
+        query = db.query(models.Property, sort_key.label("sort_key"))
+    query = apply_property_filters(query, filters)
+    if sort in PROPERTY_SORT_FILTERS:
+        query = query.filter(PROPERTY_SORT_FILTERS[sort])
+    # Без ключа сортировки строку нельзя поставить в keyset-порядок
+    query = query.filter(sort_key.isnot(None))
+
+    position = tuple_(sort_key, models.Property.id)
+    if cursor:
+        key, last_id = decode_cursor(cursor, sort.value)
+        query = query.filter(position < tuple_(key, last_id) if descending else position > tuple_(key, last_id))
+
+    if descending:
+        query = query.order_by(sort_key.desc(), models.Property.id.desc())
+    else:
+        query = query.order_by(sort_key.asc(), models.Property.id.asc())
+
+    rows = query.limit(limit + 1).all()
+    items = rows if card else [row[0] for row in rows]
+    next_cursor = None
+    if len(rows) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(sort.value, rows[limit - 1].sort_key, items[-1].id)
+    return items, next_cursor
+
+def load_property_collections(db: Session, properties: List[models.Property]) -> None:
+    """
+    Загружает фото, последние изменения цены и владельцев для уже выбранных
+    объявлений тремя запросами на всю страницу.
+    """
+    ids = [prop.id for prop in properties]
+    if not ids:
+        return
+    owner_ids = {prop.owner_id for prop in properties}
+    owners = {
+        user.id: user
+        for user in db.query(models.User).options(undefer(models.User.properties_count)).filter(models.User.id.in_(owner_ids))
+    }
+    images = defaultdict(list)
+    for image in db.query(models.PropertyImage).filter(models.PropertyImage.property_id.in_(ids)).order_by(models.PropertyImage.id):
+        images[image.property_id].append(image)
+    price_history = get_price_history_preview(db, ids)
+    for prop in properties:
+        set_committed_value(prop, "images", images[prop.id])
+        set_committed_value(prop, "price_history", price_history[prop.id])
+        set_committed_value(prop, "owner", owners.get(prop.owner_id))
+
+def touch_property(db: Session, property_id: int) -> None:
+    """Обновляет версию объявления; вызывается до commit вместе с изменением"""
+    db.query(models.Property).filter(models.Property.id == property_id).update(
+        {models.Property.version: models.PROPERTY_VERSION_SEQ.next_value()},
+        synchronize_session=False
+    )
+
+def distance_to(lat: float, lng: float):
+    """SQL-выражение: расстояние по гаверсинусу от объявления до точки, в метрах"""
+    Property = models.Property
+    half_dlat = func.radians(Property.latitude - lat, type_=Float) * 0.5
+    half_dlng = func.radians(Property.longitude - lng, type_=Float) * 0.5
+    a = (
+        func.power(func.sin(half_dlat), 2)
+        + math.cos(math.radians(lat)) * func.cos(func.radians(Property.latitude), type_=Float)
+        * func.power(func.sin(half_dlng), 2)
+    )
+    return 2 * EARTH_RADIUS_M * func.asin(func.sqrt(func.least(a, 1.0)), type_=Float)
+
+def search_properties_geo(
+    db: Session,
+    filters: schemas.PropertyFilter,
+    bbox: Tuple[float, float, float, float],
+    center: Tuple[float, float],
+    radius_m: Optional[float] = None,
+    limit: int = 500
+) -> List[Tuple[models.Property, float]]:
+    """
+    Объявления внутри рамки bbox = (min_lat, min_lng, max_lat, max_lng),
+    отсортированные по расстоянию до center. С radius_m дополнительно
+    отсекаются точки за пределами круга.
+    Отбор идет по индексу geo_cell, затем уточняется по координатам.
+    """
+    Property = models.Property
+    min_lat, min_lng, max_lat, max_lng = bbox
+    distance = distance_to(*center).label("distance_m")
+
+    query = db.query(Property, distance)
+    query = apply_property_filters(query, filters)
+    ranges = cell_ranges(min_lat, min_lng, max_lat, max_lng)
+    if ranges:
+        query = query.filter(or_(*[Property.geo_cell.between(lo, hi) for lo, hi in ranges]))
+    query = query.filter(
+        Property.latitude.between(min_lat, max_lat),
+        Property.longitude.between(min_lng, max_lng)
+    )
+    if radius_m is not None:
+        query = query.filter(distance_to(*center) <= radius_m)
+
+    return query.order_by(distance, Property.id).limit(limit).all()
+
+# Границы ценовых диапазонов фасета (для аренды и продажи разные шкалы)
+RENT_PRICE_BUCKETS = [500, 1000, 2000, 3000, 5000, 10000]
+SALE_PRICE_BUCKETS = [50000, 100000, 200000, 300000, 500000, 1000000, 2000000]
+
+# Флаги удобств: имя фасета -> условие
+FACET_AMENITIES = {
+    "has_balcony": models.Property.has_balcony.is_(True),
+    "has_parking": func.cardinality(models.Property.parking) > 0,
+    "has_furniture": func.cardinality(models.Property.furniture) > 0,
+    "has_appliances": func.cardinality(models.Property.appliances) > 0,
+    "has_lift": models.Property.lifts_passenger > 0,
+}
+
+def get_property_facets(db: Session, filters: schemas.PropertyFilter) -> Dict:
+    """
+    Счетчики объявлений по фасетам для текущего набора фильтров.
+    Все фасеты считаются за один проход по таблице через GROUPING SETS;
+    флаги удобств — агрегатами с FILTER в строке общего итога.
+    """
+    Property = models.Property
+    is_rent = filters.deal_type is not None and filters.deal_type.value == "rent"
+    thresholds = RENT_PRICE_BUCKETS if is_rent else SALE_PRICE_BUCKETS
+    facets = {
+        "deal_type": Property.deal_type,
+        "property_type": Property.property_type,
+        "rooms": Property.rooms,
+        "renovation": Property.renovation,
+        "price": func.width_bucket(Property.price, array([float(edge) for edge in thresholds])),
+    }
+
+    columns = [column.label(name) for name, column in facets.items()]
+    columns += [func.grouping(column).label(f"g_{name}") for name, column in facets.items()]
+    columns += [func.count().filter(condition).label(name) for name, condition in FACET_AMENITIES.items()]
+    query = db.query(*columns, func.count().label("count"))
+    query = apply_property_filters(query, filters)
+    query = query.group_by(func.grouping_sets(*[tuple_(column) for column in facets.values()], tuple_()))
+
+    result = {"total": 0, "price": [], "amenities": {}}
+    result.update({name: {} for name in facets if name != "price"})
+    for row in query.all():
+        grouped = [name for name in facets if getattr(row, f"g_{name}") == 0]
+        if not grouped:
+            result["total"] = row.count
+            result["amenities"] = {name: getattr(row, name) for name in FACET_AMENITIES}
+            continue
+        name = grouped[0]
+        value = getattr(row, name)
+        if name == "price":
+            bounds = [None] + thresholds + [None]
+            result["price"].append({"min": bounds[value], "max": bounds[value + 1], "count": row.count})
+        elif value is not None and value != "":
+            key = value.value if isinstance(value, models.DealTypeEnum) else str(value)
+            result[name][key] = row.count
+
+    result["price"].sort(key=lambda bucket: bucket["min"] or 0)
+    return result
+
+def text_search_properties(
+    db: Session,
+    q: str,
+    filters: schemas.PropertyFilter,
+    skip: int = 0,
+    limit: int = 20
+) -> List[models.Property]:
+    """
+    Полнотекстовый поиск по заголовку, описанию и адресу с ранжированием.
+    Совпадение по словоформам (russian) или точным словам (simple), плюс
+    нечеткое совпадение адреса по триграммам для опечаток.
+    """
+    Property = models.Property
+    ts_query = func.websearch_to_tsquery("russian", q).op("||")(func.websearch_to_tsquery("simple", q))
+    text_match = Property.search_vector.op("@@")(ts_query)
+    # address %> q: слово из q похоже на часть адреса (индекс gin_trgm_ops)
+    address_match = Property.address.op("%>")(q)
+    rank = (
+        func.ts_rank_cd(Property.search_vector, ts_query, type_=Float)
+        + func.word_similarity(q, Property.address, type_=Float) * 0.5
+    )
+
+    query = db.query(Property).options(
+        selectinload(Property.images),
+        selectinload(Property.price_history),
+        selectinload(Property.owner).undefer(models.User.properties_count)
+    ).filter(or_(text_match, address_match))
+    query = apply_property_filters(query, filters)
+    return query.order_by(rank.desc(), Property.id.desc()).offset(skip).limit(limit).all()
+
 # Получение одного объявления по ID
 def get_property(db: Session, property_id: int, user_id: int = None):
     prop = db.query(models.Property).options(
@@ -142,16 +442,18 @@ def create_property(db: Session, property: schemas.PropertyCreate, owner_id: int
         furniture=property.furniture or [],
         appliances=property.appliances or [],
         connectivity=property.connectivity or [],
-        build_year=property.build_year
+        build_year=property.build_year,
+        latitude=property.latitude,
+        longitude=property.longitude
     )
 
     db.add(db_property)
+    db.flush()
+    # Первая запись в истории цен — в той же транзакции, что и объявление
+    add_price_history(db, db_property.id, db_property.price)
     db.commit()
     db.refresh(db_property)
     
-    # Создаем первую запись в истории цен
-    create_price_history(db, db_property.id, db_property.price)
-    
     return db_property
 
 # Обновление объявления
@@ -160,15 +462,16 @@ def update_property(db: Session, property_id: int, property_update: schemas.Prop
     if not db_property:
         return None
 
-    # Сначала сохраняем старую цену в историю, если цена изменилась
+    # Сначала сохраняем старую цену в историю, если цена изменилась;
+    # история и поля последнего изменения пишутся одним commit с объявлением
     if 'price' in property_update.dict(exclude_unset=True) and property_update.price != db_property.price:
-        old_price = db_property.price
-        create_price_history(db, property_id, old_price)
+        record_price_change(db, db_property, property_update.price)
 
     # Обновляем поля объявления
     update_data = property_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_property, field, value)
+    db_property.version = models.PROPERTY_VERSION_SEQ.next_value()
 
     try:
         db.commit()
@@ -197,24 +500,48 @@ def get_favorite_by_user_and_property(db: Session, user_id: int, property_id: in
     ).first()
 
 def add_to_favorites(db: Session, user_id: int, property_id: int) -> Optional[models.Favorite]:
-    existing_favorite = get_favorite_by_user_and_property(db, user_id, property_id)
-    if existing_favorite:
-        return existing_favorite
-
-    fav = models.Favorite(user_id=user_id, property_id=property_id)
-    db.add(fav)
+    # Одна вставка; повторное добавление не создает дубликат (uq_favorites_user_property)
+    stmt = pg_insert(models.Favorite).values(user_id=user_id, property_id=property_id)\
+        .on_conflict_do_nothing(constraint="uq_favorites_user_property")\
+        .returning(models.Favorite)
+    fav = db.scalars(stmt).first()
+    if fav is not None:
+        increment_daily_metric(db, property_id, "favorites_added")
     db.commit()
-    db.refresh(fav)
+    if fav is None:
+        # Объявление уже было в избранном
+        fav = get_favorite_by_user_and_property(db, user_id, property_id)
     return fav
 
 def get_favorites(db: Session, user_id: int) -> List[models.Favorite]:
     return db.query(models.Favorite)\
         .filter(models.Favorite.user_id == user_id)\
         .options(
-            joinedload(models.Favorite.property).joinedload(models.Property.images)
+            joinedload(models.Favorite.property).joinedload(models.Property.images),
+            joinedload(models.Favorite.property).selectinload(models.Property.owner).undefer(models.User.properties_count)
         )\
         .all()
 
+def get_favorite_cards(db: Session, user_id: int) -> List[schemas.FavoriteCardOut]:
+    """Избранное пользователя с карточками объявлений одним запросом"""
+    rows = db.query(
+        models.Favorite.id.label("favorite_id"),
+        models.Favorite.created_at.label("favorite_created_at"),
+        *PROPERTY_CARD_COLUMNS
+    ).join(models.Property, models.Property.id == models.Favorite.property_id)\
+        .filter(models.Favorite.user_id == user_id)\
+        .order_by(models.Favorite.created_at.desc())\
+        .all()
+    return [
+        schemas.FavoriteCardOut(
+            id=row.favorite_id,
+            property_id=row.id,
+            created_at=row.favorite_created_at,
+            property=property_card(row)
+        )
+        for row in rows
+    ]
+
 def remove_from_favorites(db: Session, user_id: int, property_id: int) -> Optional[models.Favorite]:
     favorite = get_favorite_by_user_and_property(db, user_id, property_id)
     if favorite:
@@ -235,32 +562,103 @@ def get_property_images(db: Session, property_id: int) -> List[models.PropertyIm
 
 # История просмотров
 def create_history(db: Session, history: schemas.HistoryCreate, user_id: int):
-    # Проверяем, существует ли уже такая запись
-    existing_history = db.query(models.History).filter(
-        models.History.user_id == user_id,
-        models.History.property_id == history.property_id
-    ).first()
-    
-    if existing_history:
-        # Если запись существует, обновляем время просмотра
-        existing_history.viewed_at = datetime.now()
-        db.commit()
-        db.refresh(existing_history)
-        return existing_history
-    
-    # Если записи нет, создаем новую
-    db_history = models.History(
+    # Одна вставка: новая запись или обновление времени просмотра существующей
+    stmt = pg_insert(models.History).values(
         user_id=user_id,
-        property_id=history.property_id
+        property_id=history.property_id,
+        viewed_at=func.now()
     )
-    db.add(db_history)
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_history_user_property",
+        set_={"viewed_at": stmt.excluded.viewed_at}
+    ).returning(models.History)
+    db_history = db.scalars(stmt, execution_options={"populate_existing": True}).one()
     db.commit()
-    db.refresh(db_history)
     return db_history
 
+# Дневные метрики объявлений
+def increment_daily_metric(db: Session, property_id: int, metric: str, amount: int = 1, day: Optional[date] = None):
+    """Прибавляет amount к дневному счетчику метрики (в текущей транзакции, без commit)"""
+    table = models.PropertyMetricsDaily
+    stmt = pg_insert(table).values(property_id=property_id, day=day or date.today(), **{metric: amount})
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.property_id, table.day],
+        set_={metric: getattr(table, metric) + stmt.excluded[metric]}
+    ))
+
+ANALYTICS_METRICS = ("views", "unique_viewers", "favorites_added", "chats_started")
+
+def get_owner_analytics(db: Session, owner_id: int, days: int) -> schemas.OwnerAnalyticsOut:
+    """
+    Дневные метрики всех объявлений владельца за последние days дней одним запросом
+    по агрегатам (property_views_daily и property_metrics_daily).
+    Пропущенные дни заполняются нулями, ряды выровнены по общему списку дат.
+    """
+    today = date.today()
+    day_list = [today - timedelta(days=offset) for offset in range(days - 1, -1, -1)]
+    start = day_list[0]
+
+    views = models.PropertyViewsDaily
+    metrics = models.PropertyMetricsDaily
+    activity = union_all(
+        select(
+            views.property_id, views.day,
+            views.views.label("views"), views.unique_users.label("unique_viewers"),
+            literal(0).label("favorites_added"), literal(0).label("chats_started")
+        ).where(views.day >= start),
+        select(
+            metrics.property_id, metrics.day,
+            literal(0), literal(0),
+            metrics.favorites_added, metrics.chats_started
+        ).where(metrics.day >= start)
+    ).subquery()
+
+    rows = db.query(
+        models.Property.id,
+        models.Property.title,
+        activity.c.day,
+        *[func.sum(activity.c[metric]).label(metric) for metric in ANALYTICS_METRICS]
+    )\
+        .outerjoin(activity, activity.c.property_id == models.Property.id)\
+        .filter(models.Property.owner_id == owner_id)\
+        .group_by(models.Property.id, models.Property.title, activity.c.day)\
+        .order_by(models.Property.id)\
+        .all()
+
+    day_index = {day: i for i, day in enumerate(day_list)}
+    series: Dict[int, dict] = {}
+    for row in rows:
+        item = series.get(row.id)
+        if item is None:
+            item = series[row.id] = {
+                "property_id": row.id,
+                "title": row.title,
+                **{metric: [0] * days for metric in ANALYTICS_METRICS},
+            }
+        i = day_index.get(row.day)
+        if i is None:
+            continue
+        for metric in ANALYTICS_METRICS:
+            item[metric][i] = int(getattr(row, metric) or 0)
+
+    return schemas.OwnerAnalyticsOut(
+        days=day_list,
+        properties=[schemas.PropertyAnalyticsSeriesOut(**item) for item in series.values()]
+    )
+
 # Функции для работы с просмотрами
+def assign_transaction_id(db: Session) -> None:
+    """
+    Назначает текущей транзакции xid до того, как она возьмет id из
+    последовательности property_views. Без этого xid назначается только при
+    вставке строки, уже после nextval(), и граница агрегации
+    (app.services.view_rollup.VISIBILITY_SQL) может пропустить строку.
+    """
+    db.execute(select(func.pg_current_xact_id()))
+
 def add_property_view(db: Session, user_id: int, property_id: int):
     """Добавляет запись о просмотре объявления"""
+    assign_transaction_id(db)
     view = models.PropertyViews(user_id=user_id, property_id=property_id)
     db.add(view)
     db.commit()
@@ -294,13 +692,56 @@ def is_property_viewed(db: Session, user_id: int, property_id: int) -> bool:
     # Возвращаем True только если есть и запись о просмотре, и запись в истории
     return view is not None and history is not None
 
+def get_viewed_property_ids(db: Session, user_id: int, property_ids: Iterable[int]) -> Set[int]:
+    """
+    Возвращает id объявлений из property_ids, просмотренных пользователем,
+    одним запросом на всю страницу. Условия те же, что в is_property_viewed.
+    """
+    property_ids = list(property_ids)
+    if not property_ids:
+        return set()
+
+    has_view = db.query(models.PropertyViews.id).filter(
+        models.PropertyViews.user_id == user_id,
+        models.PropertyViews.property_id == models.Property.id
+    ).exists()
+    has_history = db.query(models.History.id).filter(
+        models.History.user_id == user_id,
+        models.History.property_id == models.Property.id
+    ).exists()
+
+    rows = db.query(models.Property.id).filter(
+        models.Property.id.in_(property_ids),
+        models.Property.owner_id != user_id,
+        has_view,
+        has_history
+    ).all()
+    return {row.id for row in rows}
+
 # Работа с историей цен
-def create_price_history(db: Session, property_id: int, price: float) -> models.PriceHistory:
+def add_price_history(db: Session, property_id: int, price: float) -> models.PriceHistory:
+    """Добавляет запись в историю цен без commit"""
     db_price_history = models.PriceHistory(
         property_id=property_id,
         price=price
     )
     db.add(db_price_history)
+    return db_price_history
+
+def record_price_change(db: Session, db_property: models.Property, new_price: float) -> None:
+    """
+    Сохраняет старую цену в историю и обновляет поля последнего изменения
+    (previous_price, price_changed_at, price_change_pct). Без commit:
+    новая цена записывается вызывающим кодом в той же транзакции.
+    """
+    old_price = db_property.price
+    add_price_history(db, db_property.id, old_price)
+    db_property.previous_price = old_price
+    db_property.price_changed_at = datetime.now()
+    db_property.price_change_pct = (new_price - old_price) / old_price * 100 if old_price else None
+
+def create_price_history(db: Session, property_id: int, price: float) -> models.PriceHistory:
+    db_price_history = add_price_history(db, property_id, price)
     db.commit()
     db.refresh(db_price_history)
     return db_price_history
@@ -312,14 +753,63 @@ def get_price_history(db: Session, property_id: int, limit: int = 2) -> List[mod
         .limit(limit)\
         .all()
 
+# Сколько последних записей истории цен встраивается в объявление;
+# полный ряд отдается с прореживанием через get_price_history_buckets
+PRICE_HISTORY_PREVIEW = 10
+
+def get_price_history_preview(db: Session, property_ids: List[int]) -> Dict[int, List[models.PriceHistory]]:
+    """Последние PRICE_HISTORY_PREVIEW записей истории цен для каждого объявления, одним запросом"""
+    history = models.PriceHistory
+    ranked = select(
+        history.id,
+        func.row_number().over(
+            partition_by=history.property_id,
+            order_by=(history.change_date.desc(), history.id.desc())
+        ).label("rn")
+    ).where(history.property_id.in_(property_ids)).subquery()
+    preview = defaultdict(list)
+    entries = db.query(history)\
+        .join(ranked, ranked.c.id == history.id)\
+        .filter(ranked.c.rn <= PRICE_HISTORY_PREVIEW)\
+        .order_by(history.id)
+    for entry in entries:
+        preview[entry.property_id].append(entry)
+    return preview
+
+def get_price_history_buckets(db: Session, property_id: int, buckets: int) -> List:
+    """
+    История цен, сжатая до buckets равных интервалов времени (date_bin):
+    начало интервала, минимальная, максимальная и последняя цена, число записей.
+    Пустые интервалы не возвращаются.
+    """
+    history = models.PriceHistory
+    bounds = select(
+        func.min(history.change_date).label("first"),
+        func.max(history.change_date).label("last")
+    ).where(history.property_id == property_id).subquery()
+    # +1 секунда, чтобы последняя запись попала в последний, а не в buckets+1-й интервал
+    width = (bounds.c.last - bounds.c.first + timedelta(seconds=1)) / buckets
+    start = func.date_bin(width, history.change_date, bounds.c.first).label("start")
+    last_price = func.array_agg(aggregate_order_by(history.price, history.change_date.desc(), history.id.desc()))[1]
+    return db.query(
+        start,
+        func.min(history.price).label("min"),
+        func.max(history.price).label("max"),
+        last_price.label("last"),
+        func.count().label("count")
+    )\
+        .select_from(history)\
+        .join(bounds, true())\
+        .filter(history.property_id == property_id, history.change_date.isnot(None))\
+        .group_by(start)\
+        .order_by(start)\
+        .all()
+
 def get_price_change_percentage(db: Session, property_id: int) -> Optional[float]:
-    history = get_price_history(db, property_id, limit=2)
-    if len(history) < 2:
-        return None
-    
-    old_price = history[1].price
-    new_price = history[0].price
-    return ((new_price - old_price) / old_price) * 100
+    """Процент последнего изменения цены (хранится в объявлении)"""
+    return db.query(models.Property.price_change_pct)\
+        .filter(models.Property.id == property_id)\
+        .scalar()
 
 def authenticate_user(db: Session, email: str, password: str):
     """
@@ -10,4 +10,17 @@ class PropertyTypeEnum(str, enum.Enum):
 # Добавляем недостающий Enum
 class DealTypeEnum(str, enum.Enum):  
     SALE = "sale"
-    RENT = "rent"
\ No newline at end of file
+    RENT = "rent"
+
+class PropertySortEnum(str, enum.Enum):
+    newest = "newest"
+    price_asc = "price_asc"
+    price_desc = "price_desc"
+    price_per_m2_asc = "price_per_m2_asc"
+    price_per_m2_desc = "price_per_m2_desc"
+    price_drop_recent = "price_drop_recent"
+
+
+class PropertyViewEnum(str, enum.Enum):
+    full = "full"
+    card = "card"
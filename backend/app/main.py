@@ -1,12 +1,14 @@
+import asyncio
 import os
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.routes import users, properties, favorites, history, uploads, user_reviews
-from app.database import Base, engine, SessionLocal
+from app.routes import users, properties, favorites, history, uploads, user_reviews, analytics, metrics
+from app.database import Base, engine, SessionLocal, dispose_engines, pin_primary, run_replica_monitor
 from app import crud
+from app.services import view_queue, view_stats, view_rollup, listing_metrics, market_stats
 
 # Создаем таблицы в базе данных
 Base.metadata.create_all(bind=engine)
@@ -32,6 +34,14 @@ app.add_middleware(
     expose_headers=["*"]  # Разрешаем доступ ко всем заголовкам в ответе
 )
 
+# Read-your-writes: после успешного изменения клиент какое-то время читает с primary
+@app.middleware("http")
+async def pin_writers_to_primary(request: Request, call_next):
+    response = await call_next(request)
+    if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        await pin_primary(request)
+    return response
+
 # Монтируем статические файлы
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
@@ -42,6 +52,8 @@ app.include_router(favorites.router, prefix="/favorites", tags=["favorites"])
 app.include_router(history.router, prefix="/history", tags=["history"])
 app.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
 app.include_router(user_reviews.router, prefix="/reviews", tags=["reviews"])
+app.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 
 # Добавляем обработчик ошибок
 @app.exception_handler(Exception)
@@ -64,6 +76,41 @@ async def startup_event():
         crud.update_existing_images(db)
     finally:
         db.close()
+    # Фоновая запись просмотров из очереди в БД
+    app.state.view_flusher = asyncio.create_task(view_queue.run_view_flusher())
+    # Фоновый сброс счетчиков просмотров из Redis в property_stats
+    app.state.stats_flusher = asyncio.create_task(view_stats.run_stats_flusher())
+    # Дневные агрегаты просмотров и очистка старых сырых событий
+    app.state.rollup_job = asyncio.create_task(view_rollup.run_rollup_job())
+    # Счетчики новых чатов от сервиса чатов
+    app.state.metrics_flusher = asyncio.create_task(listing_metrics.run_metrics_flusher())
+    # Периодический пересчет рыночной статистики
+    app.state.market_stats_job = asyncio.create_task(market_stats.run_market_stats_job())
+    # Проверка отставания реплик для чтения
+    app.state.replica_monitor = asyncio.create_task(run_replica_monitor())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.view_flusher.cancel()
+    app.state.stats_flusher.cancel()
+    app.state.rollup_job.cancel()
+    app.state.metrics_flusher.cancel()
+    app.state.market_stats_job.cancel()
+    app.state.replica_monitor.cancel()
+    # Дописываем то, что успело накопиться в очереди и счетчиках
+    try:
+        await asyncio.to_thread(view_queue.flush_view_queue)
+    except Exception as e:
+        print(f"Error flushing view queue on shutdown: {e}")
+    try:
+        await asyncio.to_thread(view_stats.flush_view_counters)
+    except Exception as e:
+        print(f"Error flushing view counters on shutdown: {e}")
+    try:
+        await asyncio.to_thread(listing_metrics.flush_listing_metrics)
+    except Exception as e:
+        print(f"Error flushing listing metrics on shutdown: {e}")
+    await dispose_engines()
 
 def custom_openapi():
     if app.openapi_schema:
@@ -94,6 +141,7 @@ def custom_openapi():
         ("users/me/properties", ["get"]),
         ("favorites", ["get", "post", "delete"]),
         ("properties", ["post", "put", "delete"]),
+        ("properties/export", ["get"]),
         ("history", ["get", "post", "delete"])
     ]
 
@@ -1,7 +1,10 @@
 import enum
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Enum, DateTime, Text, func, ARRAY, JSON, UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, ForeignKey, Enum, Date, DateTime, Text, func, ARRAY, JSON, UniqueConstraint, Index, Computed, Sequence, event, DDL, select
+from sqlalchemy.orm import relationship, deferred, column_property
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from app.database import Base
+from app.core.geo import GEO_CELL_SQL
+from app.core.partitions import ensure_partitions
 
 
 # 🔹 Определяем роли пользователей
@@ -26,6 +29,8 @@ class User(Base):
     avatar_url = Column(String, nullable=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, server_default=func.now())
+    # Версия токенов: увеличивается при смене email или пароля (auth.revoke_tokens)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
     
     properties = relationship("Property", back_populates="owner", cascade="all, delete-orphan")
     favorites = relationship("Favorite", back_populates="user", cascade="all, delete-orphan")
@@ -36,6 +41,21 @@ class User(Base):
 
   
 
+# Заголовок и адрес важнее описания; словоформы ищутся через russian,
+# названия районов и улиц — как есть через simple
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A')"
+    " || setweight(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(address, '')), 'A')"
+    " || setweight(to_tsvector('russian', coalesce(address, '')), 'B')"
+    " || setweight(to_tsvector('russian', coalesce(description, '')), 'C')"
+)
+
+
+# Версия объявления берется из общей последовательности и обновляется при
+# любом изменении объявления, его фото или истории цен (для ETag)
+PROPERTY_VERSION_SEQ = Sequence("property_version_seq", metadata=Base.metadata)
+
+
 class Property(Base):
     __tablename__ = "properties"
 
@@ -51,8 +71,10 @@ class Property(Base):
     property_type = Column(String, nullable=False)
     latitude = Column(Float)
     longitude = Column(Float)
+    # Номер геоячейки, вычисляется Postgres из latitude/longitude (см. app.core.geo)
+    geo_cell = Column(BigInteger, Computed(GEO_CELL_SQL, persisted=True), index=True)
     image_url = Column(String)
-    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
     ceiling_height = Column(Float, nullable=True)
     property_condition = Column(String, nullable=True)
     has_balcony = Column(Boolean, default=False)
@@ -75,10 +97,20 @@ class Property(Base):
     appliances = Column(ARRAY(String), default=list)
     connectivity = Column(ARRAY(String), default=list)
     created_at = Column(DateTime, server_default=func.now())
+    version = Column(BigInteger, server_default=PROPERTY_VERSION_SEQ.next_value(), nullable=False)
+    # Последнее изменение цены; поддерживается crud.update_property вместе с price_history
+    previous_price = Column(Float, nullable=True)
+    price_changed_at = Column(DateTime, nullable=True)
+    price_change_pct = Column(Float, nullable=True)
+    # Снятые с публикации объявления (например, пропавшие из фида партнера) не попадают в каталог
+    is_active = Column(Boolean, nullable=False, default=True, server_default="true")
     
     # ENUM теперь соответствует Pydantic
     deal_type = Column(Enum(DealTypeEnum, name="deal_type_enum", create_type=False), nullable=False)
 
+    # Полнотекстовый индекс, Postgres пересчитывает его при каждой записи
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+
     # Связи
     owner = relationship("User", back_populates="properties")
     favorites = relationship("Favorite", back_populates="property", cascade="all, delete-orphan")
@@ -87,13 +119,46 @@ class Property(Base):
     property_views = relationship("PropertyViews", back_populates="property", cascade="all, delete-orphan")
     price_history = relationship("PriceHistory", back_populates="property", cascade="all, delete-orphan")
 
+    # Составные индексы под keyset-пагинацию списка: (ключ сортировки, id)
+    __table_args__ = (
+        Index("ix_properties_created_at_id", "created_at", "id"),
+        Index("ix_properties_price_id", "price", "id"),
+        Index("ix_properties_deal_type_created_at_id", "deal_type", "created_at", "id"),
+        Index("ix_properties_deal_type_price_id", "deal_type", "price", "id"),
+        Index("ix_properties_property_type_deal_type", "property_type", "deal_type"),
+        Index("ix_properties_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_properties_address_trgm", "address", postgresql_using="gin", postgresql_ops={"address": "gin_trgm_ops"}),
+        # Сортировка «цена недавно снижена»: только объявления со снижением
+        Index("ix_properties_price_drop_changed_at_id", "price_changed_at", "id",
+              postgresql_where=price_change_pct < 0),
+    )
+
+
+# Цена за м² — выражение используется и для сортировки списка, и в индексе
+PROPERTY_PRICE_PER_M2 = Property.price.op("/", return_type=Float)(func.nullif(Property.area, 0))
+
+Index("ix_properties_price_per_m2_id", PROPERTY_PRICE_PER_M2, Property.id)
+
+# Количество объявлений пользователя одним COUNT по индексу owner_id,
+# без загрузки User.properties; грузится по обращению или через undefer()
+User.properties_count = column_property(
+    select(func.count(Property.id))
+    .where(Property.owner_id == User.id)
+    .correlate_except(Property)
+    .scalar_subquery(),
+    deferred=True
+)
+
+# Триграммный индекс по адресу требует расширения pg_trgm
+event.listen(Property.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
  
 
 class PropertyImage(Base):
     __tablename__ = "property_images"
 
     id = Column(Integer, primary_key=True, index=True)
-    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), nullable=False)
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), nullable=False, index=True)
     image_url = Column(String, nullable=False)
     is_main = Column(Boolean, default=False)
     uploaded_at = Column(DateTime, server_default=func.now())
@@ -113,6 +178,10 @@ class Favorite(Base):
     user = relationship("User", back_populates="favorites")
     property = relationship("Property", back_populates="favorites")
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "property_id", name="uq_favorites_user_property"),
+    )
+
 
 class History(Base):
     __tablename__ = "history"
@@ -125,18 +194,111 @@ class History(Base):
     user = relationship("User", back_populates="history")
     property = relationship("Property", back_populates="history")
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "property_id", name="uq_history_user_property"),
+        Index("ix_history_viewed_at", "viewed_at"),
+    )
+
 
 class PropertyViews(Base):
+    """Сырые просмотры; таблица разбита на помесячные партиции по viewed_at (app.core.partitions)"""
     __tablename__ = "property_views"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Ключ партиционирования обязан входить в первичный ключ
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    viewed_at = Column(DateTime, primary_key=True, server_default=func.now(), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), nullable=False)
-    viewed_at = Column(DateTime, server_default=func.now())
 
     user = relationship("User", back_populates="property_views")
     property = relationship("Property", back_populates="property_views")
 
+    __table_args__ = (
+        Index("ix_property_views_user_id_property_id", "user_id", "property_id"),
+        Index("ix_property_views_viewed_at", "viewed_at"),
+        {"postgresql_partition_by": "RANGE (viewed_at)"},
+    )
+
+
+# При create_all у партиционированной таблицы сразу появляются текущие партиции
+event.listen(
+    PropertyViews.__table__, "after_create",
+    lambda target, connection, **kw: ensure_partitions(connection, target.name)
+)
+
+
+class PropertyViewsDaily(Base):
+    """Просмотры объявления за день, агрегируются из property_views"""
+    __tablename__ = "property_views_daily"
+
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    views = Column(BigInteger, nullable=False, server_default="0")
+    unique_users = Column(Integer, nullable=False, server_default="0")
+
+
+class PropertyMetricsDaily(Base):
+    """Дневные счетчики действий с объявлением: добавления в избранное и новые чаты"""
+    __tablename__ = "property_metrics_daily"
+
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    favorites_added = Column(Integer, nullable=False, server_default="0")
+    chats_started = Column(Integer, nullable=False, server_default="0")
+
+
+class MarketStatsSnapshot(Base):
+    """Снимок рыночной статистики по сегментам (см. app.services.market_stats)"""
+    __tablename__ = "market_stats_snapshots"
+
+    id = Column(Integer, primary_key=True)
+    generated_at = Column(DateTime, nullable=False)
+    listings = Column(Integer, nullable=False)
+    # "<property_type>|<deal_type>" -> JSON-строка с колоночными массивами сегментов
+    segments = Column(JSON, nullable=False)
+
+
+class RollupCheckpoint(Base):
+    """Граница обработанных событий (последний id) для инкрементальных агрегаций"""
+    __tablename__ = "rollup_checkpoints"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(BigInteger, nullable=False, server_default="0")
+    # Граница, до которой все строки гарантированно закоммичены (видимы)
+    visible_id = Column(BigInteger, nullable=False, server_default="0")
+    # max(id) и xmax снимка с прошлого запуска: max(id) станет visible_id,
+    # когда завершатся все транзакции, шедшие в тот момент
+    pending_id = Column(BigInteger, nullable=True)
+    pending_xmax = Column(BigInteger, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class PropertyStats(Base):
+    """Агрегированные счетчики просмотров, накапливаются в Redis и периодически сбрасываются сюда"""
+    __tablename__ = "property_stats"
+
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), primary_key=True)
+    views = Column(BigInteger, nullable=False, server_default="0")
+    unique_viewers = Column(BigInteger, nullable=False, server_default="0")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class FeedOffer(Base):
+    """Объявление из XML-фида партнера: внешний id и хэш содержимого на момент последней синхронизации"""
+    __tablename__ = "feed_offers"
+
+    id = Column(Integer, primary_key=True)
+    feed = Column(String, nullable=False)
+    external_id = Column(String, nullable=False)
+    property_id = Column(Integer, ForeignKey("properties.id", ondelete="CASCADE"), nullable=False, unique=True)
+    content_hash = Column(String(40), nullable=False)
+    is_active = Column(Boolean, nullable=False, default=True, server_default="true")
+    synced_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        UniqueConstraint("feed", "external_id", name="uq_feed_offers_feed_external_id"),
+    )
+
 
 class PriceHistory(Base):
     __tablename__ = "price_history"
@@ -148,6 +310,10 @@ class PriceHistory(Base):
 
     property = relationship("Property", back_populates="price_history")
 
+    __table_args__ = (
+        Index("ix_price_history_property_id_change_date", "property_id", "change_date"),
+    )
+
 
 class UserReview(Base):
     __tablename__ = "user_reviews"
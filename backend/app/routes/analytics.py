@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.database import get_db
+from app.enums import DealTypeEnum
+from app.schemas import MarketStatsOut
+from app.services import market_stats
+
+router = APIRouter()
+
+@router.get("/market", response_model=MarketStatsOut)
+def get_market_stats(
+    property_type: Optional[str] = None,
+    deal_type: Optional[DealTypeEnum] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Цена за м² (p25, медиана, p75), число объявлений и медианный срок экспозиции
+    по сегментам тип × сделка × комнаты × геоячейка.
+    Отдается последний снимок периодического расчета, без запросов к properties.
+    БД читается только при промахе Redis, и прочитанный снимок публикуется
+    обратно, поэтому сессия на primary: с отстающей реплики вернулся бы старый снимок.
+    """
+    payload = market_stats.read_market_snapshot(
+        db, property_type=property_type, deal_type=deal_type.value if deal_type else None
+    )
+    if payload is None:
+        raise HTTPException(status_code=503, detail="Статистика еще не рассчитана")
+    # Снимок уже сериализован, повторная валидация через MarketStatsOut не нужна
+    return Response(content=payload, media_type="application/json")
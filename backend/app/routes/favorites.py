@@ -1,61 +1,76 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from app import schemas, crud, auth
-from app.database import get_db
+from typing import List, Union
+from app import schemas, crud, auth, models
+from app.database import get_async_db
+from app.enums import PropertyViewEnum
 import logging
 from fastapi.responses import JSONResponse
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Обработчики асинхронные: работа с БД выполняется в асинхронной сессии через
+# run_sync (синхронный код crud, ввод-вывод через asyncpg), вместе с
+# сериализацией, которой нужны связанные объекты
+
 # Добавить объявление в избранное
 @router.post("/", response_model=schemas.FavoriteOut, summary="Добавить объект в избранное")
-def add_favorite(
+async def add_favorite(
     favorite: schemas.FavoriteCreate,
-    db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Добавить объект в избранное"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    property_exists = crud.get_property(db, property_id=favorite.property_id)
+    return await db.run_sync(_add_favorite, principal.id, favorite.property_id)
+
+def _add_favorite(db: Session, user_id: int, property_id: int) -> schemas.FavoriteOut:
+    property_exists = db.query(models.Property.id).filter(models.Property.id == property_id).first()
     if not property_exists:
         raise HTTPException(status_code=404, detail="Объявление не найдено")
-    existing = crud.get_favorite_by_user_and_property(db, user_id=user.id, property_id=favorite.property_id)
-    if existing:
-        return schemas.FavoriteOut.model_validate(existing)
-    fav = crud.add_to_favorites(db, user_id=user.id, property_id=favorite.property_id)
+    try:
+        fav = crud.add_to_favorites(db, user_id=user_id, property_id=property_id)
+    except exc.IntegrityError:
+        # Внешний ключ: пользователь или объявление удалены после проверок
+        db.rollback()
+        auth.ensure_user_exists(db, user_id)
+        if db.get(models.Property, property_id) is None:
+            raise HTTPException(status_code=404, detail="Объявление не найдено")
+        raise
     return schemas.FavoriteOut.model_validate(fav)
 
 # Получить список избранных объявлений для текущего пользователя
-@router.get("/", response_model=List[schemas.FavoriteOut], summary="Список избранных объектов")
-def list_favorites(
-    db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+@router.get("/", response_model=Union[List[schemas.FavoriteOut], List[schemas.FavoriteCardOut]], summary="Список избранных объектов")
+async def list_favorites(
+    view: PropertyViewEnum = PropertyViewEnum.full,
+    db: AsyncSession = Depends(get_async_db),
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
-    """Получить список избранных объектов"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    favorites = crud.get_favorites(db, user_id=user.id)
+    """Получить список избранных объектов (view=card — облегченные карточки)"""
+    return await db.run_sync(_list_favorites, principal.id, view)
+
+def _list_favorites(db: Session, user_id: int, view: PropertyViewEnum):
+    if view == PropertyViewEnum.card:
+        return crud.get_favorite_cards(db, user_id=user_id)
+    favorites = crud.get_favorites(db, user_id=user_id)
     return [schemas.FavoriteOut.model_validate(fav) for fav in favorites]
 
 # Удалить объявление из избранного
 @router.delete("/{property_id}", response_model=dict, summary="Удалить объект из избранного")
-def remove_favorite(
+async def remove_favorite(
     property_id: int,
-    db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Удалить объект из избранного"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    fav = crud.get_favorite_by_user_and_property(db, user_id=user.id, property_id=property_id)
+    return await db.run_sync(_remove_favorite, principal.id, property_id)
+
+def _remove_favorite(db: Session, user_id: int, property_id: int) -> dict:
+    fav = crud.get_favorite_by_user_and_property(db, user_id=user_id, property_id=property_id)
     if not fav:
         raise HTTPException(status_code=404, detail="Объявление не найдено в избранном")
-    crud.remove_from_favorites(db, user_id=user.id, property_id=property_id)
-    logger.info(f"Удалено из избранного: user_id={user.id}, property_id={property_id}")
-    return {"detail": "Объявление удалено из избранного"}
\ No newline at end of file
+    crud.remove_from_favorites(db, user_id=user_id, property_id=property_id)
+    logger.info(f"Удалено из избранного: user_id={user_id}, property_id={property_id}")
+    return {"detail": "Объявление удалено из избранного"}
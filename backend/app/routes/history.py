@@ -1,56 +1,69 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 from app import schemas, crud, auth, models
-from app.database import get_db
+from app.database import get_async_db
 
 router = APIRouter()
 
+# Обработчики асинхронные: работа с БД и сериализация выполняются в
+# асинхронной сессии через run_sync (см. app.database.get_async_db)
+
 @router.get("/", response_model=List[schemas.HistoryOut])
-def get_history(
-    db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+async def get_history(
+    db: AsyncSession = Depends(get_async_db),
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Получить историю просмотров пользователя"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    history = crud.get_history_by_user(db, user_id=user.id)
+    return await db.run_sync(_get_history, principal.id)
+
+def _get_history(db: Session, user_id: int) -> List[schemas.HistoryOut]:
+    history = crud.get_history_by_user(db, user_id=user_id)
     return [schemas.HistoryOut.model_validate(h) for h in history]
 
 @router.post("/", response_model=schemas.HistoryOut)
-def add_to_history(
+async def add_to_history(
     history: schemas.HistoryCreate,
-    db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Добавить просмотр объекта в историю"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    return crud.create_history(db, history=history, user_id=user.id)
+    return await db.run_sync(_add_to_history, principal.id, history)
+
+def _add_to_history(db: Session, user_id: int, history: schemas.HistoryCreate) -> schemas.HistoryOut:
+    try:
+        db_history = crud.create_history(db, history=history, user_id=user_id)
+    except exc.IntegrityError:
+        # Внешний ключ: пользователь (токен пережил удаление) или объявление не существуют
+        db.rollback()
+        auth.ensure_user_exists(db, user_id)
+        if db.get(models.Property, history.property_id) is None:
+            raise HTTPException(status_code=404, detail="Объявление не найдено")
+        raise
+    return schemas.HistoryOut.model_validate(db_history)
 
 @router.delete("/{history_id}")
-def remove_from_history(
+async def remove_from_history(
     history_id: int,
-    db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Удалить запись из истории просмотров"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    
+    return await db.run_sync(_remove_from_history, principal.id, history_id)
+
+def _remove_from_history(db: Session, user_id: int, history_id: int) -> dict:
     history_item = db.query(models.History).filter(
         models.History.id == history_id,
-        models.History.user_id == user.id
+        models.History.user_id == user_id
     ).first()
     
     if not history_item:
         raise HTTPException(status_code=404, detail="Запись не найдена в истории")
     
     db.query(models.History).filter(
-        models.History.user_id == user.id,
+        models.History.user_id == user_id,
         models.History.property_id == history_item.property_id
     ).delete()
     
@@ -58,16 +71,15 @@ def remove_from_history(
     return {"detail": "Запись удалена из истории"}
 
 @router.delete("/")
-def clear_history(
-    db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+async def clear_history(
+    db: AsyncSession = Depends(get_async_db),
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Очистить всю историю просмотров"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    
-    db.query(models.History).filter(models.History.user_id == user.id).delete()
+    return await db.run_sync(_clear_history, principal.id)
+
+def _clear_history(db: Session, user_id: int) -> dict:
+    db.query(models.History).filter(models.History.user_id == user_id).delete()
     db.commit()
     
-    return {"detail": "История просмотров очищена"}
\ No newline at end of file
+    return {"detail": "История просмотров очищена"}
@@ -0,0 +1,39 @@
+import os
+
+from fastapi import APIRouter, Depends
+from app import auth
+from app.core import pool_metrics
+from app.core.config import settings
+from app.database import async_engine, engine, replicas
+from app.schemas import DbPoolMetricsOut, UserOut
+
+router = APIRouter()
+
+@router.get("/db-pool", response_model=DbPoolMetricsOut)
+async def get_db_pool_metrics(user: UserOut = Depends(auth.require_roles(settings.METRICS_ROLES))):
+    """
+    Состояние пулов соединений с БД (primary и реплик): занятые и свободные соединения,
+    overflow и гистограмма времени получения соединения (включая таймауты).
+    Счетчики свои у каждого воркера (pid в ответе) и копятся с его запуска.
+    Для реплик — последнее измеренное отставание и используется ли реплика.
+    Ответ раскрывает хосты и настройки БД, поэтому доступен только ролям METRICS_ROLES.
+    """
+    pools = {"sync": engine.pool, "async": async_engine.pool}
+    for index, replica in enumerate(replicas):
+        pools[f"replica{index}-sync"] = replica.engine.pool
+        pools[f"replica{index}-async"] = replica.async_engine.pool
+    return {
+        "pid": os.getpid(),
+        "config": {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pre_ping": settings.DB_POOL_PRE_PING,
+        },
+        "pools": pool_metrics.collect(pools),
+        "replicas": [
+            {"host": replica.engine.url.host, "lag_seconds": replica.lag, "available": replica.available}
+            for replica in replicas
+        ],
+    }
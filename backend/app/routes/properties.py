@@ -1,16 +1,26 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
-from sqlalchemy.orm import Session, joinedload
-from app.database import get_db
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request, Response, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from app.database import get_db, get_async_db, get_read_db, get_async_read_db
 from app.models import Property, PropertyImage, PropertyViews, User
 from app import crud, auth, models
+from app.enums import DealTypeEnum, PropertySortEnum, PropertyViewEnum
+from app.core import geo, cache
+from app.core.config import settings
+from app.core.http_cache import make_etag, etag_matches
+from app.services import view_queue, view_stats, property_import, property_export
 import shutil
 import os
-from typing import List, Optional
+import json
+from typing import List, Optional, Union
 from datetime import datetime
 import uuid
 
 # Импортируем Pydantic-схемы
-from app.schemas import PropertyCreate, PropertyOut, PropertyImageOut, HistoryCreate, PropertyUpdate, UserOut
+from app.schemas import PropertyCreate, PropertyOut, PropertyImageOut, HistoryCreate, PropertyUpdate, UserOut, PropertyFilter, PropertyGeoOut, PropertyFacetsOut, PropertyCardOut, PropertyStatsOut, PriceHistorySeriesOut, PropertyImportReportOut
 
 router = APIRouter()
 
@@ -19,73 +29,226 @@ UPLOAD_DIR = "uploads/properties"
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
-@router.get("/list", response_model=List[PropertyOut])
+# Максимальный размер страницы списка объявлений
+MAX_PAGE_SIZE = 100
+# Ограничения поиска по карте
+MAX_GEO_RESULTS = 1000
+MAX_GEO_RADIUS_M = 50000
+# Наибольшее число точек графика истории цен
+MAX_PRICE_HISTORY_BUCKETS = 500
+
+def get_property_filters(
+    deal_type: Optional[DealTypeEnum] = None,
+    property_type: Optional[str] = None,
+    price_min: Optional[float] = Query(None, ge=0),
+    price_max: Optional[float] = Query(None, ge=0),
+    area_min: Optional[float] = Query(None, ge=0),
+    area_max: Optional[float] = Query(None, ge=0),
+    rooms: Optional[List[str]] = Query(None),
+    floor_min: Optional[int] = None,
+    floor_max: Optional[int] = None,
+    build_year_min: Optional[int] = None,
+    build_year_max: Optional[int] = None,
+    price_dropped_days: Optional[int] = Query(None, ge=1, le=365)
+) -> PropertyFilter:
+    """Собирает структурные фильтры списка из query-параметров"""
+    return PropertyFilter(
+        deal_type=deal_type,
+        property_type=property_type,
+        price_min=price_min,
+        price_max=price_max,
+        area_min=area_min,
+        area_max=area_max,
+        rooms=rooms,
+        floor_min=floor_min,
+        floor_max=floor_max,
+        build_year_min=build_year_min,
+        build_year_max=build_year_max,
+        price_dropped_days=price_dropped_days
+    )
+
+@router.get("/list", response_model=Union[List[PropertyOut], List[PropertyCardOut]])
 async def get_properties_list(
-    db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_optional_current_user),
-    limit: Optional[int] = None,
-    include_viewed: bool = False
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    principal: Optional[auth.Principal] = Depends(auth.get_optional_principal),
+    filters: PropertyFilter = Depends(get_property_filters),
+    sort: PropertySortEnum = PropertySortEnum.newest,
+    cursor: Optional[str] = None,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    include_viewed: bool = False,
+    view: PropertyViewEnum = PropertyViewEnum.full,
+    if_none_match: Optional[str] = Header(None)
 ):
     """
-    Получение списка объявлений.
+    Получение списка объявлений с фильтрами и keyset-пагинацией.
+    view=card возвращает облегченные карточки (PropertyCardOut).
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor
+    (заголовок отсутствует на последней странице).
+    Если страница не изменилась с прошлого запроса (If-None-Match), отвечает 304.
     Доступно без аутентификации.
     """
+    return await db.run_sync(
+        _properties_list_page, response, principal.id if principal else None, filters, sort, cursor, limit,
+        include_viewed, view, if_none_match
+    )
+
+def _properties_list_page(
+    db: Session,
+    response: Response,
+    user_id: Optional[int],
+    filters: PropertyFilter,
+    sort: PropertySortEnum,
+    cursor: Optional[str],
+    limit: int,
+    include_viewed: bool,
+    view: PropertyViewEnum,
+    if_none_match: Optional[str]
+):
+    """Страница списка; выполняется в асинхронной сессии через run_sync"""
     try:
-        print("Starting get_properties_list function")
-        user_id = None
-        if current_user:
-            print(f"Current user: {current_user}")
-            user = crud.get_user_by_email(db, email=current_user)
-            if user:
-                user_id = user.id
-                print(f"User ID: {user_id}")
-        
-        print("Querying properties")
-        query = db.query(Property).options(
-            joinedload(Property.images),
-            joinedload(Property.price_history)
-        )
-        
-        if limit:
-            print(f"Applying limit: {limit}")
-            query = query.limit(limit)
-        
-        properties = query.all()
+        try:
+            properties, next_cursor = crud.search_properties(
+                db, filters, sort=sort, cursor=cursor, limit=limit,
+                card=view == PropertyViewEnum.card
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         print(f"Found {len(properties)} properties")
+
+        headers = {}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
         
+        # Флаги просмотра для всей страницы — одним запросом
+        viewed_ids = set()
+        if user_id and include_viewed:
+            viewed_ids = crud.get_viewed_property_ids(db, user_id, [prop.id for prop in properties])
+
+        # ETag окна: состав страницы, версии объявлений, флаги просмотра
+        # и, для карточек, счетчики просмотров
+        etag = make_etag(
+            "list",
+            view.value,
+            *[
+                f"{prop.id}.{prop.version}.{int(prop.id in viewed_ids)}.{getattr(prop, 'views', '')}"
+                for prop in properties
+            ],
+            next_cursor
+        )
+        headers["ETag"] = etag
+        headers["Cache-Control"] = "private, no-cache"
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        response.headers.update(headers)
+        if view == PropertyViewEnum.card:
+            return [crud.property_card(row, is_viewed=row.id in viewed_ids) for row in properties]
+
+        crud.load_property_collections(db, properties)
         for prop in properties:
-            # По умолчанию устанавливаем is_viewed в False
-            prop.is_viewed = False
-            
-            if user_id and include_viewed:
-                print(f"Checking if property {prop.id} is viewed by user {user_id}")
-                # Используем функцию is_property_viewed, которая проверяет:
-                # 1. Пользователь не является владельцем
-                # 2. Есть запись в таблице property_views
-                prop.is_viewed = crud.is_property_viewed(db, user_id, prop.id)
-        
-        print("Converting properties to response model")
-        result = [PropertyOut.model_validate(prop) for prop in properties]
-        print("Successfully converted properties")
-        return result
+            prop.is_viewed = prop.id in viewed_ids
+        return [PropertyOut.model_validate(prop) for prop in properties]
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in get_properties_list: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/geo", response_model=List[PropertyGeoOut])
+def get_properties_geo(
+    db: Session = Depends(get_read_db),
+    filters: PropertyFilter = Depends(get_property_filters),
+    min_lat: Optional[float] = Query(None, ge=-90, le=90),
+    min_lng: Optional[float] = Query(None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(None, ge=-90, le=90),
+    max_lng: Optional[float] = Query(None, ge=-180, le=180),
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_m: Optional[float] = Query(None, gt=0, le=MAX_GEO_RADIUS_M),
+    limit: int = Query(MAX_GEO_RESULTS, ge=1, le=MAX_GEO_RESULTS)
+):
+    """
+    Поиск объявлений на карте: по рамке (min_lat, min_lng, max_lat, max_lng)
+    или по кругу (lat, lng, radius_m). Результаты отсортированы по расстоянию
+    до центра рамки или круга. Доступно без аутентификации.
+    """
+    bbox_params = (min_lat, min_lng, max_lat, max_lng)
+    if lat is not None and lng is not None and radius_m is not None:
+        bbox = geo.bbox_around(lat, lng, radius_m)
+        center = (lat, lng)
+    elif all(value is not None for value in bbox_params):
+        if min_lat > max_lat or min_lng > max_lng:
+            raise HTTPException(status_code=400, detail="Некорректные границы рамки")
+        bbox = bbox_params
+        center = ((min_lat + max_lat) / 2, (min_lng + max_lng) / 2)
+        radius_m = None
+    else:
+        raise HTTPException(
+            status_code=400,
+            detail="Укажите рамку (min_lat, min_lng, max_lat, max_lng) или круг (lat, lng, radius_m)"
+        )
+
+    rows = crud.search_properties_geo(db, filters, bbox=bbox, center=center, radius_m=radius_m, limit=limit)
+    result = []
+    for prop, distance in rows:
+        prop.distance_m = distance
+        result.append(PropertyGeoOut.model_validate(prop))
+    return result
+
+@router.get("/search", response_model=List[PropertyOut])
+def search_properties_text(
+    q: str = Query(..., min_length=2, max_length=200),
+    db: Session = Depends(get_read_db),
+    principal: Optional[auth.Principal] = Depends(auth.get_optional_principal),
+    filters: PropertyFilter = Depends(get_property_filters),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    include_viewed: bool = False
+):
+    """
+    Полнотекстовый поиск объявлений по заголовку, описанию и адресу.
+    Результаты отсортированы по релевантности, структурные фильтры
+    те же, что у /list. Доступно без аутентификации.
+    """
+    properties = crud.text_search_properties(db, q, filters, skip=skip, limit=limit)
+
+    viewed_ids = set()
+    if principal and include_viewed:
+        viewed_ids = crud.get_viewed_property_ids(db, principal.id, [prop.id for prop in properties])
+    for prop in properties:
+        prop.is_viewed = prop.id in viewed_ids
+
+    return [PropertyOut.model_validate(prop) for prop in properties]
+
+@router.get("/facets", response_model=PropertyFacetsOut)
+def get_properties_facets(
+    db: Session = Depends(get_db),
+    filters: PropertyFilter = Depends(get_property_filters)
+):
+    """
+    Количество объявлений по значениям фильтров (тип сделки, тип объекта,
+    комнаты, ремонт, ценовые диапазоны, удобства) для текущего набора фильтров.
+    Доступно без аутентификации.
+    """
+    facets, generation = cache.get_facets(filters)
+    # Промах считается на primary, а не на реплике: результат ложится в общий
+    # ключ, и счетчики с отстающей реплики пережили бы сброс поколения каталога
+    if facets is None:
+        facets = crud.get_property_facets(db, filters)
+        cache.set_facets(filters, facets, generation)
+    return facets
+
 @router.post("/", response_model=PropertyOut)
 async def create_property(
     property_data: PropertyCreate,
-    user: str = Depends(auth.get_current_user),
+    principal: auth.Principal = Depends(auth.get_current_principal),
     db: Session = Depends(get_db)
 ):
-    db_user = crud.get_user_by_email(db, email=user)
-    if not db_user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-
     # Проверяем существование похожего объявления
     existing_property = db.query(Property)\
         .filter(
-            Property.owner_id == db_user.id,
+            Property.owner_id == principal.id,
             Property.title == property_data.title,
             Property.address == property_data.address,
             Property.price == property_data.price
@@ -98,75 +261,176 @@ async def create_property(
         )
 
     property_dict = property_data.model_dump()
-    property_dict["owner_id"] = db_user.id
+    property_dict["owner_id"] = principal.id
     property_dict["created_at"] = datetime.utcnow()
     new_property = Property(**property_dict)
     db.add(new_property)
     db.commit()
     db.refresh(new_property)
+    cache.invalidate_catalog()
     return PropertyOut.model_validate(new_property)
 
+@router.post("/import", response_model=PropertyImportReportOut)
+def import_properties(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    principal: auth.Principal = Depends(auth.get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """
+    Массовая загрузка объявлений текущего пользователя из CSV (строка заголовка —
+    поля PropertyCreate, списки через ";") или NDJSON (объект на строку).
+    Корректные строки загружаются, для остальных возвращается отчет с номерами строк.
+    Формат определяется по расширению файла, если не указан явно.
+    """
+    file_format = format or property_import.detect_format(file.filename, file.content_type)
+    try:
+        report = property_import.import_properties(db, file.file, principal.id, file_format)
+    except property_import.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if report["imported"]:
+        cache.invalidate_catalog()
+    return report
+
+@router.get("/export")
+def export_properties(
+    filters: PropertyFilter = Depends(get_property_filters),
+    format: str = Query("ndjson", pattern="^(csv|ndjson)$"),
+    user: UserOut = Depends(auth.require_roles(settings.EXPORT_ROLES))
+):
+    """
+    Полная выгрузка активных объявлений (с теми же фильтрами, что и список)
+    в NDJSON или CSV. Ответ отдается потоком по мере чтения из БД.
+    Выгрузка содержит контакты арендодателей, поэтому доступна только ролям
+    из settings.EXPORT_ROLES (партнеры, администраторы).
+    """
+    return StreamingResponse(
+        property_export.iter_export(filters, format),
+        media_type=property_export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="properties.{format}"'}
+    )
+
+def _load_property_detail(db: Session, property_id: int) -> Optional[dict]:
+    """Загружает объявление из БД и сериализует его публичное представление"""
+    # Загружаем объявление со всеми связанными данными; у владельца — только
+    # количество объявлений (подзапрос), а не сами объявления. Из истории цен —
+    # только последние записи, полный ряд отдает /{property_id}/price-history
+    prop = db.query(Property).options(
+        selectinload(Property.images),
+        joinedload(Property.owner).undefer(User.properties_count)
+    ).filter(Property.id == property_id).first()
+    
+    if not prop:
+        return None
+    
+    preview = crud.get_price_history_preview(db, [prop.id])
+    set_committed_value(prop, "price_history", preview[prop.id])
+    prop.is_viewed = False
+    return PropertyOut.model_validate(prop).model_dump(mode="json")
+
 @router.get("/{property_id}", response_model=PropertyOut)
 async def get_property(
-    property_id: str, 
+    property_id: int, 
+    request: Request,
     is_detail_view: bool = False,
-    db: Session = Depends(get_db),
-    current_user: Optional[str] = Depends(auth.get_optional_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    write_db: AsyncSession = Depends(get_async_db),
+    principal: Optional[auth.Principal] = Depends(auth.get_optional_principal),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Получение детальной информации об объявлении.
     Доступно без аутентификации, но запись в историю создается только для авторизованных пользователей
     и только при просмотре детальной страницы (is_detail_view=True).
+    Публичная часть ответа берется из кэша, is_viewed накладывается поверх.
+    Если версия не изменилась (If-None-Match), отвечает 304 без тела.
     """
-    user_id = None
-    if current_user:
-        user = crud.get_user_by_email(db, email=current_user)
-        if user:
-            user_id = user.id
-    
-    # Загружаем объявление со всеми связанными данными, включая владельца и его свойства
-    prop = db.query(Property).options(
-        joinedload(Property.images),
-        joinedload(Property.price_history),
-        joinedload(Property.owner).joinedload(User.properties)
-    ).filter(Property.id == property_id).first()
-    
-    if not prop:
+    user_id = principal.id if principal else None
+    # Промах кэша читается с primary: запись попадает в общий ключ, и данные
+    # с отстающей реплики пережили бы сброс кэша после изменения объявления
+    try:
+        data = await cache.get_property_detail(property_id, lambda: write_db.run_sync(_load_property_detail, property_id))
+    except cache.CacheLoadTimeout:
+        raise HTTPException(status_code=503, detail="Объявление загружается, повторите запрос", headers={"Retry-After": "1"})
+    if data is None:
         raise HTTPException(status_code=404, detail="Объявление не найдено")
-    
-    # Подсчитываем количество объявлений владельца
-    if prop.owner:
-        prop.owner.properties_count = len(prop.owner.properties)
-    
-    # По умолчанию устанавливаем is_viewed в False
-    prop.is_viewed = False
+    owner_id = data["owner_id"]
     
     # Добавляем информацию о просмотре только если:
     # 1. Пользователь авторизован (user_id не None)
     # 2. Пользователь не является владельцем объявления
-    if user_id and prop.owner_id != user_id:
-        view = db.query(models.PropertyViews).filter(
-            models.PropertyViews.user_id == user_id,
-            models.PropertyViews.property_id == property_id
-        ).first()
-        prop.is_viewed = view is not None
+    if user_id and owner_id != user_id:
+        view_id = await db.scalar(
+            select(models.PropertyViews.id).where(
+                models.PropertyViews.user_id == user_id,
+                models.PropertyViews.property_id == property_id
+            ).limit(1)
+        )
+        data["is_viewed"] = view_id is not None
     
     # Создаем запись в истории и добавляем просмотр только если:
     # 1. Это просмотр детальной страницы
     # 2. Пользователь авторизован
     # 3. Пользователь не является владельцем объявления
-    if is_detail_view and user_id and prop.owner_id != user_id:
-        crud.create_history(db, HistoryCreate(property_id=property_id), user_id)
-        crud.add_property_view(db, user_id, property_id)
+    # Запись отложенная: событие уходит в очередь, в БД его переносит фоновая задача
+    # (запасная синхронная запись идет через primary — сессия db может быть на реплике)
+    if is_detail_view and user_id and owner_id != user_id:
+        await view_queue.record_view(write_db, user_id, property_id)
+
+    # Счетчики просмотров учитывают и анонимных посетителей (зритель — по IP)
+    if is_detail_view and owner_id != user_id:
+        viewer = view_stats.viewer_id(user_id) if user_id else f"ip:{request.client.host if request.client else ''}"
+        await view_stats.count_view(property_id, viewer)
     
-    return PropertyOut.model_validate(prop)
+    headers = {
+        # Хэш всего представления: в нем и данные владельца, у которых нет своей версии
+        "ETag": make_etag("property", json.dumps(data, sort_keys=True, ensure_ascii=False)),
+        "Cache-Control": "private, no-cache",
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    # Данные уже сериализованы, повторная валидация через PropertyOut не нужна
+    return JSONResponse(content=data, headers=headers)
+
+@router.get("/{property_id}/price-history", response_model=PriceHistorySeriesOut)
+def get_property_price_history(
+    property_id: int,
+    buckets: int = Query(100, ge=1, le=MAX_PRICE_HISTORY_BUCKETS),
+    db: Session = Depends(get_read_db)
+):
+    """
+    История цен для графика, сжатая до buckets интервалов времени:
+    по каждому интервалу минимальная, максимальная и последняя цена.
+    """
+    current_price = db.query(Property.price).filter(Property.id == property_id).scalar()
+    if current_price is None:
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    rows = crud.get_price_history_buckets(db, property_id, buckets)
+    return PriceHistorySeriesOut(
+        property_id=property_id,
+        current_price=current_price,
+        buckets=[row._mapping for row in rows]
+    )
+
+@router.get("/{property_id}/stats", response_model=PropertyStatsOut)
+def get_property_stats(property_id: int, db: Session = Depends(get_db)):
+    """
+    Счетчики объявления: всего просмотров и оценка числа уникальных зрителей.
+    Читаются из property_stats и Redis, без подсчета по property_views.
+    Сессия на primary: сброс счетчиков переносит приращения из Redis в
+    property_stats, и отстающая реплика показала бы уменьшение просмотров.
+    """
+    if not db.query(Property.id).filter(Property.id == property_id).first():
+        raise HTTPException(status_code=404, detail="Объявление не найдено")
+    return view_stats.get_property_stats(db, property_id)
 
 @router.put("/{property_id}", response_model=PropertyOut)
 async def update_property(
     property_id: int, 
     property_data: PropertyUpdate, 
     db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """
     Обновление объявления по ID.
@@ -174,12 +438,6 @@ async def update_property(
     """
     try:
         print(f"Получен запрос на обновление объявления {property_id}")
-        # Получаем текущего пользователя
-        user = crud.get_user_by_email(db, email=current_user)
-        if not user:
-            print(f"Пользователь {current_user} не найден")
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-
         # Получаем текущее объявление
         property = crud.get_property(db, property_id)
         if not property:
@@ -187,8 +445,8 @@ async def update_property(
             raise HTTPException(status_code=404, detail="Объявление не найдено")
 
         # Проверяем права пользователя
-        if property.owner_id != user.id:
-            print(f"Пользователь {user.id} не имеет прав на редактирование объявления {property_id}")
+        if property.owner_id != principal.id:
+            print(f"Пользователь {principal.id} не имеет прав на редактирование объявления {property_id}")
             raise HTTPException(status_code=403, detail="Нет прав для редактирования этого объявления")
 
         # Обновляем объявление
@@ -197,6 +455,8 @@ async def update_property(
             print(f"Не удалось обновить объявление {property_id}")
             raise HTTPException(status_code=404, detail="Объявление не найдено")
         
+        cache.invalidate_catalog()
+        cache.invalidate_property(property_id)
         print(f"Объявление {property_id} успешно обновлено")
         return updated_property
     except HTTPException as he:
@@ -213,6 +473,9 @@ async def delete_property(property_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Объявление не найдено")
     db.delete(prop)
     db.commit()
+    cache.invalidate_catalog()
+    cache.invalidate_property(property_id)
+    view_stats.drop_viewers(property_id)
     return {"message": "Объявление удалено", "property_id": property_id}
 
 @router.post("/{property_id}/upload-images", response_model=dict)
@@ -220,7 +483,7 @@ async def upload_images(
     property_id: int, 
     files: List[UploadFile] = File(...), 
     db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     # Проверяем существование объявления
     prop = db.query(Property).filter(Property.id == property_id).first()
@@ -228,8 +491,7 @@ async def upload_images(
         raise HTTPException(status_code=404, detail="Объявление не найдено")
 
     # Проверяем права пользователя
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user or prop.owner_id != user.id:
+    if prop.owner_id != principal.id:
         raise HTTPException(status_code=403, detail="Нет прав для загрузки изображений")
 
     uploaded_files = []
@@ -251,8 +513,10 @@ async def upload_images(
             # Создаем запись в базе данных
             new_image = PropertyImage(property_id=property_id, image_url=unique_filename)
             db.add(new_image)
+            crud.touch_property(db, property_id)
             db.commit()
             db.refresh(new_image)
+            cache.invalidate_property(property_id)
             
             uploaded_files.append({
                 "id": new_image.id,
@@ -273,7 +537,7 @@ async def upload_images(
 @router.get("/{property_id}/images", response_model=List[PropertyImageOut])
 async def get_property_images(
     property_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Получение списка фотографий объявления.
@@ -287,7 +551,7 @@ async def delete_property_image(
     property_id: int,
     image_id: int,
     db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """
     Удаление фотографии объявления.
@@ -299,8 +563,7 @@ async def delete_property_image(
         raise HTTPException(status_code=404, detail="Объявление не найдено")
 
     # Проверяем права пользователя
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user or prop.owner_id != user.id:
+    if prop.owner_id != principal.id:
         raise HTTPException(status_code=403, detail="Нет прав для удаления изображения")
 
     # Получаем изображение
@@ -320,7 +583,9 @@ async def delete_property_image(
 
         # Удаляем запись из базы данных
         db.delete(image)
+        crud.touch_property(db, property_id)
         db.commit()
+        cache.invalidate_property(property_id)
 
         return {"message": "Изображение успешно удалено"}
     except Exception as e:
@@ -332,25 +597,20 @@ async def set_property_main_image(
     property_id: str,
     image_id: str,
     db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """
     Установка главного изображения для объявления.
     Требует аутентификации и прав владельца объявления.
     """
     try:
-        # Получаем текущего пользователя
-        user = crud.get_user_by_email(db, email=current_user)
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-
         # Получаем объявление
         property = crud.get_property(db, property_id)
         if not property:
             raise HTTPException(status_code=404, detail="Объявление не найдено")
 
         # Проверяем права пользователя
-        if property.owner_id != user.id:
+        if property.owner_id != principal.id:
             raise HTTPException(status_code=403, detail="Нет прав для редактирования этого объявления")
 
         # Сбрасываем флаг главного изображения у всех изображений объявления
@@ -368,7 +628,9 @@ async def set_property_main_image(
             raise HTTPException(status_code=404, detail="Изображение не найдено")
 
         image.is_main = True
+        crud.touch_property(db, property.id)
         db.commit()
+        cache.invalidate_property(property.id)
 
         return {"message": "Главное изображение успешно установлено"}
     except Exception as e:
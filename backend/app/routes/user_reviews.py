@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.orm import Session
 from typing import List
 from app import schemas, crud, auth
-from app.database import get_db
+from app.database import get_db, get_read_db
 
 router = APIRouter()
 
@@ -11,15 +11,11 @@ def create_user_review(
     user_id: int,
     review: schemas.UserReviewCreate,
     db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Создать отзыв о пользователе"""
     try:
-        user = crud.get_user_by_email(db, email=current_user)
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден")
-        
-        db_review = crud.create_user_review(db, review=review, reviewer_id=user.id)
+        db_review = crud.create_user_review(db, review=review, reviewer_id=principal.id)
         return db_review
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -29,7 +25,7 @@ def get_user_reviews(
     user_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить все отзывы о пользователе"""
     reviews = crud.get_user_reviews(db, user_id=user_id, skip=skip, limit=limit)
@@ -38,15 +34,11 @@ def get_user_reviews(
 @router.get("/users/{user_id}/reviews/me", response_model=schemas.UserReviewOut)
 def get_my_review(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    db: Session = Depends(get_read_db),
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Получить свой отзыв о пользователе"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    
-    review = crud.get_user_review_by_reviewer(db, reviewer_id=user.id, reviewed_user_id=user_id)
+    review = crud.get_user_review_by_reviewer(db, reviewer_id=principal.id, reviewed_user_id=user_id)
     if not review:
         raise HTTPException(status_code=404, detail="Отзыв не найден")
     
@@ -57,14 +49,10 @@ def update_my_review(
     user_id: int,
     review_update: schemas.UserReviewUpdate,
     db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Обновить свой отзыв о пользователе"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    
-    review = crud.get_user_review_by_reviewer(db, reviewer_id=user.id, reviewed_user_id=user_id)
+    review = crud.get_user_review_by_reviewer(db, reviewer_id=principal.id, reviewed_user_id=user_id)
     if not review:
         raise HTTPException(status_code=404, detail="Отзыв не найден")
     
@@ -75,14 +63,10 @@ def update_my_review(
 def delete_my_review(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
     """Удалить свой отзыв о пользователе"""
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    
-    review = crud.get_user_review_by_reviewer(db, reviewer_id=user.id, reviewed_user_id=user_id)
+    review = crud.get_user_review_by_reviewer(db, reviewer_id=principal.id, reviewed_user_id=user_id)
     if not review:
         raise HTTPException(status_code=404, detail="Отзыв не найден")
     
@@ -92,7 +76,7 @@ def delete_my_review(
 @router.get("/users/{user_id}/rating", response_model=schemas.UserRatingOut)
 def get_user_rating(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Получить статистику рейтинга пользователя"""
     rating_stats = crud.get_user_rating_stats(db, user_id=user_id)
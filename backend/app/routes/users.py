@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, BackgroundTasks, Request, Query
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Union
 import os
 from datetime import timedelta
 import logging
@@ -11,9 +11,11 @@ import time
 import json
 
 from app import schemas, models, crud, auth
-from app.database import SessionLocal, engine, get_db
+from app.database import SessionLocal, engine, get_db, get_read_db
+from app.core import cache
 from app.core.email import send_email_code
 from app.core.redis_client import redis_client
+from app.enums import PropertyViewEnum
 
 # Настройка логирования
 logger = logging.getLogger(__name__)
@@ -120,9 +122,8 @@ async def login(
         )
     
     print(f"Пользователь найден и пароль верный: {user.email}")
-    access_token = auth.create_access_token(
-        data={"sub": user.email},
-        expires_delta=timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = auth.create_user_access_token(
+        user, expires_delta=timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -244,31 +245,32 @@ def set_password_endpoint(request: SetPasswordRequest, db: Session = Depends(get
 
 # --- Профиль пользователя ---
 
+def _invalidate_owner_listings(db: Session, user_id: int) -> None:
+    """Карточки объявлений содержат профиль владельца — сбрасываем их кэш вместе с профилем"""
+    property_ids = [row.id for row in db.query(models.Property.id).filter(models.Property.owner_id == user_id)]
+    cache.invalidate_properties(property_ids)
+
 @router.get("/me", response_model=schemas.UserOut)
-def read_current_user(
-    current_user: str = Depends(auth.get_current_user),
-    db: Session = Depends(get_db)
-):
-    print("Извлеченный current_user:", current_user)
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    return schemas.UserOut.model_validate(user)
+def read_current_user(user: schemas.UserOut = Depends(auth.get_current_user_profile)):
+    """Профиль текущего пользователя (кэшируется на cache.USER_TTL секунд)"""
+    return user
 
 @router.put("/me", response_model=schemas.UserOut)
 def update_user_me(
     updated_data: schemas.UserUpdate,
-    current_user: str = Depends(auth.get_current_user),
+    principal: auth.Principal = Depends(auth.get_current_principal),
     db: Session = Depends(get_db)
 ):
-    user = crud.get_user_by_email(db, email=current_user)
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
-    
-    updated_user = crud.update_user(db, user_id=user.id, updated_data=updated_data)
+    updated_user = crud.update_user(db, user_id=principal.id, updated_data=updated_data)
     if not updated_user:
         raise HTTPException(status_code=400, detail="Ошибка обновления профиля")
     
+    # Токены со старым email больше не действуют: клиенту нужно войти заново
+    if updated_user.email != principal.email:
+        auth.revoke_tokens(db, updated_user)
+    else:
+        cache.invalidate_user(principal.id)
+    _invalidate_owner_listings(db, principal.id)
     return schemas.UserOut.model_validate(updated_user)
 
 # --- Загрузка аватара ---
@@ -277,9 +279,9 @@ def update_user_me(
 def upload_avatar(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
-    user = crud.get_user_by_email(db, email=current_user)
+    user = crud.get_user(db, user_id=principal.id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
@@ -300,15 +302,17 @@ def upload_avatar(
     user.avatar_url = avatar_url
     db.commit()
     db.refresh(user)
+    cache.invalidate_user(user.id)
+    _invalidate_owner_listings(db, user.id)
     
     return schemas.UserOut.model_validate(user)
 
 @router.delete("/me/avatar", response_model=schemas.UserOut)
 def delete_avatar(
     db: Session = Depends(get_db),
-    current_user: str = Depends(auth.get_current_user)
+    principal: auth.Principal = Depends(auth.get_current_principal)
 ):
-    user = crud.get_user_by_email(db, email=current_user)
+    user = crud.get_user(db, user_id=principal.id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
@@ -328,24 +332,45 @@ def delete_avatar(
         user.avatar_url = None
         db.commit()
         db.refresh(user)
+        cache.invalidate_user(user.id)
+        _invalidate_owner_listings(db, user.id)
     
     return schemas.UserOut.model_validate(user)
 
 # --- Получение объявлений текущего пользователя ---
 
-@router.get("/me/properties", response_model=List[schemas.PropertyOut])
+@router.get("/me/properties", response_model=Union[List[schemas.PropertyOut], List[schemas.PropertyCardOut]])
 def read_my_properties(
-    current_user: str = Depends(auth.get_current_user),
+    view: PropertyViewEnum = PropertyViewEnum.full,
+    principal: auth.Principal = Depends(auth.get_current_principal),
     db: Session = Depends(get_db)
 ):
-    user = crud.get_user_by_email(db, email=current_user)
+    if view == PropertyViewEnum.card:
+        return [crud.property_card(row) for row in crud.get_user_property_cards(db, owner_id=principal.id)]
+    user = crud.get_user(db, user_id=principal.id)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     return [schemas.PropertyOut.model_validate(prop) for prop in user.properties]
 
+# Глубина аналитики владельца в днях
+MAX_ANALYTICS_DAYS = 90
+
+@router.get("/me/properties/analytics", response_model=schemas.OwnerAnalyticsOut)
+def read_my_properties_analytics(
+    days: int = Query(MAX_ANALYTICS_DAYS, ge=1, le=MAX_ANALYTICS_DAYS),
+    principal: auth.Principal = Depends(auth.get_current_principal),
+    db: Session = Depends(get_db)
+):
+    """
+    Дневная статистика по всем объявлениям пользователя: просмотры, уникальные
+    зрители, добавления в избранное и новые чаты. Ответ колоночный: один массив
+    дат и по массиву значений на метрику для каждого объявления.
+    """
+    return crud.get_owner_analytics(db, owner_id=principal.id, days=days)
+
 # --- НОВЫЙ ЭНДПОИНТ: Получение публичной информации о пользователе по ID --- 
 @router.get("/{user_id}", response_model=schemas.UserPublicOut)
-async def get_user_public_profile(user_id: int, db: Session = Depends(get_db)):
+async def get_user_public_profile(user_id: int, db: Session = Depends(get_read_db)):
     """
     Возвращает публичную информацию о пользователе по его ID.
     """
@@ -452,19 +477,17 @@ async def verify_email_change(
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
     
-    # Обновляем email
+    # Обновляем email; токены со старым email отзываются (revoke_tokens делает commit)
     user.email = new_email
-    db.commit()
-    db.refresh(user)
+    auth.revoke_tokens(db, user)
     
     # Очищаем данные в Redis
     redis_client.delete(f"email_change:{new_email}")
     redis_client.delete(f"email_change_code:{new_email}")
     
     # Создаём новый токен с новым email
-    access_token = auth.create_access_token(
-        data={"sub": new_email},
-        expires_delta=timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = auth.create_user_access_token(
+        user, expires_delta=timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     
     logger.info(f"Email успешно изменён с {old_email} на {new_email}")
@@ -629,10 +652,9 @@ async def set_new_password(
     # Хэшируем новый пароль
     hashed_password = pwd_context.hash(new_password)
     
-    # Обновляем пароль
+    # Обновляем пароль; ранее выданные токены отзываются (revoke_tokens делает commit)
     user.hashed_password = hashed_password
-    db.commit()
-    db.refresh(user)
+    auth.revoke_tokens(db, user)
     
     # Очищаем данные в Redis
     redis_client.delete(f"reset_password_code:{email}")
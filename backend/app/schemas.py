@@ -1,5 +1,5 @@
-from datetime import datetime
-from pydantic import BaseModel, EmailStr, Field, root_validator
+from datetime import date, datetime
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
 from enum import Enum
 from app.enums import DealTypeEnum, PropertyTypeEnum
@@ -57,17 +57,11 @@ class UserPublicOut(BaseModel):
 class PropertyOwnerOut(BaseModel):
     id: int
     first_name: Optional[str] = None
+    # Считается подзапросом (models.User.properties_count), коллекция не загружается
     properties_count: int = 0
     created_at: datetime
     avatar_url: Optional[str] = None
     
-    @root_validator(pre=True)
-    def calculate_properties_count(cls, values):
-        if hasattr(values, 'properties'):
-            values = dict(values.__dict__)
-            values['properties_count'] = len(values['properties'])
-        return values
-    
     model_config = {"from_attributes": True}
 
 # 🔹 Базовая схема недвижимости
@@ -106,6 +100,21 @@ class PriceHistoryOut(PriceHistoryBase):
 
     model_config = {"from_attributes": True}
 
+# 🔹 Прореженная история цен для графика
+class PriceHistoryBucketOut(BaseModel):
+    start: datetime
+    min: float
+    max: float
+    last: float
+    count: int
+
+    model_config = {"from_attributes": True}
+
+class PriceHistorySeriesOut(BaseModel):
+    property_id: int
+    current_price: float
+    buckets: List[PriceHistoryBucketOut]
+
 class PropertyCreate(BaseModel):
     title: str
     description: str
@@ -138,9 +147,22 @@ class PropertyCreate(BaseModel):
     connectivity: Optional[List[str]] = []
     build_year: Optional[int] = None
     ceiling_height: Optional[float] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
     model_config = {"from_attributes": True}
 
+# 🔹 Отчет массового импорта объявлений
+class PropertyImportErrorOut(BaseModel):
+    row: int
+    field: Optional[str] = None
+    message: str
+
+class PropertyImportReportOut(BaseModel):
+    total: int
+    imported: int
+    errors: List[PropertyImportErrorOut]
+
 # 🔹 Схема вывода недвижимости
 class PropertyOut(BaseModel):
     id: int
@@ -181,6 +203,33 @@ class PropertyOut(BaseModel):
     created_at: datetime
     is_viewed: bool = False
     price_history: List[PriceHistoryOut] = []
+    previous_price: Optional[float] = None
+    price_changed_at: Optional[datetime] = None
+    price_change_pct: Optional[float] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    is_active: bool = True
+    version: int = 0
+
+    model_config = {"from_attributes": True}
+
+# 🔹 Карточка объявления для списков (без описания, удобств и коллекций)
+class PropertyCardOut(BaseModel):
+    id: int
+    title: str
+    price: float
+    area: Optional[float] = None
+    rooms: Optional[str] = None
+    address: str
+    property_type: str
+    deal_type: DealTypeEnum
+    created_at: datetime
+    main_image_url: Optional[str] = None
+    previous_price: Optional[float] = None
+    price_change_pct: Optional[float] = None
+    is_viewed: bool = False
+    views: int = 0
+    version: int = 0
 
     model_config = {"from_attributes": True}
 
@@ -217,9 +266,127 @@ class PropertyUpdate(BaseModel):
     connectivity: Optional[List[str]] = None
     build_year: Optional[int] = None
     ceiling_height: Optional[float] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
     model_config = {"from_attributes": True}
 
+# 🔹 Фильтры списка объявлений
+class PropertyFilter(BaseModel):
+    deal_type: Optional[DealTypeEnum] = None
+    property_type: Optional[str] = None
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    area_min: Optional[float] = None
+    area_max: Optional[float] = None
+    rooms: Optional[List[str]] = None
+    floor_min: Optional[int] = None
+    floor_max: Optional[int] = None
+    build_year_min: Optional[int] = None
+    build_year_max: Optional[int] = None
+    price_dropped_days: Optional[int] = None
+
+# 🔹 Точка объявления для карты
+class PropertyGeoOut(BaseModel):
+    id: int
+    title: str
+    price: float
+    address: str
+    rooms: Optional[str] = None
+    area: Optional[float] = None
+    property_type: str
+    deal_type: DealTypeEnum
+    latitude: float
+    longitude: float
+    distance_m: float
+
+    model_config = {"from_attributes": True}
+
+# 🔹 Счетчики фасетов для панели фильтров
+class PriceBucketOut(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+    count: int
+
+class PropertyFacetsOut(BaseModel):
+    total: int
+    deal_type: Dict[str, int] = {}
+    property_type: Dict[str, int] = {}
+    rooms: Dict[str, int] = {}
+    renovation: Dict[str, int] = {}
+    price: List[PriceBucketOut] = []
+    amenities: Dict[str, int] = {}
+
+# 🔹 Рыночная статистика: по паре (тип, сделка) колоночные массивы сегментов rooms × геоячейка
+class MarketSegmentsOut(BaseModel):
+    property_type: str
+    deal_type: str
+    rooms: List[str]
+    geo_cell: List[Optional[int]]
+    inventory: List[int]
+    ppm_p25: List[Optional[float]]
+    ppm_median: List[Optional[float]]
+    ppm_p75: List[Optional[float]]
+    dom_median: List[Optional[float]]
+
+class MarketStatsOut(BaseModel):
+    generated_at: datetime
+    listings: int
+    segments: List[MarketSegmentsOut]
+
+# 🔹 Метрики пулов соединений с БД (значения текущего воркера)
+class PoolWaitHistogramOut(BaseModel):
+    count: int
+    sum_ms: float
+    timeouts: int
+    # Накопительно: сколько получений соединения уложились в le мс
+    buckets: Dict[str, int]
+
+class DbPoolStatsOut(BaseModel):
+    name: str
+    pool_size: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    wait: PoolWaitHistogramOut
+
+class DbPoolConfigOut(BaseModel):
+    pool_size: int
+    max_overflow: int
+    pool_timeout: float
+    pool_recycle: int
+    pre_ping: bool
+
+class DbReplicaStatusOut(BaseModel):
+    host: Optional[str] = None
+    lag_seconds: Optional[float] = None
+    available: bool
+
+class DbPoolMetricsOut(BaseModel):
+    pid: int
+    config: DbPoolConfigOut
+    pools: List[DbPoolStatsOut]
+    replicas: List[DbReplicaStatusOut] = []
+
+# 🔹 Счетчики просмотров объявления
+class PropertyStatsOut(BaseModel):
+    property_id: int
+    views: int
+    unique_viewers: int
+
+# 🔹 Аналитика владельца: общий ряд дат и по массиву значений на каждую метрику
+class PropertyAnalyticsSeriesOut(BaseModel):
+    property_id: int
+    title: str
+    views: List[int]
+    unique_viewers: List[int]
+    favorites_added: List[int]
+    chats_started: List[int]
+
+class OwnerAnalyticsOut(BaseModel):
+    days: List[date]
+    properties: List[PropertyAnalyticsSeriesOut]
+
 # 🔹 Схемы для избранного
 class FavoriteBase(BaseModel):
     property_id: int
@@ -235,6 +402,12 @@ class FavoriteOut(BaseModel):
 
     model_config = {"from_attributes": True}
 
+class FavoriteCardOut(BaseModel):
+    id: int
+    property_id: int
+    created_at: datetime
+    property: PropertyCardOut
+
 class HistoryBase(BaseModel):
     property_id: int
 
@@ -0,0 +1,120 @@
+"""
+Дневные метрики объявлений, которые приходят из других сервисов.
+
+Сервис чатов хранит данные в своей БД, поэтому о новом чате он сообщает
+через общий Redis: HINCRBY в хэше CHATS_STARTED_KEY с полем
+"<property_id>:<YYYY-MM-DD>". Фоновая задача переносит накопленное в
+property_metrics_daily одним upsert.
+"""
+import asyncio
+import logging
+from datetime import date
+from typing import Dict, List, Tuple
+
+from redis import RedisError
+from sqlalchemy import Date, Integer, column, select, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.redis_client import redis_client
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Ключ общий с сервисом чатов
+CHATS_STARTED_KEY = "property_metrics:chats_started"
+FLUSH_INTERVAL = 60.0
+# Колонки property_id и chats_started — integer
+MAX_INT32 = 2 ** 31 - 1
+
+
+def _pop_chats_started() -> Dict[str, str]:
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hgetall(CHATS_STARTED_KEY)
+    pipe.delete(CHATS_STARTED_KEY)
+    pending, _ = pipe.execute()
+    return pending
+
+
+def _restore_chats_started(rows: List[Tuple[int, date, int]]) -> None:
+    # Возвращаются уже разобранные строки: некорректные поля повторно не разбираются
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for property_id, day, count in rows:
+            pipe.hincrby(CHATS_STARTED_KEY, f"{property_id}:{day.isoformat()}", count)
+        pipe.execute()
+    except RedisError as e:
+        logger.error(f"Потеряны счетчики новых чатов ({len(rows)} полей): {e}")
+
+
+def _parse(pending: Dict[str, str]) -> List[Tuple[int, date, int]]:
+    """
+    Разбирает поля "<property_id>:<YYYY-MM-DD>" в строки (property_id, day, count).
+    Поля, которые после разбора совпадают ("12:..." и "012:..."), суммируются:
+    upsert не может обновить одну строку дважды за запрос. Некорректные поля
+    пропускаются с предупреждением, чтобы не останавливать всю пачку.
+    """
+    counts: Dict[Tuple[int, date], int] = {}
+    for field, count in pending.items():
+        try:
+            property_id, day = field.split(":", 1)
+            key = (int(property_id), date.fromisoformat(day.strip()))
+            count = int(count)
+        except ValueError:
+            logger.warning(f"Пропущено некорректное поле счетчика чатов: {field}={count}")
+            continue
+        if not 0 < key[0] <= MAX_INT32 or not 0 < count <= MAX_INT32:
+            logger.warning(f"Пропущено поле счетчика чатов вне диапазона: {field}={count}")
+            continue
+        counts[key] = counts.get(key, 0) + count
+    return [(property_id, day, count) for (property_id, day), count in counts.items()]
+
+
+def write_chats_started(db: Session, rows: List[Tuple[int, date, int]]) -> None:
+    source = values(
+        column("property_id", Integer), column("day", Date), column("chats_started", Integer),
+        name="chats_delta"
+    ).data(rows)
+    delta = (
+        select(source.c.property_id, source.c.day, source.c.chats_started)
+        .join(models.Property, models.Property.id == source.c.property_id)
+        .subquery()
+    )
+    table = models.PropertyMetricsDaily
+    stmt = pg_insert(table).from_select(["property_id", "day", "chats_started"], select(delta))
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.property_id, table.day],
+        set_={"chats_started": table.chats_started + stmt.excluded.chats_started}
+    ))
+
+
+def flush_listing_metrics() -> int:
+    """Переносит счетчики новых чатов в property_metrics_daily. Возвращает число полей."""
+    pending = _pop_chats_started()
+    rows = _parse(pending)
+    if not rows:
+        return 0
+    db = SessionLocal()
+    try:
+        write_chats_started(db, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        _restore_chats_started(rows)
+        raise
+    finally:
+        db.close()
+    return len(rows)
+
+
+async def run_metrics_flusher(interval: float = FLUSH_INTERVAL) -> None:
+    """Фоновая задача приложения: периодически сбрасывает счетчики метрик"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            flushed = await asyncio.to_thread(flush_listing_metrics)
+            if flushed:
+                logger.info(f"Обновлены дневные метрики объявлений: {flushed}")
+        except Exception as e:
+            logger.error(f"Ошибка при сбросе метрик объявлений: {e}")
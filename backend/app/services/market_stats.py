@@ -0,0 +1,309 @@
+"""
+Рыночная статистика: цена за м² по сегментам.
+
+Сегмент — property_type × deal_type × rooms × геоячейка (app.core.geo).
+Периодическая задача выгружает нужные колонки properties в массивы NumPy
+и считает квантили цены за м², число объявлений и медианный срок
+экспозиции для всех сегментов сразу — сортировкой и векторной
+интерполяцией, без цикла по строкам. Результат сохраняется снимком в
+Postgres (market_stats_snapshots) и в Redis, эндпоинт только читает снимок.
+
+Снимок в Redis — хэш: поле "<property_type>|<deal_type>" хранит готовый JSON
+с колоночными массивами по сегментам этой пары, поле "_meta" — время расчета.
+Эндпоинт читает только поля пар, подходящих под фильтр, а не весь хэш.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from redis import RedisError
+from sqlalchemy import String, cast, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.core.redis_client import redis_client
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+MARKET_SNAPSHOT_KEY = "analytics:market"
+MARKET_LOCK_KEY = "analytics:market:lock"
+MARKET_JOB_INTERVAL = 3600.0  # секунд между пересчетами
+MARKET_LOCK_TIMEOUT = 600
+META_FIELD = "_meta"
+SCAN_COUNT = 100  # полей за один HSCAN при частичном фильтре
+QUANTILES = (0.25, 0.5, 0.75)
+# Сколько последних снимков хранить в Postgres
+SNAPSHOTS_KEPT = 3
+
+
+def grouped_quantiles(groups: np.ndarray, values: np.ndarray, n_groups: int,
+                      quantiles: Sequence[float] = QUANTILES) -> np.ndarray:
+    """
+    Квантили values внутри каждой группы (линейная интерполяция, как np.quantile).
+    Возвращает массив len(quantiles) × n_groups; NaN в values пропускаются,
+    у групп без значений — NaN.
+    """
+    valid = ~np.isnan(values)
+    groups = groups[valid]
+    values = values[valid]
+    # Одна сортировка по (группа, значение): каждая группа — непрерывный отсортированный отрезок
+    order = np.lexsort((values, groups))
+    values = values[order]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.cumsum(counts) - counts
+    present = counts > 0
+
+    result = np.full((len(quantiles), n_groups), np.nan)
+    for i, q in enumerate(quantiles):
+        position = starts[present] + q * (counts[present] - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        result[i, present] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+    return result
+
+
+def compute_market_segments(
+    property_type: np.ndarray,
+    deal_type: np.ndarray,
+    rooms: np.ndarray,
+    geo_cell: np.ndarray,
+    price: np.ndarray,
+    area: np.ndarray,
+    days_on_market: np.ndarray,
+) -> Dict[str, np.ndarray]:
+    """
+    Статистика по всем непустым сегментам. На входе — колонки объявлений
+    одинаковой длины, на выходе — колонки сегментов, упорядоченные по
+    (property_type, deal_type, rooms, geo_cell).
+    """
+    dimensions = [property_type, deal_type, rooms, geo_cell]
+    uniques, codes = zip(*[np.unique(column, return_inverse=True) for column in dimensions])
+    shape = tuple(len(values) for values in uniques)
+    segment_key = np.ravel_multi_index([code.ravel() for code in codes], shape)
+    keys, groups = np.unique(segment_key, return_inverse=True)
+    n_groups = len(keys)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_per_m2 = np.where(area > 0, price / area, np.nan)
+    price_quantiles = grouped_quantiles(groups, price_per_m2, n_groups)
+    days_median = grouped_quantiles(groups, days_on_market.astype(np.float64), n_groups, (0.5,))[0]
+
+    segment_codes = np.unravel_index(keys, shape)
+    return {
+        "property_type": uniques[0][segment_codes[0]],
+        "deal_type": uniques[1][segment_codes[1]],
+        "rooms": uniques[2][segment_codes[2]],
+        "geo_cell": uniques[3][segment_codes[3]],
+        "inventory": np.bincount(groups, minlength=n_groups),
+        "ppm_p25": price_quantiles[0],
+        "ppm_median": price_quantiles[1],
+        "ppm_p75": price_quantiles[2],
+        "dom_median": days_median,
+    }
+
+
+def _rounded(values: np.ndarray, digits: int) -> List[Optional[float]]:
+    return np.where(np.isnan(values), None, np.round(values, digits)).tolist()
+
+
+def build_snapshot(segments: Dict[str, np.ndarray]) -> Dict[str, str]:
+    """Раскладывает сегменты по парам (property_type, deal_type) в готовые JSON-блоки"""
+    pairs = np.char.add(np.char.add(segments["property_type"].astype(str), "|"), segments["deal_type"].astype(str))
+    # Сегменты уже упорядочены по паре, поэтому каждая пара — непрерывный отрезок
+    _, first = np.unique(pairs, return_index=True)
+    bounds = np.append(np.sort(first), len(pairs))
+    snapshot = {}
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        block = slice(start, end)
+        snapshot[str(pairs[start])] = json.dumps({
+            "property_type": str(segments["property_type"][start]),
+            "deal_type": str(segments["deal_type"][start]),
+            "rooms": segments["rooms"][block].tolist(),
+            "geo_cell": [cell if cell >= 0 else None for cell in segments["geo_cell"][block].tolist()],
+            "inventory": segments["inventory"][block].tolist(),
+            "ppm_p25": _rounded(segments["ppm_p25"][block], 1),
+            "ppm_median": _rounded(segments["ppm_median"][block], 1),
+            "ppm_p75": _rounded(segments["ppm_p75"][block], 1),
+            "dom_median": _rounded(segments["dom_median"][block], 1),
+        }, ensure_ascii=False, separators=(",", ":"))
+    return snapshot
+
+
+def load_listing_columns(db: Session) -> Dict[str, np.ndarray]:
+    """Выгружает колонки properties, нужные для статистики, в массивы NumPy"""
+    Property = models.Property
+    rows = db.execute(select(
+        func.coalesce(Property.property_type, ""),
+        # В БД хранится имя элемента enum (SALE), в API — значение (sale)
+        func.lower(cast(Property.deal_type, String)),
+        func.coalesce(Property.rooms, ""),
+        func.coalesce(Property.geo_cell, -1),
+        Property.price,
+        func.coalesce(Property.area, 0.0),
+        func.extract("epoch", func.now() - Property.created_at) / 86400,
+    ).where(Property.is_active.is_(True))).all()
+    property_type, deal_type, rooms, geo_cell, price, area, days = zip(*rows) if rows else ([],) * 7
+    return {
+        "property_type": np.array(property_type, dtype=str),
+        "deal_type": np.array(deal_type, dtype=str),
+        "rooms": np.array(rooms, dtype=str),
+        "geo_cell": np.array(geo_cell, dtype=np.int64),
+        "price": np.array(price, dtype=np.float64),
+        "area": np.array(area, dtype=np.float64),
+        # None (нет даты создания) превращается в NaN и в медиану не входит
+        "days_on_market": np.array(days, dtype=np.float64),
+    }
+
+
+def _publish(fields: Dict[str, str]) -> None:
+    # Новый снимок собирается во временном ключе и подменяет старый атомарно
+    staging_key = f"{MARKET_SNAPSHOT_KEY}:staging"
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(staging_key)
+    pipe.hset(staging_key, mapping=fields)
+    pipe.rename(staging_key, MARKET_SNAPSHOT_KEY)
+    pipe.execute()
+
+
+def refresh_market_stats(db: Session) -> int:
+    """Пересчитывает статистику и сохраняет снимок. Возвращает число сегментов."""
+    columns = load_listing_columns(db)
+    generated_at = datetime.now()
+    if len(columns["price"]):
+        segments = compute_market_segments(**columns)
+        snapshot = build_snapshot(segments)
+        segment_count = len(segments["inventory"])
+    else:
+        snapshot, segment_count = {}, 0
+    meta = json.dumps({"generated_at": generated_at.isoformat(), "listings": len(columns["price"])})
+
+    record = models.MarketStatsSnapshot(
+        generated_at=generated_at, listings=len(columns["price"]), segments=snapshot
+    )
+    db.add(record)
+    db.flush()
+    db.query(models.MarketStatsSnapshot)\
+        .filter(models.MarketStatsSnapshot.id <= record.id - SNAPSHOTS_KEPT)\
+        .delete(synchronize_session=False)
+    db.commit()
+
+    try:
+        _publish({META_FIELD: meta, **snapshot})
+    except RedisError as e:
+        logger.warning(f"Снимок рыночной статистики не записан в Redis: {e}")
+    return segment_count
+
+
+def _pair_field(property_type: str, deal_type: str) -> str:
+    return f"{property_type}|{deal_type}"
+
+
+def _glob_escape(value: str) -> str:
+    """Экранирует спецсимволы шаблона HSCAN MATCH"""
+    return "".join(f"\\{char}" if char in "*?[]\\" else char for char in value)
+
+
+def _matches(field: str, property_type: Optional[str], deal_type: Optional[str]) -> bool:
+    field_type, _, field_deal = field.partition("|")
+    return (property_type is None or field_type == property_type) \
+        and (deal_type is None or field_deal == deal_type)
+
+
+def _read_redis_snapshot(property_type: Optional[str],
+                         deal_type: Optional[str]) -> Tuple[Optional[str], Dict[str, str]]:
+    """
+    META_FIELD и блоки нужных пар из Redis. Читаются только нужные поля:
+    пара целиком — HMGET, частичный фильтр — HSCAN по шаблону имени поля,
+    весь хэш — только без фильтров. META_FIELD None — снимка в Redis нет.
+    """
+    if property_type is not None and deal_type is not None:
+        field = _pair_field(property_type, deal_type)
+        meta, block = redis_client.hmget(MARKET_SNAPSHOT_KEY, [META_FIELD, field])
+        return meta, ({field: block} if block is not None else {})
+    if property_type is None and deal_type is None:
+        fields = redis_client.hgetall(MARKET_SNAPSHOT_KEY)
+        return fields.pop(META_FIELD, None), fields
+    meta = redis_client.hget(MARKET_SNAPSHOT_KEY, META_FIELD)
+    if meta is None:
+        return None, {}
+    if property_type is not None:
+        pattern = _pair_field(_glob_escape(property_type), "*")
+    else:
+        pattern = _pair_field("*", _glob_escape(deal_type))
+    return meta, dict(redis_client.hscan_iter(MARKET_SNAPSHOT_KEY, match=pattern, count=SCAN_COUNT))
+
+
+def read_market_snapshot(db: Session, property_type: Optional[str] = None,
+                         deal_type: Optional[str] = None) -> Optional[str]:
+    """
+    JSON ответа /analytics/market из снимка: Redis, при промахе — последний
+    снимок из Postgres (и он же возвращается в Redis). None, если снимка еще нет.
+    """
+    try:
+        meta, fields = _read_redis_snapshot(property_type, deal_type)
+    except RedisError as e:
+        logger.warning(f"Redis недоступен, снимок читается из БД: {e}")
+        meta, fields = None, {}
+    if meta is None:
+        record = db.query(models.MarketStatsSnapshot)\
+            .order_by(models.MarketStatsSnapshot.id.desc())\
+            .first()
+        if record is None:
+            return None
+        meta = json.dumps({"generated_at": record.generated_at.isoformat(), "listings": record.listings})
+        fields = record.segments
+        try:
+            _publish({META_FIELD: meta, **fields})
+        except RedisError:
+            pass
+
+    meta = json.loads(meta)
+    blocks = [
+        block for field, block in sorted(fields.items())
+        if _matches(field, property_type, deal_type)
+    ]
+    return (
+        f'{{"generated_at":{json.dumps(meta["generated_at"])},"listings":{meta["listings"]},'
+        f'"segments":[{",".join(blocks)}]}}'
+    )
+
+
+def run_market_stats_once() -> Optional[int]:
+    """Один пересчет; при нескольких воркерах считает только тот, кто взял блокировку"""
+    lock = None
+    try:
+        lock = redis_client.lock(MARKET_LOCK_KEY, timeout=MARKET_LOCK_TIMEOUT)
+        if not lock.acquire(blocking=False):
+            return None
+    except RedisError as e:
+        logger.warning(f"Блокировка рыночной статистики недоступна, считаем без нее: {e}")
+        lock = None
+    db = SessionLocal()
+    try:
+        return refresh_market_stats(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+        if lock is not None:
+            try:
+                lock.release()
+            except RedisError:
+                pass
+
+
+async def run_market_stats_job(interval: float = MARKET_JOB_INTERVAL) -> None:
+    """Фоновая задача приложения: периодический пересчет рыночной статистики"""
+    while True:
+        try:
+            segments = await asyncio.to_thread(run_market_stats_once)
+            if segments is not None:
+                logger.info(f"Рыночная статистика пересчитана, сегментов: {segments}")
+        except Exception as e:
+            logger.error(f"Ошибка при расчете рыночной статистики: {e}")
+        await asyncio.sleep(interval)
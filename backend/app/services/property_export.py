@@ -0,0 +1,90 @@
+"""
+Выгрузка активных объявлений в NDJSON или CSV.
+
+Строки читаются серверным курсором (yield_per) в порядке id и сразу
+отдаются клиенту пачками по EXPORT_BATCH_SIZE, поэтому память не зависит
+от размера таблицы, а первый байт уходит после первой пачки. Колонки —
+поля импорта (app.services.property_import), так что выгрузку можно
+загрузить обратно, и колонки карточки списка (crud.PROPERTY_CARD_COLUMNS).
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, List
+
+from sqlalchemy import select
+
+from app import crud, models, schemas
+from app.database import SessionLocal
+from app.services.property_import import IMPORT_COLUMNS, JSON_FIELDS, LIST_FIELDS
+
+EXPORT_BATCH_SIZE = 1000
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Поля импорта, затем колонки карточки списка (crud.PROPERTY_CARD_COLUMNS),
+# которых нет среди полей импорта: выгрузка не расходится со списком
+_BASE_COLUMNS = (
+    [models.Property.id, models.Property.owner_id]
+    + [getattr(models.Property, name) for name in IMPORT_COLUMNS]
+)
+EXPORT_COLUMNS = (
+    _BASE_COLUMNS
+    + [column for column in crud.PROPERTY_CARD_COLUMNS if column.key not in {c.key for c in _BASE_COLUMNS}]
+    + [models.Property.price_changed_at]
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+
+def _plain(value):
+    if isinstance(value, models.DealTypeEnum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_lines(rows: List) -> str:
+    return "".join(
+        json.dumps({name: _plain(value) for name, value in zip(EXPORT_FIELDS, row)}, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def _csv_cell(name: str, value):
+    if value is None:
+        return ""
+    if name in LIST_FIELDS or name in JSON_FIELDS:
+        return json.dumps(value, ensure_ascii=False)
+    return _plain(value)
+
+
+def _csv_lines(rows: List, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    writer.writerows([_csv_cell(name, value) for name, value in zip(EXPORT_FIELDS, row)] for row in rows)
+    return buffer.getvalue()
+
+
+def iter_export(filters: schemas.PropertyFilter, file_format: str = "ndjson",
+                batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """
+    Части ответа выгрузки. Генератор открывает свою сессию: он выполняется,
+    когда обработчик запроса уже вернул StreamingResponse.
+    """
+    db = SessionLocal()
+    try:
+        stmt = crud.apply_property_filters(select(*EXPORT_COLUMNS), filters)\
+            .order_by(models.Property.id)\
+            .execution_options(yield_per=batch_size)
+        if file_format == "csv":
+            yield _csv_lines([], header=True)
+        for rows in db.execute(stmt).partitions():
+            yield _csv_lines(rows) if file_format == "csv" else _ndjson_lines(rows)
+    finally:
+        db.close()
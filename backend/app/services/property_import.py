@@ -0,0 +1,231 @@
+"""
+Массовый импорт объявлений из CSV или NDJSON.
+
+Файл читается потоком: строки проверяются схемой PropertyCreate пачками по
+CHUNK_SIZE и сразу загружаются через COPY во временную таблицу. В конце
+один запрос находит дубликаты (внутри файла и среди объявлений владельца),
+а один INSERT ... SELECT переносит остальные строки в properties вместе с
+первой записью истории цен. Ошибки возвращаются отчетом по номерам строк.
+"""
+import csv
+import io
+import json
+import logging
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+MAX_IMPORT_ROWS = 50000
+# Сколько ошибок одной строки попадает в отчет
+MAX_ERRORS_PER_ROW = 5
+STAGING_TABLE = "property_import_staging"
+# Маркер NULL в потоке COPY, чтобы отличать NULL от пустой строки
+COPY_NULL = "\\N"
+
+IMPORT_COLUMNS = list(schemas.PropertyCreate.model_fields)
+# Поля-списки; в CSV записываются JSON-массивом или через ";"
+LIST_FIELDS = {
+    name for name, field in schemas.PropertyCreate.model_fields.items()
+    if isinstance(field.default, list)
+}
+# Колонки JSON, а не ARRAY (см. models.Property)
+JSON_FIELDS = {"contact_method"}
+
+
+class ImportFormatError(ValueError):
+    """Файл нельзя разобрать как CSV/NDJSON"""
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or (content_type or "").endswith(("ndjson", "jsonl")):
+        return "ndjson"
+    return "csv"
+
+
+def _read_csv(stream: IO[str]) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames:
+        raise ImportFormatError("Пустой файл или нет строки заголовка")
+    for row_no, row in enumerate(reader, start=1):
+        record = {}
+        for key, value in row.items():
+            if key is None or value is None:
+                continue
+            value = value.strip()
+            if key in LIST_FIELDS:
+                if value.startswith("["):
+                    try:
+                        value = json.loads(value)
+                    except ValueError:
+                        yield row_no, None, f"{key}: некорректный JSON-массив"
+                        break
+                else:
+                    value = [item.strip() for item in value.split(";") if item.strip()]
+            elif value == "":
+                continue
+            record[key] = value
+        else:
+            yield row_no, record, None
+
+
+def _read_ndjson(stream: IO[str]) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    row_no = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        row_no += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row_no, None, f"некорректный JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row_no, None, "строка должна быть JSON-объектом"
+            continue
+        yield row_no, record, None
+
+
+def _pg_array(values: List[str]) -> str:
+    items = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'"{item}"' for item in items) + "}"
+
+
+def _copy_value(name: str, value):
+    if value is None:
+        return COPY_NULL
+    if name in JSON_FIELDS:
+        return json.dumps(value, ensure_ascii=False)
+    if name in LIST_FIELDS:
+        return _pg_array(value)
+    return value
+
+
+def _validate(row_no: int, record: dict, errors: List[dict]) -> Optional[list]:
+    """Строка для COPY или None (ошибки дописываются в errors)"""
+    try:
+        item = schemas.PropertyCreate.model_validate(record)
+        deal_type = models.DealTypeEnum(item.deal_type.lower())
+    except ValidationError as e:
+        for error in e.errors()[:MAX_ERRORS_PER_ROW]:
+            field = ".".join(str(part) for part in error["loc"]) or None
+            errors.append({"row": row_no, "field": field, "message": error["msg"]})
+        return None
+    except ValueError:
+        errors.append({"row": row_no, "field": "deal_type", "message": "Допустимые значения: sale, rent"})
+        return None
+    values = item.model_dump()
+    # В БД enum хранится по имени элемента (SALE), как его пишет SQLAlchemy
+    values["deal_type"] = deal_type.name
+    return [row_no] + [_copy_value(name, values[name]) for name in IMPORT_COLUMNS]
+
+
+def _copy_chunk(cursor, rows: List[list]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    columns = ", ".join(["row_no"] + IMPORT_COLUMNS)
+    cursor.copy_expert(
+        f"COPY {STAGING_TABLE} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", buffer
+    )
+
+
+def _find_duplicates(db: Session, owner_id: int) -> Dict[int, str]:
+    """Дубликаты по (title, address, price): повтор внутри файла или уже существующее объявление"""
+    rows = db.execute(text(f"""
+        SELECT row_no, first_row_no, EXISTS (
+            SELECT 1 FROM properties p
+            WHERE p.owner_id = :owner_id
+              AND p.title = s.title AND p.address = s.address AND p.price = s.price
+        ) AS exists_already
+        FROM (
+            SELECT row_no, title, address, price,
+                   first_value(row_no) OVER (PARTITION BY title, address, price ORDER BY row_no) AS first_row_no
+            FROM {STAGING_TABLE}
+        ) s
+    """), {"owner_id": owner_id})
+    duplicates = {}
+    for row_no, first_row_no, exists_already in rows:
+        if exists_already:
+            duplicates[row_no] = "Похожее объявление уже существует"
+        elif first_row_no != row_no:
+            duplicates[row_no] = f"Повтор строки {first_row_no}"
+    return duplicates
+
+
+def _merge(db: Session, owner_id: int, skip_rows: List[int]) -> int:
+    columns = ", ".join(IMPORT_COLUMNS)
+    result = db.execute(text(f"""
+        WITH inserted AS (
+            INSERT INTO properties ({columns}, owner_id, created_at)
+            SELECT {columns}, :owner_id, now()
+            FROM {STAGING_TABLE}
+            WHERE row_no <> ALL(:skip_rows)
+            ORDER BY row_no
+            RETURNING id, price
+        )
+        INSERT INTO price_history (property_id, price)
+        SELECT id, price FROM inserted
+    """), {"owner_id": owner_id, "skip_rows": skip_rows})
+    return result.rowcount
+
+
+def import_properties(db: Session, stream: IO[bytes], owner_id: int, file_format: str = "csv") -> dict:
+    """
+    Импортирует объявления владельца из потока. Корректные строки загружаются
+    одной транзакцией, остальные попадают в отчет. Бросает ImportFormatError,
+    если файл не разбирается или в нем больше MAX_IMPORT_ROWS строк.
+    """
+    text_stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    records = _read_ndjson(text_stream) if file_format == "ndjson" else _read_csv(text_stream)
+
+    db.execute(text(
+        f"CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS "
+        f"SELECT {', '.join(IMPORT_COLUMNS)} FROM properties WITH NO DATA"
+    ))
+    db.execute(text(f"ALTER TABLE {STAGING_TABLE} ADD COLUMN row_no integer"))
+    cursor = db.connection().connection.cursor()
+
+    errors: List[dict] = []
+    total = 0
+    chunk: List[list] = []
+    try:
+        for row_no, record, parse_error in records:
+            total = row_no
+            if total > MAX_IMPORT_ROWS:
+                raise ImportFormatError(f"Не больше {MAX_IMPORT_ROWS} строк за один импорт")
+            if parse_error:
+                errors.append({"row": row_no, "field": None, "message": parse_error})
+                continue
+            row = _validate(row_no, record, errors)
+            if row is not None:
+                chunk.append(row)
+            if len(chunk) >= CHUNK_SIZE:
+                _copy_chunk(cursor, chunk)
+                chunk = []
+        if chunk:
+            _copy_chunk(cursor, chunk)
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.rollback()
+        raise ImportFormatError(f"Не удалось прочитать файл: {e}")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    duplicates = _find_duplicates(db, owner_id)
+    errors.extend({"row": row_no, "field": None, "message": message} for row_no, message in duplicates.items())
+    imported = _merge(db, owner_id, list(duplicates))
+    db.commit()
+
+    errors.sort(key=lambda error: error["row"])
+    logger.info(f"Импорт объявлений владельца {owner_id}: строк {total}, загружено {imported}, ошибок {len(errors)}")
+    return {"total": total, "imported": imported, "errors": errors}
@@ -0,0 +1,199 @@
+"""
+Отложенная запись просмотров объявлений (write-behind).
+
+Детальная страница только кладет событие в Redis-список, а фоновая задача
+пачками переносит события в property_views и history. Так чтение объявления
+не делает синхронных записей в БД, а БД получает многострочные вставки
+вместо отдельного commit на каждый просмотр.
+
+Если пачка не записалась из-за недоступности БД, она возвращается в очередь.
+Если из-за данных (битое событие, строка вне партиций), пачка делится
+пополам, пока не останутся отдельные плохие события; они уходят в
+dead-letter список VIEW_DEAD_LETTER_KEY и не блокируют остальную очередь.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from redis import RedisError
+from sqlalchemy import DateTime, Integer, column, exc, func, insert, select, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app import crud, models, schemas
+from app.core.redis_client import async_redis_client, redis_client
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+VIEW_QUEUE_KEY = "property_views:queue"
+VIEW_DEAD_LETTER_KEY = "property_views:dead"
+FLUSH_INTERVAL = 2.0  # секунд между проходами фоновой задачи
+FLUSH_BATCH_SIZE = 1000
+
+
+def _write_view_now(db: Session, user_id: int, property_id: int) -> None:
+    crud.create_history(db, schemas.HistoryCreate(property_id=property_id), user_id)
+    crud.add_property_view(db, user_id, property_id)
+
+
+async def record_view(db: AsyncSession, user_id: int, property_id: int) -> None:
+    """
+    Ставит просмотр в очередь. Если Redis недоступен, пишет сразу в БД,
+    как раньше, чтобы просмотр не потерялся.
+    """
+    event = {"user_id": user_id, "property_id": property_id, "viewed_at": datetime.now().isoformat()}
+    try:
+        await async_redis_client.rpush(VIEW_QUEUE_KEY, json.dumps(event))
+    except RedisError as e:
+        logger.warning(f"Очередь просмотров недоступна, пишем синхронно: {e}")
+        await db.run_sync(_write_view_now, user_id, property_id)
+
+
+def _pop_batch(batch_size: int) -> Tuple[List[dict], int]:
+    """
+    Забирает до batch_size событий из очереди. Возвращает разобранные события
+    и сколько элементов снято с очереди (с учетом битых, ушедших в dead-letter).
+    """
+    # LRANGE + LTRIM в одной транзакции: несколько воркеров не заберут одно событие дважды
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.lrange(VIEW_QUEUE_KEY, 0, batch_size - 1)
+    pipe.ltrim(VIEW_QUEUE_KEY, batch_size, -1)
+    raw_events, _ = pipe.execute()
+    events = []
+    for raw in raw_events:
+        try:
+            events.append(json.loads(raw))
+        except ValueError as e:
+            _dead_letter([raw], e)
+    return events, len(raw_events)
+
+
+def _requeue(events: List[dict]) -> None:
+    try:
+        redis_client.lpush(VIEW_QUEUE_KEY, *[json.dumps(event) for event in reversed(events)])
+    except RedisError as e:
+        logger.error(f"Потеряно {len(events)} событий просмотра: {e}")
+
+
+def _dead_letter(events: List, error: Exception) -> None:
+    logger.error(f"Событий просмотра в dead-letter: {len(events)} ({error})")
+    try:
+        redis_client.rpush(
+            VIEW_DEAD_LETTER_KEY,
+            *[json.dumps({"event": event, "error": str(error)}, default=str) for event in events]
+        )
+    except RedisError as e:
+        logger.error(f"Потеряно {len(events)} событий просмотра: {e}")
+
+
+def _events_source(rows: List[Tuple[int, int, datetime]], name: str):
+    """VALUES-список событий, отфильтрованный по существующим пользователям и объявлениям"""
+    source = values(
+        column("user_id", Integer), column("property_id", Integer), column("viewed_at", DateTime),
+        name=name
+    ).data(rows)
+    return (
+        select(source.c.user_id, source.c.property_id, source.c.viewed_at)
+        .join(models.User, models.User.id == source.c.user_id)
+        .join(models.Property, models.Property.id == source.c.property_id)
+    )
+
+
+def write_views(db: Session, events: List[dict]) -> None:
+    """Записывает пачку событий: все просмотры и последнее время в истории"""
+    view_rows = [
+        (event["user_id"], event["property_id"], datetime.fromisoformat(event["viewed_at"]))
+        for event in events
+    ]
+    latest: Dict[Tuple[int, int], datetime] = {}
+    for user_id, property_id, viewed_at in view_rows:
+        key = (user_id, property_id)
+        if key not in latest or viewed_at > latest[key]:
+            latest[key] = viewed_at
+    history_rows = [(user_id, property_id, viewed_at) for (user_id, property_id), viewed_at in latest.items()]
+
+    # xid до nextval() в INSERT: на этом держится граница агрегации (view_rollup)
+    crud.assign_transaction_id(db)
+    db.execute(
+        insert(models.PropertyViews).from_select(
+            ["user_id", "property_id", "viewed_at"], _events_source(view_rows, "view_events")
+        )
+    )
+
+    # История: одна вставка с обновлением времени у существующих записей
+    history_source = _events_source(history_rows, "history_events").subquery()
+    stmt = pg_insert(models.History).from_select(
+        ["user_id", "property_id", "viewed_at"], select(history_source)
+    )
+    db.execute(stmt.on_conflict_do_update(
+        constraint="uq_history_user_property",
+        set_={"viewed_at": func.greatest(models.History.viewed_at, stmt.excluded.viewed_at)}
+    ))
+
+
+# Ошибки, при которых дело не в данных: пачку нужно повторить целиком позже
+DB_UNAVAILABLE_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError)
+
+
+def _write_batch(events: List[dict]) -> int:
+    """
+    Записывает пачку. Часть с ошибкой в данных делится пополам и пишется
+    отдельными транзакциями; одиночные плохие события уходят в dead-letter.
+    При недоступности БД незаписанные события возвращаются в очередь.
+    Возвращает число записанных событий.
+    """
+    written = 0
+    pending = [events]
+    while pending:
+        chunk = pending.pop()
+        db = SessionLocal()
+        try:
+            write_views(db, chunk)
+            db.commit()
+            written += len(chunk)
+            continue
+        except DB_UNAVAILABLE_ERRORS:
+            db.rollback()
+            _requeue(chunk + [event for rest in pending for event in rest])
+            raise
+        except Exception as e:
+            db.rollback()
+            error = e
+        finally:
+            db.close()
+        if len(chunk) == 1:
+            _dead_letter(chunk, error)
+        else:
+            middle = len(chunk) // 2
+            pending.extend([chunk[middle:], chunk[:middle]])
+    return written
+
+
+def flush_view_queue(batch_size: int = FLUSH_BATCH_SIZE) -> int:
+    """Переносит накопленные события из Redis в БД. Возвращает число записанных событий."""
+    total = 0
+    while True:
+        events, popped = _pop_batch(batch_size)
+        if events:
+            total += _write_batch(events)
+        # Очередь пуста, только если Redis отдал неполную пачку: пачка целиком
+        # из битых событий не означает, что за ней ничего нет
+        if popped < batch_size:
+            break
+    return total
+
+
+async def run_view_flusher(interval: float = FLUSH_INTERVAL) -> None:
+    """Фоновая задача приложения: периодически сбрасывает очередь просмотров"""
+    while True:
+        try:
+            flushed = await asyncio.to_thread(flush_view_queue)
+            if flushed:
+                logger.info(f"Записано просмотров из очереди: {flushed}")
+        except Exception as e:
+            logger.error(f"Ошибка при записи очереди просмотров: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,222 @@
+"""
+Дневные агрегаты просмотров и очистка сырых событий.
+
+Задача идет по property_views от сохраненной границы (last_id в
+rollup_checkpoints) и прибавляет новые события к property_views_daily,
+поэтому уже обработанные строки повторно не читаются. Граница агрегации
+(visible_id) сдвигается только до id, ниже которых не осталось незавершенных
+транзакций: max(id) запоминается вместе с xmax снимка и становится границей,
+когда xmin более позднего снимка его догонит. Время события (viewed_at) для
+этого не годится — очередь просмотров пишет события с задержкой. Сырые события
+старше окна хранения удаляются: история — пачками DELETE, просмотры —
+целыми помесячными партициями и только после того, как попали в агрегаты.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import Date, and_, cast, delete, exc, exists, func, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased
+
+from app import models
+from app.core import partitions
+from app.core.config import settings
+from app.database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "property_views_daily"
+ROLLUP_BATCH_SIZE = 50000   # событий за одну транзакцию агрегации
+PRUNE_BATCH_SIZE = 5000     # строк за один DELETE
+# max(id) и границы снимка одним запросом, чтобы они были согласованы.
+# Граница опирается на инвариант: транзакция получает xid раньше, чем id из
+# последовательности property_views. Тогда у незавершенной строки с id меньше
+# запомненного max(id) xid меньше xmax того снимка, и после того как xmin
+# его догонит, таких строк не остается. Сам Postgres этого не гарантирует
+# (nextval() выполняется до вставки, назначающей xid), поэтому все, кто пишет
+# в property_views, сначала вызывают crud.assign_transaction_id.
+VISIBILITY_SQL = text(
+    "SELECT (SELECT max(id) FROM property_views) AS max_id, "
+    "pg_snapshot_xmin(s)::text::bigint AS xmin, pg_snapshot_xmax(s)::text::bigint AS xmax "
+    "FROM pg_current_snapshot() AS s"
+)
+ROLLUP_INTERVAL = 300.0     # секунд между запусками фоновой задачи
+LOCK_NOT_AVAILABLE = "55P03"  # SQLSTATE ошибки lock_timeout
+
+
+def _lock_checkpoint(db: Session) -> models.RollupCheckpoint:
+    db.execute(
+        pg_insert(models.RollupCheckpoint)
+        .values(name=CHECKPOINT_NAME, last_id=0)
+        .on_conflict_do_nothing(index_elements=[models.RollupCheckpoint.name])
+    )
+    # Блокировка строки не дает двум воркерам агрегировать одну пачку
+    return db.query(models.RollupCheckpoint)\
+        .filter(models.RollupCheckpoint.name == CHECKPOINT_NAME)\
+        .with_for_update()\
+        .one()
+
+
+def _advance_visible_id(db: Session, checkpoint: models.RollupCheckpoint) -> int:
+    """
+    Сдвигает visible_id до max(id), запомненного прошлым запуском, если все
+    транзакции, шедшие тогда (xid < pending_xmax), уже завершились: строки с
+    меньшим id после этого появиться не могут. Тогда запоминается новый max(id);
+    пока старый не дождался, он не заменяется, иначе граница могла бы не
+    сдвигаться при постоянно пересекающихся транзакциях.
+    """
+    snapshot = db.execute(VISIBILITY_SQL).one()
+    if checkpoint.pending_id is not None:
+        if snapshot.xmin < checkpoint.pending_xmax:
+            return checkpoint.visible_id
+        checkpoint.visible_id = max(checkpoint.visible_id, checkpoint.pending_id)
+    checkpoint.pending_id = snapshot.max_id
+    checkpoint.pending_xmax = snapshot.xmax
+    return checkpoint.visible_id
+
+
+def rollup_batch(db: Session, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Агрегирует следующую пачку событий до visible_id и сдвигает границу. Возвращает размер пачки по id."""
+    checkpoint = _lock_checkpoint(db)
+    last_id = checkpoint.last_id
+    upper = min(last_id + batch_size, checkpoint.visible_id)
+    if upper <= last_id:
+        db.commit()
+        return 0
+
+    views = models.PropertyViews
+    earlier = aliased(models.PropertyViews)
+    day = cast(views.viewed_at, Date)
+    # Уникальный пользователь за день — это его первый просмотр объявления в этот день;
+    # проверка идет по индексу (user_id, property_id), а не пересчетом всего дня
+    first_of_day = ~exists().where(
+        earlier.user_id == views.user_id,
+        earlier.property_id == views.property_id,
+        earlier.id < views.id,
+        cast(earlier.viewed_at, Date) == day,
+    )
+    batch = (
+        select(
+            views.property_id,
+            day.label("day"),
+            func.count().label("views"),
+            func.count().filter(first_of_day).label("unique_users"),
+        )
+        .where(and_(views.id > last_id, views.id <= upper, views.viewed_at.is_not(None)))
+        .group_by(views.property_id, day)
+    )
+    daily = models.PropertyViewsDaily
+    stmt = pg_insert(daily).from_select(["property_id", "day", "views", "unique_users"], batch)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[daily.property_id, daily.day],
+        set_={
+            "views": daily.views + stmt.excluded.views,
+            "unique_users": daily.unique_users + stmt.excluded.unique_users,
+        }
+    ))
+
+    processed = upper - last_id
+    checkpoint.last_id = upper
+    db.commit()
+    return processed
+
+
+def rollup_views(db: Session, batch_size: int = ROLLUP_BATCH_SIZE) -> int:
+    """Агрегирует пачками все события до видимой границы"""
+    _advance_visible_id(db, _lock_checkpoint(db))
+    db.commit()
+    total = 0
+    while True:
+        processed = rollup_batch(db, batch_size)
+        if not processed:
+            return total
+        total += processed
+
+
+def _prune(db: Session, model, cutoff: datetime, batch_size: int = PRUNE_BATCH_SIZE) -> int:
+    """Удаляет строки старше cutoff пачками по batch_size, каждая пачка в своей транзакции"""
+    condition = model.viewed_at < cutoff
+    total = 0
+    while True:
+        ids = select(model.id).where(condition).limit(batch_size)
+        deleted = db.execute(delete(model).where(model.id.in_(ids))).rowcount
+        db.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def maintain_view_partitions() -> int:
+    """
+    Создает партиции property_views на ближайшие месяцы (перенося строки,
+    попавшие в DEFAULT-партицию) и удаляет партиции старше окна хранения. Возвращает число удаленных партиций.
+    Каждая партиция удаляется своей короткой транзакцией; если блокировку
+    таблицы не удалось получить за DETACH_LOCK_TIMEOUT, партиция остается до следующего прохода.
+    """
+    table = models.PropertyViews.__tablename__
+    cutoff = (datetime.now() - timedelta(days=settings.PROPERTY_VIEWS_RETENTION_DAYS)).date()
+    dropped = 0
+    # Создание партиций и перенос строк из DEFAULT — одной транзакцией
+    with engine.begin() as connection:
+        stray = partitions.default_partition_rows(connection, table)
+        if stray:
+            logger.warning(
+                f"В DEFAULT-партиции {table} {stray} строк: партиции не создавались вовремя, переносим"
+            )
+        partitions.ensure_partitions(connection, table)
+        expired = partitions.expired_partitions(connection, table, cutoff)
+    with engine.connect() as connection:
+        for name in expired:
+            try:
+                with connection.begin():
+                    rolled_up = connection.execute(
+                        select(models.RollupCheckpoint.last_id)
+                        .where(models.RollupCheckpoint.name == CHECKPOINT_NAME)
+                    ).scalar() or 0
+                    # Партиция с еще не агрегированными событиями остается до следующего прохода
+                    max_id = connection.execute(text(f"SELECT max(id) FROM {name}")).scalar()
+                    if max_id is not None and max_id > rolled_up:
+                        continue
+                    partitions.drop_partition(connection, table, name)
+            except exc.OperationalError as e:
+                if getattr(e.orig, "pgcode", None) != LOCK_NOT_AVAILABLE:
+                    raise
+                logger.warning(f"Партиция {name} не удалена: таблица {table} занята, повторим позже")
+                continue
+            dropped += 1
+    return dropped
+
+
+def prune_raw_events(db: Session, batch_size: int = PRUNE_BATCH_SIZE) -> int:
+    """Удаляет историю старше окна хранения"""
+    history_cutoff = datetime.now() - timedelta(days=settings.HISTORY_RETENTION_DAYS)
+    return _prune(db, models.History, history_cutoff, batch_size=batch_size)
+
+
+def run_rollup_once() -> None:
+    db = SessionLocal()
+    try:
+        rolled_up = rollup_views(db)
+        pruned = prune_raw_events(db)
+        dropped = maintain_view_partitions()
+        if rolled_up or pruned or dropped:
+            logger.info(
+                f"Агрегировано просмотров: {rolled_up}, удалено записей истории: {pruned}, "
+                f"удалено партиций просмотров: {dropped}"
+            )
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_rollup_job(interval: float = ROLLUP_INTERVAL) -> None:
+    """Фоновая задача приложения: агрегаты по дням и очистка по расписанию"""
+    while True:
+        try:
+            await asyncio.to_thread(run_rollup_once)
+        except Exception as e:
+            logger.error(f"Ошибка при агрегации просмотров: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,190 @@
+"""
+Счетчики просмотров объявлений.
+
+Каждый просмотр детальной страницы — это HINCRBY в общем хэше приращений
+и PFADD в HyperLogLog зрителей объявления. Фоновая задача периодически
+переносит приращения в property_stats одним upsert, поэтому число
+просмотров читается по первичному ключу, без COUNT(*) по property_views.
+
+Уникальные зрители — PFCOUNT HyperLogLog. Зрители из property_views,
+накопленные до появления счетчиков, один раз добавляются в HyperLogLog
+скриптом scripts/seed_viewers.py (seed_viewers), поэтому оценка покрывает
+и старых, и новых зрителей.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+from redis import RedisError
+from sqlalchemy import BigInteger, Integer, column, func, select, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models, schemas
+from app.core.redis_client import async_redis_client, redis_client
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Хэш property_id -> просмотры, еще не перенесенные в property_stats
+PENDING_VIEWS_KEY = "property_stats:pending"
+FLUSH_INTERVAL = 30.0  # секунд между сбросами счетчиков в БД
+SEED_BATCH_SIZE = 10000
+
+
+def viewers_key(property_id: int) -> str:
+    return f"property:{property_id}:viewers"
+
+
+def viewer_id(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+async def count_view(property_id: int, viewer: str) -> None:
+    """Учитывает просмотр: +1 к счетчику и зритель в HyperLogLog (ошибки Redis не мешают ответу)"""
+    try:
+        async with async_redis_client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(PENDING_VIEWS_KEY, property_id, 1)
+            pipe.pfadd(viewers_key(property_id), viewer)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Не удалось учесть просмотр объявления {property_id}: {e}")
+
+
+def get_property_stats(db: Session, property_id: int) -> schemas.PropertyStatsOut:
+    """Сохраненные счетчики плюс еще не сброшенные приращения из Redis"""
+    stats = db.get(models.PropertyStats, property_id)
+    views = stats.views if stats else 0
+    unique_viewers = stats.unique_viewers if stats else 0
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hget(PENDING_VIEWS_KEY, property_id)
+        pipe.exists(viewers_key(property_id))
+        pipe.pfcount(viewers_key(property_id))
+        pending, has_viewers, estimate = pipe.execute()
+        views += int(pending or 0)
+        # HyperLogLog засеян из property_views и содержит всех зрителей;
+        # сохраненное значение нужно, только если ключа нет (Redis потерял данные)
+        if has_viewers:
+            unique_viewers = estimate
+    except RedisError as e:
+        logger.warning(f"Счетчики Redis недоступны, отдаем сохраненные: {e}")
+    return schemas.PropertyStatsOut(property_id=property_id, views=views, unique_viewers=unique_viewers)
+
+
+def _pop_pending() -> Dict[int, int]:
+    # HGETALL + DEL в одной транзакции: приращение попадет либо в эту пачку, либо в следующую
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hgetall(PENDING_VIEWS_KEY)
+    pipe.delete(PENDING_VIEWS_KEY)
+    pending, _ = pipe.execute()
+    return {int(property_id): int(count) for property_id, count in pending.items()}
+
+
+def _restore_pending(pending: Dict[int, int]) -> None:
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for property_id, count in pending.items():
+            pipe.hincrby(PENDING_VIEWS_KEY, property_id, count)
+        pipe.execute()
+    except RedisError as e:
+        logger.error(f"Потеряны приращения просмотров для {len(pending)} объявлений: {e}")
+
+
+def write_stats(db: Session, rows: List[Tuple[int, int, int]]) -> None:
+    """Прибавляет просмотры и обновляет оценку уникальных зрителей для пачки объявлений"""
+    source = values(
+        column("property_id", Integer), column("views", BigInteger), column("unique_viewers", BigInteger),
+        name="stats_delta"
+    ).data(rows)
+    # Удаленные за время накопления объявления отбрасываются соединением
+    delta = (
+        select(source.c.property_id, source.c.views, source.c.unique_viewers)
+        .join(models.Property, models.Property.id == source.c.property_id)
+        .subquery()
+    )
+    stmt = pg_insert(models.PropertyStats).from_select(
+        ["property_id", "views", "unique_viewers"], select(delta)
+    )
+    table = models.PropertyStats
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[table.property_id],
+        set_={
+            "views": table.views + stmt.excluded.views,
+            # HyperLogLog только растет; greatest сохраняет значения, посчитанные до Redis
+            "unique_viewers": func.greatest(table.unique_viewers, stmt.excluded.unique_viewers),
+            "updated_at": func.now(),
+        }
+    ))
+
+
+def flush_view_counters() -> int:
+    """Переносит накопленные приращения в property_stats. Возвращает число объявлений."""
+    pending = _pop_pending()
+    if not pending:
+        return 0
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for property_id in pending:
+            pipe.pfcount(viewers_key(property_id))
+        estimates = pipe.execute()
+    except RedisError:
+        _restore_pending(pending)
+        raise
+
+    rows = [
+        (property_id, count, estimate)
+        for (property_id, count), estimate in zip(pending.items(), estimates)
+    ]
+    db = SessionLocal()
+    try:
+        write_stats(db, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        _restore_pending(pending)
+        raise
+    finally:
+        db.close()
+    return len(rows)
+
+
+def seed_viewers(db: Session, batch_size: int = SEED_BATCH_SIZE) -> int:
+    """
+    Добавляет в HyperLogLog объявлений зрителей из property_views.
+    PFADD идемпотентен, повторный запуск ничего не портит. Возвращает число пар.
+    """
+    stmt = select(models.PropertyViews.property_id, models.PropertyViews.user_id)\
+        .distinct()\
+        .execution_options(yield_per=batch_size)
+    total = 0
+    for rows in db.execute(stmt).partitions():
+        viewers: Dict[int, List[str]] = {}
+        for property_id, user_id in rows:
+            viewers.setdefault(property_id, []).append(viewer_id(user_id))
+        pipe = redis_client.pipeline(transaction=False)
+        for property_id, ids in viewers.items():
+            pipe.pfadd(viewers_key(property_id), *ids)
+        pipe.execute()
+        total += len(rows)
+    return total
+
+
+def drop_viewers(property_id: int) -> None:
+    """Убирает HyperLogLog удаленного объявления"""
+    try:
+        redis_client.delete(viewers_key(property_id))
+    except RedisError as e:
+        logger.warning(f"Не удалось удалить зрителей объявления {property_id}: {e}")
+
+
+async def run_stats_flusher(interval: float = FLUSH_INTERVAL) -> None:
+    """Фоновая задача приложения: периодически сбрасывает счетчики просмотров"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            flushed = await asyncio.to_thread(flush_view_counters)
+            if flushed:
+                logger.info(f"Обновлены счетчики просмотров объявлений: {flushed}")
+        except Exception as e:
+            logger.error(f"Ошибка при сбросе счетчиков просмотров: {e}")
@@ -0,0 +1,65 @@
+"""
+Заполняет previous_price, price_changed_at и price_change_pct у существующих
+объявлений по price_history одним проходом с оконной функцией.
+
+Последняя запись истории хранит цену до последнего изменения. Объявления,
+у которых есть только первая запись с текущей ценой, остаются без изменения цены.
+
+Запуск из каталога backend:
+    python scripts/backfill_price_changes.py
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Добавляем путь к корневой директории проекта
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.database import SessionLocal
+
+BACKFILL_SQL = text("""
+    WITH ranked AS (
+        SELECT
+            property_id,
+            price,
+            change_date,
+            row_number() OVER (
+                PARTITION BY property_id ORDER BY change_date DESC NULLS LAST, id DESC
+            ) AS rn,
+            count(*) OVER (PARTITION BY property_id) AS entries
+        FROM price_history
+    )
+    UPDATE properties
+    SET previous_price = ranked.price,
+        price_changed_at = ranked.change_date,
+        price_change_pct = (properties.price - ranked.price) / NULLIF(ranked.price, 0) * 100,
+        version = nextval('property_version_seq')
+    FROM ranked
+    WHERE ranked.property_id = properties.id
+      AND ranked.rn = 1
+      AND (ranked.entries > 1 OR ranked.price <> properties.price)
+""")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="посчитать затронутые объявления и откатить")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        updated = db.execute(BACKFILL_SQL).rowcount
+        if args.dry_run:
+            db.rollback()
+            print(f"Будет обновлено объявлений: {updated}")
+        else:
+            db.commit()
+            print(f"Обновлено объявлений: {updated}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Нагрузочный бенчмарк: пропускная способность API под N параллельными клиентами.
+
+Каждый клиент в цикле запрашивает пути из --paths по очереди в течение
+--duration секунд. Печатаются запросы в секунду, задержки p50/p95/p99 и
+число ошибок по каждому пути и в сумме.
+
+Сравнение до и после перевода обработчиков на асинхронную сессию: запустить
+uvicorn (один воркер) на коммите до изменения и после него и прогнать один и
+тот же набор путей. С синхронными запросами в async def медленный запрос
+останавливает весь воркер, поэтому под 200 клиентами растет хвост задержек.
+
+Запуск из каталога backend (сервер уже запущен):
+    python scripts/bench_concurrency.py --clients 200 --duration 30 \\
+        --paths "/properties/list?limit=20" /properties/1 /favorites/ --token <JWT>
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import defaultdict
+
+import httpx
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def client(http: httpx.AsyncClient, paths, deadline, offset, latencies, errors):
+    index = offset
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            response = await http.get(path)
+            if response.status_code >= 400:
+                errors[path] += 1
+                continue
+        except httpx.HTTPError:
+            errors[path] += 1
+            continue
+        latencies[path].append((time.perf_counter() - started) * 1000)
+
+
+async def run(args):
+    headers = {"Authorization": f"Bearer {args.token}"} if args.token else {}
+    limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, limits=limits, timeout=args.timeout) as http:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*[
+            client(http, args.paths, deadline, offset, latencies, errors) for offset in range(args.clients)
+        ])
+        elapsed = time.perf_counter() - started
+
+    print(f"Клиентов: {args.clients}, длительность: {elapsed:.1f} с")
+    print(f"{'path':<40} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    total = []
+    for path in args.paths:
+        values = latencies[path]
+        total.extend(values)
+        print(
+            f"{path:<40} {len(values) / elapsed:>8.1f} {percentile(values, 0.5):>8.1f} "
+            f"{percentile(values, 0.95):>8.1f} {percentile(values, 0.99):>8.1f} {errors[path]:>7}"
+        )
+    mean = statistics.fmean(total) if total else 0.0
+    print(
+        f"{'всего':<40} {len(total) / elapsed:>8.1f} {percentile(total, 0.5):>8.1f} "
+        f"{percentile(total, 0.95):>8.1f} {percentile(total, 0.99):>8.1f} {sum(errors.values()):>7}"
+    )
+    print(f"Средняя задержка: {mean:.1f} мс")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--paths", nargs="+", default=["/properties/list?limit=20"])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30.0, help="секунд")
+    parser.add_argument("--timeout", type=float, default=30.0, help="таймаут запроса, секунд")
+    parser.add_argument("--token", help="JWT для защищенных путей (избранное, история)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
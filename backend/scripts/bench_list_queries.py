@@ -0,0 +1,50 @@
+"""
+Бенчмарк числа SQL-запросов на страницу /properties/list с include_viewed.
+
+Запускает тот же путь, что и обработчик (страница + флаги is_viewed),
+для разных размеров страницы и печатает число запросов к БД.
+Число запросов не должно зависеть от размера страницы.
+
+Запуск из каталога backend:
+    python scripts/bench_list_queries.py --user-id 1
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Добавляем путь к корневой директории проекта
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import event
+
+from app import crud, schemas
+from app.database import SessionLocal, engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user-id", type=int, required=True, help="id пользователя, для которого считаются просмотры")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 50, 100])
+    args = parser.parse_args()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *a, **kw: statements.append(a[2]))
+
+    print(f"{'page size':>10} {'rows':>6} {'queries':>8} {'ms':>8}")
+    for size in args.sizes:
+        db = SessionLocal()
+        try:
+            statements.clear()
+            started = time.perf_counter()
+            properties, _ = crud.search_properties(db, schemas.PropertyFilter(), limit=size)
+            crud.load_property_collections(db, properties)
+            crud.get_viewed_property_ids(db, args.user_id, [prop.id for prop in properties])
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"{size:>10} {len(properties):>6} {len(statements):>8} {elapsed:>8.1f}")
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Бенчмарк расчета рыночной статистики на синтетических объявлениях.
+
+Генерирует колонки так, как их выгружает load_listing_columns, и замеряет
+векторный расчет сегментов и сборку снимка. Для проверки сверяет квантили
+нескольких сегментов с np.quantile.
+
+Запуск из каталога backend:
+    python scripts/bench_market_stats.py --listings 1000000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Добавляем путь к корневой директории проекта
+sys.path.append(str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from app.services.market_stats import build_snapshot, compute_market_segments
+
+
+def synthetic_listings(count: int, cells: int, seed: int = 42) -> dict:
+    rng = np.random.default_rng(seed)
+    area = rng.uniform(20, 200, count)
+    # Часть объявлений без площади: в квантили цены за м² они не входят
+    area[rng.random(count) < 0.02] = 0.0
+    return {
+        "property_type": rng.choice(np.array(["квартира", "дом", "новостройка", "участок"]), count),
+        "deal_type": rng.choice(np.array(["sale", "rent"]), count),
+        "rooms": rng.choice(np.array(["студия", "1", "2", "3", "4", "5+"]), count),
+        "geo_cell": rng.integers(0, cells, count, dtype=np.int64),
+        "price": area * rng.lognormal(9, 0.4, count),
+        "area": area,
+        "days_on_market": rng.exponential(45, count),
+    }
+
+
+def check(columns: dict, segments: dict, samples: int = 5) -> None:
+    rng = np.random.default_rng(0)
+    for index in rng.choice(len(segments["inventory"]), min(samples, len(segments["inventory"])), replace=False):
+        mask = (
+            (columns["property_type"] == segments["property_type"][index])
+            & (columns["deal_type"] == segments["deal_type"][index])
+            & (columns["rooms"] == segments["rooms"][index])
+            & (columns["geo_cell"] == segments["geo_cell"][index])
+            & (columns["area"] > 0)
+        )
+        expected = np.quantile(columns["price"][mask] / columns["area"][mask], [0.25, 0.5, 0.75])
+        actual = [segments[name][index] for name in ("ppm_p25", "ppm_median", "ppm_p75")]
+        assert np.allclose(expected, actual), (index, expected, actual)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listings", type=int, default=1_000_000)
+    parser.add_argument("--cells", type=int, default=2000, help="число различных геоячеек")
+    args = parser.parse_args()
+
+    columns = synthetic_listings(args.listings, args.cells)
+
+    started = time.perf_counter()
+    segments = compute_market_segments(**columns)
+    computed = time.perf_counter()
+    snapshot = build_snapshot(segments)
+    finished = time.perf_counter()
+
+    check(columns, segments)
+    size = sum(len(block) for block in snapshot.values())
+    print(f"объявлений: {args.listings}, сегментов: {len(segments['inventory'])}")
+    print(f"расчет: {computed - started:.2f} с, снимок: {finished - computed:.2f} с, размер снимка: {size / 1024:.0f} КБ")
+
+
+if __name__ == "__main__":
+    main()
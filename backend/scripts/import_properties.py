@@ -0,0 +1,59 @@
+"""
+Массовый импорт объявлений из CSV или NDJSON от имени владельца.
+
+Тот же путь, что и POST /properties/import: потоковое чтение, проверка
+схемой пачками, COPY во временную таблицу и одна вставка в properties.
+
+Запуск из каталога backend:
+    python scripts/import_properties.py --owner-email agency@example.com listings.csv
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Добавляем путь к корневой директории проекта
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import crud
+from app.core import cache
+from app.database import SessionLocal
+from app.services import property_import
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--owner-email", required=True)
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="по умолчанию — по расширению файла")
+    parser.add_argument("--max-errors", type=int, default=50, help="сколько ошибок напечатать")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        owner = crud.get_user_by_email(db, email=args.owner_email)
+        if not owner:
+            sys.exit(f"Пользователь {args.owner_email} не найден")
+        file_format = args.format or property_import.detect_format(args.path.name, None)
+        started = time.perf_counter()
+        with args.path.open("rb") as stream:
+            try:
+                report = property_import.import_properties(db, stream, owner.id, file_format)
+            except property_import.ImportFormatError as e:
+                sys.exit(str(e))
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    if report["imported"]:
+        cache.invalidate_catalog()
+    rate = report["total"] / elapsed if elapsed else 0
+    print(f"Строк: {report['total']}, загружено: {report['imported']}, ошибок: {len(report['errors'])}")
+    print(f"Время: {elapsed:.2f} с ({rate:.0f} строк/с)")
+    for error in report["errors"][:args.max_errors]:
+        field = f" [{error['field']}]" if error["field"] else ""
+        print(f"  строка {error['row']}{field}: {error['message']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Добавляет в HyperLogLog зрителей объявлений (Redis) всех пользователей,
+уже записанных в property_views. После этого оценка уникальных зрителей
+в /properties/{id}/stats учитывает и просмотры, сделанные до появления
+счетчиков. Повторный запуск безопасен.
+
+Запуск из каталога backend (один раз после выкладки счетчиков):
+    python scripts/seed_viewers.py
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Добавляем путь к корневой директории проекта
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.database import SessionLocal
+from app.services import view_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=view_stats.SEED_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        seeded = view_stats.seed_viewers(db, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Добавлено пар объявление-зритель: {seeded} за {time.perf_counter() - started:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
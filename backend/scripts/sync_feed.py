@@ -0,0 +1,63 @@
+"""
+Синхронизирует объявления агентства с его XML-фидом (формат фида
+недвижимости Яндекса). Записываются только новые и изменившиеся
+предложения; пропавшие из фида снимаются с публикации.
+
+Запускается по расписанию из каталога backend:
+    python scripts/sync_feed.py --feed agency-42 --owner-email agency@example.com https://agency.example.com/feed.xml
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from urllib.request import urlopen
+from xml.etree.ElementTree import ParseError
+
+# Добавляем путь к корневой директории проекта
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import crud
+from app.database import SessionLocal
+from app.services import feed_sync
+
+
+def open_source(source: str):
+    if source.startswith(("http://", "https://")):
+        return urlopen(source, timeout=60)
+    return open(source, "rb")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", help="путь к файлу или URL фида")
+    parser.add_argument("--feed", required=True, help="имя фида, по нему сопоставляются предложения между запусками")
+    parser.add_argument("--owner-email", required=True)
+    parser.add_argument("--max-errors", type=int, default=50, help="сколько ошибок напечатать")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        owner = crud.get_user_by_email(db, email=args.owner_email)
+        if not owner:
+            sys.exit(f"Пользователь {args.owner_email} не найден")
+        started = time.perf_counter()
+        with open_source(args.source) as stream:
+            try:
+                report = feed_sync.sync_feed(db, stream, args.feed, owner.id)
+            except ParseError as e:
+                sys.exit(f"Фид поврежден, синхронизация прервана: {e}")
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+
+    print(
+        f"Предложений: {report['total']}, новых: {report['created']}, изменено: {report['updated']}, "
+        f"без изменений: {report['unchanged']}, снято: {report['deactivated']}, пропущено: {report['skipped']}"
+    )
+    print(f"Время: {elapsed:.2f} с")
+    for error in report["errors"][:args.max_errors]:
+        print(f"  {error['offer']}: {error['message']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import uuid
+
+import fakeredis
+import pytest
+from sqlalchemy import create_engine, text
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    Подменяет redis_client во всех загруженных модулях app на fakeredis.
+    Модули импортируют клиента по имени, поэтому подменяется атрибут каждого модуля.
+    """
+    client = fakeredis.FakeRedis(decode_responses=True)
+    for name, module in list(sys.modules.items()):
+        if name.startswith("app") and hasattr(module, "redis_client"):
+            monkeypatch.setattr(module, "redis_client", client)
+    return client
+
+
+@pytest.fixture
+def pg_engine():
+    """
+    Движок на отдельной схеме тестовой БД Postgres (TEST_DATABASE_URL).
+    Без переменной окружения интеграционные тесты пропускаются.
+    """
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL не задан")
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(url)
+    with admin.begin() as connection:
+        connection.execute(text(f"CREATE SCHEMA {schema}"))
+    engine = create_engine(url, connect_args={"options": f"-csearch_path={schema}"})
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import pytest
+from redis import RedisError
+
+from app import auth
+
+
+@pytest.fixture
+def users(monkeypatch):
+    """Версии токенов пользователей «в БД» и счетчик обращений к ней"""
+    state = {"versions": {}, "reads": 0, "on_read": None}
+
+    class FakeQuery:
+        def __init__(self):
+            self.user_id = None
+
+        def filter(self, condition):
+            self.user_id = condition.right.value
+            return self
+
+        def first(self):
+            state["reads"] += 1
+            if state["on_read"]:
+                state["on_read"]()
+            version = state["versions"].get(self.user_id)
+            return None if version is None else SimpleNamespace(token_version=version)
+
+    class FakeSession:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+        def query(self, *args):
+            return FakeQuery()
+
+    monkeypatch.setattr(auth, "SessionLocal", FakeSession)
+    return state
+
+
+def _key(user_id):
+    return auth.TOKEN_VERSION_KEY.format(user_id=user_id)
+
+
+def test_version_from_redis_without_db(fake_redis, users):
+    fake_redis.set(_key(1), 2)
+    assert auth._token_revoked(1, 1)
+    assert not auth._token_revoked(1, 2)
+    assert users["reads"] == 0
+
+
+def test_redis_miss_reads_db_and_caches(fake_redis, users):
+    users["versions"][1] = 3
+    assert auth._token_revoked(1, 2)
+    assert not auth._token_revoked(1, 3)
+    assert users["reads"] == 1
+    assert fake_redis.get(_key(1)) == "3"
+    assert 0 < fake_redis.ttl(_key(1)) <= auth.TOKEN_VERSION_TTL
+
+
+def test_cache_fill_does_not_overwrite_concurrent_revocation(fake_redis, users):
+    users["versions"][1] = 0
+    # revoke_tokens успевает записать новую версию, пока читается БД
+    users["on_read"] = lambda: fake_redis.set(_key(1), 1)
+    auth._token_revoked(1, 0)
+    assert fake_redis.get(_key(1)) == "1"
+    assert auth._token_revoked(1, 0)
+
+
+def test_redis_error_falls_back_to_db(fake_redis, users, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RedisError("connection refused")
+    monkeypatch.setattr(fake_redis, "get", fail)
+    monkeypatch.setattr(fake_redis, "set", fail)
+    users["versions"][1] = 1
+    assert auth._token_revoked(1, 0)
+    assert not auth._token_revoked(1, 1)
+    assert users["reads"] == 2
+
+
+def test_deleted_user_token_is_revoked(fake_redis, users):
+    assert auth._token_revoked(404, 0)
+    assert fake_redis.get(_key(404)) is None
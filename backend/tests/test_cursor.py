@@ -0,0 +1,47 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from app.core.cursor import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("key", [
+    datetime(2026, 3, 1, 12, 30, 5, 123456),
+    125000.5,
+    42,
+    -3.75,
+])
+def test_cursor_round_trip(key):
+    cursor = encode_cursor("newest", key, 17)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, "newest") == (key, 17)
+
+
+def test_cursor_for_other_sort_is_rejected():
+    cursor = encode_cursor("price_asc", 100.0, 1)
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "price_desc")
+
+
+def _raw(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+    _raw([1, 2]),
+    _raw({"s": "newest"}),
+    _raw({"s": "newest", "k": 1}),
+    _raw({"s": "newest", "d": "yesterday", "i": 1}),
+    _raw({"s": "newest", "k": 1, "i": "abc"}),
+    _raw({"s": "newest", "k": "abc", "i": 1}),
+    _raw({"s": "newest", "k": {"a": 1}, "i": 1}),
+    _raw({"s": "newest", "k": True, "i": 1}),
+])
+def test_corrupted_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "newest")
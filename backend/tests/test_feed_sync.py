@@ -0,0 +1,64 @@
+import io
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from app.services import feed_sync
+
+OFFER = """
+<offer internal-id="{id}">
+  <type>продажа</type>
+  <category>квартира</category>
+  <price><value>{price}</value><currency>RUB</currency></price>
+  <location><locality-name>Ташкент</locality-name><address>ул. Навои, 1</address></location>
+  <area><value>54,5</value></area>
+  <rooms>2</rooms>
+  <floor>{floor}</floor>
+  {extra}
+  <image>https://example.com/1.jpg</image>
+</offer>
+"""
+
+
+def _offer(id="1", price="100000", floor="3", extra=""):
+    return ET.fromstring(OFFER.format(id=id, price=price, floor=floor, extra=extra))
+
+
+def test_parse_offer():
+    external_id, fields, images = feed_sync.parse_offer(_offer())
+    assert external_id == "1"
+    assert fields["price"] == 100000.0
+    assert fields["area"] == 54.5
+    assert fields["floor"] == 3
+    assert fields["address"] == "Ташкент, ул. Навои, 1"
+    assert images == ["https://example.com/1.jpg"]
+
+
+def test_hash_ignores_tags_that_are_not_imported():
+    _, fields, images = feed_sync.parse_offer(_offer())
+    _, other_fields, other_images = feed_sync.parse_offer(_offer(extra="<last-update-date>2026-03-01</last-update-date>"))
+    assert feed_sync.offer_hash(fields, images) == feed_sync.offer_hash(other_fields, other_images)
+
+
+def test_hash_changes_with_imported_fields():
+    _, fields, images = feed_sync.parse_offer(_offer())
+    _, changed, _ = feed_sync.parse_offer(_offer(price="99000"))
+    assert feed_sync.offer_hash(fields, images) != feed_sync.offer_hash(changed, images)
+    assert feed_sync.offer_hash(fields, images) != feed_sync.offer_hash(fields, images + ["https://example.com/2.jpg"])
+
+
+@pytest.mark.parametrize("price, floor", [("дорого", "3"), ("nan", "3"), ("100000", "1e400"), ("inf", "3")])
+def test_bad_numbers_reject_only_the_offer(price, floor):
+    with pytest.raises(feed_sync.FeedOfferError):
+        feed_sync.parse_offer(_offer(price=price, floor=floor))
+
+
+def test_iter_offers_handles_namespaced_feed():
+    feed = (
+        '<realty-feed xmlns="http://webmaster.yandex.ru/schemas/feed/realty/2010-06">'
+        + OFFER.format(id="1", price="1", floor="1", extra="")
+        + OFFER.format(id="2", price="2", floor="2", extra="")
+        + "</realty-feed>"
+    )
+    ids = [feed_sync.parse_offer(offer)[0] for offer in feed_sync.iter_offers(io.BytesIO(feed.encode()))]
+    assert ids == ["1", "2"]
@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+
+from app.services import listing_metrics
+
+
+def test_parse_merges_fields_that_resolve_to_the_same_row():
+    rows = listing_metrics._parse({
+        "12:2026-03-01": "2",
+        "012:2026-03-01": "3",
+        "12: 2026-03-01": "1",
+        "12:2026-03-02": "4",
+    })
+    assert sorted(rows) == [(12, date(2026, 3, 1), 6), (12, date(2026, 3, 2), 4)]
+
+
+@pytest.mark.parametrize("field, count", [
+    ("12", "1"),
+    ("abc:2026-03-01", "1"),
+    ("12:2026-13-01", "1"),
+    ("12:2026-03-01", "many"),
+    ("0:2026-03-01", "1"),
+    ("99999999999:2026-03-01", "1"),
+    ("12:2026-03-01", "-1"),
+])
+def test_parse_skips_invalid_fields(field, count):
+    rows = listing_metrics._parse({field: count, "7:2026-03-01": "1"})
+    assert rows == [(7, date(2026, 3, 1), 1)]
+
+
+def test_flush_restores_parsed_rows_when_write_fails(fake_redis, monkeypatch):
+    fake_redis.hset(listing_metrics.CHATS_STARTED_KEY, mapping={"5:2026-03-01": 2, "05:2026-03-01": 1, "bad": 1})
+
+    class FailingSession:
+        def execute(self, *args, **kwargs):
+            raise RuntimeError("db down")
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(listing_metrics, "SessionLocal", FailingSession)
+    with pytest.raises(RuntimeError):
+        listing_metrics.flush_listing_metrics()
+
+    assert fake_redis.hgetall(listing_metrics.CHATS_STARTED_KEY) == {"5:2026-03-01": "3"}
@@ -0,0 +1,67 @@
+import json
+
+import numpy as np
+import pytest
+
+from app.services import market_stats
+
+
+def test_grouped_quantiles_match_np_quantile():
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, 7, size=500)
+    values = rng.normal(100, 30, size=500)
+    values[rng.random(500) < 0.1] = np.nan
+
+    result = market_stats.grouped_quantiles(groups, values, 8)
+
+    for group in range(8):
+        group_values = values[(groups == group) & ~np.isnan(values)]
+        if len(group_values):
+            expected = np.quantile(group_values, market_stats.QUANTILES)
+            np.testing.assert_allclose(result[:, group], expected)
+        else:
+            assert np.isnan(result[:, group]).all()
+
+
+def test_grouped_quantiles_single_value_group():
+    result = market_stats.grouped_quantiles(np.array([0, 1, 1]), np.array([5.0, 1.0, 3.0]), 2, (0.5,))
+    np.testing.assert_allclose(result[0], [5.0, 2.0])
+
+
+@pytest.fixture
+def snapshot(fake_redis):
+    fields = {
+        market_stats.META_FIELD: json.dumps({"generated_at": "2026-01-01T00:00:00", "listings": 3}),
+        "flat|sale": json.dumps({"property_type": "flat", "deal_type": "sale"}),
+        "flat|rent": json.dumps({"property_type": "flat", "deal_type": "rent"}),
+        "house|sale": json.dumps({"property_type": "house", "deal_type": "sale"}),
+        "fl*t|sale": json.dumps({"property_type": "fl*t", "deal_type": "sale"}),
+    }
+    fake_redis.hset(market_stats.MARKET_SNAPSHOT_KEY, mapping=fields)
+    return fake_redis
+
+
+def _pairs(payload):
+    return [(block["property_type"], block["deal_type"]) for block in json.loads(payload)["segments"]]
+
+
+@pytest.mark.parametrize("property_type, deal_type, expected", [
+    (None, None, [("fl*t", "sale"), ("flat", "rent"), ("flat", "sale"), ("house", "sale")]),
+    ("flat", "sale", [("flat", "sale")]),
+    ("flat", None, [("flat", "rent"), ("flat", "sale")]),
+    ("fl*t", None, [("fl*t", "sale")]),
+    (None, "sale", [("fl*t", "sale"), ("flat", "sale"), ("house", "sale")]),
+    ("flat", "lease", []),
+])
+def test_read_market_snapshot_filters(snapshot, property_type, deal_type, expected):
+    payload = market_stats.read_market_snapshot(None, property_type=property_type, deal_type=deal_type)
+    assert json.loads(payload)["listings"] == 3
+    assert _pairs(payload) == expected
+
+
+def test_read_market_snapshot_reads_only_requested_pair(snapshot, monkeypatch):
+    def hgetall(*args, **kwargs):
+        raise AssertionError("весь хэш читать не нужно")
+    monkeypatch.setattr(snapshot, "hgetall", hgetall)
+    monkeypatch.setattr(snapshot, "hscan_iter", hgetall)
+    assert _pairs(market_stats.read_market_snapshot(None, "house", "sale")) == [("house", "sale")]
@@ -0,0 +1,99 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from app import models
+from app.core import partitions
+from app.core.config import settings
+from app.services import view_rollup
+
+TABLE = "property_views"
+
+
+@pytest.fixture
+def views_table(pg_engine, monkeypatch):
+    """property_views без внешних ключей, с партициями за полгода назад и DEFAULT-партицией"""
+    with pg_engine.begin() as connection:
+        connection.execute(text(
+            f"CREATE TABLE {TABLE} (id serial, viewed_at timestamp NOT NULL DEFAULT now(), "
+            "user_id integer NOT NULL, property_id integer NOT NULL, PRIMARY KEY (id, viewed_at)) "
+            "PARTITION BY RANGE (viewed_at)"
+        ))
+        models.RollupCheckpoint.__table__.create(connection)
+        partitions.ensure_partitions(connection, TABLE, start=partitions.add_months(date.today(), -6))
+    monkeypatch.setattr(view_rollup, "engine", pg_engine)
+    return pg_engine
+
+
+def _insert(connection, viewed_at):
+    return connection.execute(text(
+        f"INSERT INTO {TABLE} (viewed_at, user_id, property_id) VALUES (:viewed_at, 1, 1) RETURNING id"
+    ), {"viewed_at": viewed_at}).scalar()
+
+
+def _set_rolled_up(connection, last_id):
+    connection.execute(text(
+        "INSERT INTO rollup_checkpoints (name, last_id) VALUES (:name, :last_id)"
+    ), {"name": view_rollup.CHECKPOINT_NAME, "last_id": last_id})
+
+
+def _partition_names(engine):
+    with engine.connect() as connection:
+        return {name for name, _ in partitions.list_partitions(connection, TABLE)}
+
+
+def _expired_months():
+    cutoff = (datetime.now() - timedelta(days=settings.PROPERTY_VIEWS_RETENTION_DAYS)).date()
+    month = partitions.add_months(date.today(), -6)
+    months = []
+    while partitions.add_months(month, 1) <= cutoff:
+        months.append(month)
+        month = partitions.add_months(month, 1)
+    return months
+
+
+def test_maintain_drops_expired_partitions_with_default_partition(views_table):
+    expired = _expired_months()
+    assert expired
+    future = datetime.combine(partitions.add_months(date.today(), 12), datetime.min.time())
+    with views_table.begin() as connection:
+        last_id = max(_insert(connection, month) for month in expired)
+        _set_rolled_up(connection, last_id)
+        # Строка месяца без партиции ложится в DEFAULT
+        _insert(connection, future)
+
+    dropped = view_rollup.maintain_view_partitions()
+
+    names = _partition_names(views_table)
+    assert dropped == len(expired)
+    assert not names & {partitions.partition_name(TABLE, month) for month in expired}
+    assert partitions.partition_name(TABLE, partitions.month_start(future.date())) in names
+    with views_table.connect() as connection:
+        assert partitions.default_partition_rows(connection, TABLE) == 0
+        assert connection.execute(text(f"SELECT count(*) FROM {TABLE}")).scalar() == 1
+
+
+def test_maintain_keeps_partitions_that_are_not_rolled_up(views_table):
+    oldest = _expired_months()[0]
+    with views_table.begin() as connection:
+        _insert(connection, oldest)
+        _set_rolled_up(connection, 0)
+
+    view_rollup.maintain_view_partitions()
+
+    assert partitions.partition_name(TABLE, oldest) in _partition_names(views_table)
+
+
+def test_maintain_skips_partition_when_table_is_locked(views_table, monkeypatch):
+    monkeypatch.setattr(partitions, "DETACH_LOCK_TIMEOUT", "100ms")
+    with views_table.begin() as connection:
+        _set_rolled_up(connection, 0)
+
+    with views_table.connect() as reader:
+        reader.execute(text(f"SELECT count(*) FROM {TABLE}"))
+        # Незавершенная транзакция держит ACCESS SHARE на таблице
+        assert view_rollup.maintain_view_partitions() == 0
+        reader.rollback()
+
+    assert view_rollup.maintain_view_partitions() == len(_expired_months())
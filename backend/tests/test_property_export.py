@@ -0,0 +1,10 @@
+from app import crud
+from app.services import property_export
+from app.services.property_import import IMPORT_COLUMNS
+
+
+def test_export_fields_cover_import_and_card_columns():
+    fields = property_export.EXPORT_FIELDS
+    assert len(fields) == len(set(fields))
+    assert set(IMPORT_COLUMNS) <= set(fields)
+    assert {column.key for column in crud.PROPERTY_CARD_COLUMNS} <= set(fields)
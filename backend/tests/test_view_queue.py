@@ -0,0 +1,78 @@
+import json
+
+import pytest
+from sqlalchemy import exc
+
+from app.services import view_queue
+
+
+class FakeSession:
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    """write_views, который падает на событиях с property_id из bad и запоминает записанное"""
+    state = {"bad": set(), "unavailable": False, "written": [], "calls": 0}
+
+    def write_views(db, events):
+        state["calls"] += 1
+        if state["unavailable"]:
+            raise exc.OperationalError("INSERT", {}, Exception("connection refused"))
+        if any(event["property_id"] in state["bad"] for event in events):
+            raise exc.IntegrityError("INSERT", {}, Exception("no partition"))
+        state["written"].extend(events)
+
+    monkeypatch.setattr(view_queue, "SessionLocal", FakeSession)
+    monkeypatch.setattr(view_queue, "write_views", write_views)
+    return state
+
+
+def _events(count):
+    return [{"user_id": 1, "property_id": i, "viewed_at": "2026-01-01T00:00:00"} for i in range(count)]
+
+
+def _dead(client):
+    return [json.loads(item)["event"]["property_id"] for item in client.lrange(view_queue.VIEW_DEAD_LETTER_KEY, 0, -1)]
+
+
+def test_write_batch_isolates_bad_events(fake_redis, writer):
+    writer["bad"] = {3, 11}
+    events = _events(16)
+
+    written = view_queue._write_batch(events)
+
+    assert written == 14
+    assert sorted(event["property_id"] for event in writer["written"]) == [i for i in range(16) if i not in (3, 11)]
+    assert sorted(_dead(fake_redis)) == [3, 11]
+    # Делением пополам, а не по одному событию
+    assert writer["calls"] < 16
+
+
+def test_write_batch_requeues_when_db_unavailable(fake_redis, writer):
+    writer["unavailable"] = True
+    fake_redis.rpush(view_queue.VIEW_QUEUE_KEY, json.dumps({"later": True}))
+    events = _events(4)
+
+    with pytest.raises(exc.OperationalError):
+        view_queue._write_batch(events)
+
+    queued = [json.loads(raw) for raw in fake_redis.lrange(view_queue.VIEW_QUEUE_KEY, 0, -1)]
+    assert queued == events + [{"later": True}]
+    assert _dead(fake_redis) == []
+
+
+def test_flush_continues_past_batch_of_unparsable_events(fake_redis, writer):
+    fake_redis.rpush(view_queue.VIEW_QUEUE_KEY, *["not json"] * 5)
+    fake_redis.rpush(view_queue.VIEW_QUEUE_KEY, *[json.dumps(event) for event in _events(3)])
+
+    assert view_queue.flush_view_queue(batch_size=5) == 3
+    assert fake_redis.llen(view_queue.VIEW_QUEUE_KEY) == 0
+    assert fake_redis.llen(view_queue.VIEW_DEAD_LETTER_KEY) == 5
@@ -33,6 +33,10 @@ logger = logging.getLogger(__name__)
 MAIN_BACKEND_API_URL = settings.MAIN_API_URL 
 http_client = httpx.AsyncClient(base_url=MAIN_BACKEND_API_URL)
 
+# Счетчик новых чатов по объявлениям и дням; основной бэкенд
+# периодически переносит его в свои дневные метрики
+CHATS_STARTED_KEY = "property_metrics:chats_started"
+
 # Меняем префикс роутера
 router = APIRouter(prefix="/chat-api/chats")
 redis_client = redis.Redis(
@@ -453,6 +457,12 @@ async def create_chat(
         )
         logger.info(f"Created new chat {chat.id}")
 
+        # Учитываем новый чат в аналитике владельца объявления
+        try:
+            redis_client.hincrby(CHATS_STARTED_KEY, f"{chat.property_id}:{chat.created_at.date().isoformat()}", 1)
+        except redis.RedisError as e:
+            logger.warning(f"Failed to count started chat for property {chat.property_id}: {e}")
+
         # Сохраняем данные чата в Redis
         chat_key = f"chat:{str(chat.id)}"
         redis_client.hmset(chat_key, {